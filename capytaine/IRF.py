@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Impulse response functions (or retardation functions) of the radiation
+problem, computed from the results of a frequency sweep.
+"""
+
+import logging
+
+import numpy as np
+
+from capytaine.problems import RadiationProblem
+
+
+LOG = logging.getLogger(__name__)
+
+
+def _trapezoid_weights(x):
+    """Weights w such that w @ f(x) is the trapezoidal rule integral of f."""
+    x = np.asarray(x)
+    if len(x) < 2:
+        return np.zeros(len(x))
+    dx = np.diff(x)
+    weights = np.zeros(len(x))
+    weights[:-1] += dx/2
+    weights[1:] += dx/2
+    return weights
+
+
+def compute_radiation_IRF(omega_range, added_dampings, time_range):
+    """Compute the radiation impulse response function
+
+    K(t) = 2/π ∫_0^∞ B(ω) cos(ωt) dω
+
+    for all the dof pairs at once. The integral is truncated to the range of
+    frequencies of the sweep and evaluated by the trapezoidal rule as a single
+    matrix product.
+
+    Parameters
+    ----------
+    omega_range: array of shape (nb_omegas,)
+        the (sorted) angular frequencies of the sweep
+    added_dampings: array of shape (nb_omegas, ...)
+        the added dampings for each frequency, usually of shape (nb_omegas, nb_dofs, nb_dofs)
+    time_range: array of shape (nb_times,)
+        the times at which the function is evaluated
+
+    Returns
+    -------
+    array of shape (nb_times, ...)
+    """
+    omega_range = np.asarray(omega_range)
+    time_range = np.asarray(time_range)
+    added_dampings = np.asarray(added_dampings)
+    assert added_dampings.shape[0] == omega_range.shape[0]
+
+    LOG.info(f"Compute radiation IRF at {len(time_range)} time steps from {len(omega_range)} frequencies.")
+
+    cosine_transform = np.cos(np.outer(time_range, omega_range)) * _trapezoid_weights(omega_range)
+    K = 2/np.pi * cosine_transform @ added_dampings.reshape((len(omega_range), -1))
+    return K.reshape((len(time_range),) + added_dampings.shape[1:])
+
+
+def compute_infinite_frequency_added_mass(omega_range, added_masses, added_dampings, time_range):
+    """Estimate the infinite frequency added mass from a frequency sweep using
+    Ogilvie's relation
+
+    A(∞) = A(ω) + 1/ω ∫_0^∞ K(t) sin(ωt) dt,
+
+    averaged over all the frequencies of the sweep.
+
+    If the water depth is infinite, the infinite frequency added mass can also
+    be computed directly by the solver with a RadiationProblem with omega=np.infty.
+
+    Parameters
+    ----------
+    omega_range: array of shape (nb_omegas,)
+        the (sorted) angular frequencies of the sweep
+    added_masses: array of shape (nb_omegas, ...)
+    added_dampings: array of shape (nb_omegas, ...)
+    time_range: array of shape (nb_times,)
+        the time steps used for the integral of the impulse response function
+
+    Returns
+    -------
+    array of shape added_masses.shape[1:]
+    """
+    omega_range = np.asarray(omega_range)
+    time_range = np.asarray(time_range)
+    added_masses = np.asarray(added_masses)
+
+    K = compute_radiation_IRF(omega_range, added_dampings, time_range)
+
+    sine_transform = np.sin(np.outer(omega_range, time_range)) * _trapezoid_weights(time_range)
+    correction = (sine_transform @ K.reshape((len(time_range), -1))).reshape(added_masses.shape)
+    correction /= omega_range.reshape((-1,) + (1,)*(added_masses.ndim - 1))
+
+    return np.mean(added_masses + correction, axis=0)
+
+
+def compute_radiation_IRF_from_results(problems, results, time_range):
+    """Compute the radiation IRF from the output of Nemoh.solve_all.
+
+    Parameters
+    ----------
+    problems: list of problems
+        the problems of a frequency sweep (e.g. from import_cal_file).
+        Only the radiation problems are used.
+    results: list
+        the corresponding results of the solver
+    time_range: array
+        the times at which the function is evaluated
+
+    Returns
+    -------
+    array of shape (nb_times, nb_dofs, nb_dofs)
+    """
+    radiation = sorted(
+        ((problem.omega, result) for problem, result in zip(problems, results)
+         if isinstance(problem, RadiationProblem)),
+        key=lambda pair: pair[0]
+    )
+    omega_range = np.array([omega for omega, _ in radiation])
+    added_dampings = np.array([result[1] for _, result in radiation])
+    return compute_radiation_IRF(omega_range, added_dampings, time_range)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Computation of the Kochin function (far-field amplitude of the waves)
+from the sources distribution computed by the BEM solver.
+"""
+
+import logging
+
+import numpy as np
+
+from capytaine.problems import RadiationProblem, DiffractionProblem
+
+
+LOG = logging.getLogger(__name__)
+
+
+def _stacked_sources(problem, dof=None):
+    """Return the sources of a solved problem as an array of shape
+    (nb_sources_distributions, nb_faces)."""
+    if isinstance(problem, RadiationProblem):
+        if len(problem.sources) == 0:
+            raise Exception(f"""The sources of {problem} are not available.
+            Please run the solver with keep_details=True.""")
+        if dof is None:
+            return np.stack([problem.sources[name] for name in problem.body.dofs])
+        else:
+            return problem.sources[dof].reshape((1, -1))
+
+    elif isinstance(problem, DiffractionProblem):
+        if getattr(problem, 'sources', None) is None:
+            raise Exception(f"""The sources of {problem} are not available.
+            Please run the solver with keep_details=True.""")
+        return problem.sources.reshape((1, -1))
+
+    else:
+        raise ValueError(f"Unrecognized type of problem: {problem}.")
+
+
+def compute_Kochin(problem, theta, dof=None):
+    """Compute the Kochin function of a solved problem for several directions.
+
+    The Kochin function is defined here as
+
+    H(θ) = 1/(4π) ∑_j σ_j a_j f(z_j) exp(-ik(x_j cos(θ) + y_j sin(θ)))
+
+    where σ_j is the source on face j, a_j its area, (x_j, y_j, z_j) its center
+    and f(z) = cosh(k(z+h))/cosh(kh) (or exp(kz) in infinite depth).
+
+    The computation only uses the stored sources and costs O(nb_directions × nb_faces).
+
+    Parameters
+    ----------
+    problem: RadiationProblem or DiffractionProblem
+        a problem solved with keep_details=True
+    theta: float or array of floats
+        the directions (in radians) in which to evaluate the function
+    dof: string, optional
+        for radiation problems, the name of a single dof. If None (default),
+        the Kochin function is computed for all the dofs at once.
+
+    Returns
+    -------
+    array of shape (nb_dofs, nb_directions) for radiation problems,
+    array of shape (nb_directions,) for diffraction problems
+    (or a single dof of a radiation problem).
+    """
+    theta = np.atleast_1d(np.asarray(theta, dtype=np.float64))
+    sources = _stacked_sources(problem, dof=dof)
+
+    LOG.info(f"Compute Kochin function of {problem} in {len(theta)} directions.")
+
+    k = problem.wavenumber
+    h = problem.depth
+    x, y, z = problem.body.faces_centers.T
+    z = z - problem.free_surface
+
+    if 0 <= k*h < 20:
+        depth_factor = np.cosh(k*(z+h))/np.cosh(k*h)
+    else:
+        depth_factor = np.exp(k*z)
+
+    # Matrix of shape (nb_faces, nb_directions)
+    plane_waves = np.exp(-1j*k*(np.outer(x, np.cos(theta)) + np.outer(y, np.sin(theta))))
+
+    weighted_sources = sources * (problem.body.faces_areas * depth_factor)
+    kochin = weighted_sources @ plane_waves / (4*np.pi)
+
+    if isinstance(problem, DiffractionProblem) or dof is not None:
+        return kochin[0, :]
+    else:
+        return kochin
+
+
+def damping_from_Kochin(problem, nb_directions=180):
+    """Estimate the radiation damping matrix of a solved radiation problem in
+    infinite depth from the radiated energy flux in the far field.
+
+    Can be used as a cross-check of the damping returned by the solver.
+
+    Parameters
+    ----------
+    problem: RadiationProblem
+        a problem solved with keep_details=True
+    nb_directions: int
+        number of directions used for the integration over the circle
+
+    Returns
+    -------
+    array of shape (nb_dofs, nb_dofs)
+    """
+    if problem.depth < np.infty:
+        raise NotImplementedError("The damping from the Kochin function is only implemented in infinite depth.")
+
+    theta = np.linspace(0.0, 2*np.pi, nb_directions, endpoint=False)
+    kochin = compute_Kochin(problem, theta)
+
+    # Integral over the circle of H_i(θ) conj(H_j(θ))
+    integral = (kochin @ kochin.conj().T) * 2*np.pi/nb_directions
+    return 4*np.pi*problem.rho*problem.omega*problem.wavenumber * np.real(integral)
@@ -8,10 +8,10 @@ import logging
 
 import numpy as np
 
-from capytaine.problems import RadiationProblem, DiffractionProblem
-from capytaine.Toeplitz_matrices import (BlockCirculantMatrix, block_circulant_identity,
-                                         BlockToeplitzMatrix, block_Toeplitz_identity,
-                                         solve)
+from capytaine.problems import RadiationProblem, DiffractionProblem, ProblemSet
+from capytaine.Toeplitz_matrices import BlockMatrix, shift_diagonal, solve
+from capytaine.iterative_solvers import block_iterative_solve
+from capytaine.symmetries import match_symmetries
 import capytaine._Green as _Green
 
 
@@ -22,7 +22,40 @@ class Nemoh:
     """
     Solver for the BEM problem based on Nemoh's Green function.
     """
-    def __init__(self):
+    def __init__(self, nb_threads=1, low_rank_distance=None, low_rank_tol=1e-4,
+                 linear_solver="direct", block_solver_tol=1e-6, block_solver_maxiter=100):
+        """
+        Parameters
+        ----------
+        nb_threads: int
+            number of threads used to assemble the blocks of the influence
+            matrices of a collection of bodies, and to solve the independent
+            systems of the symmetric bodies (see Toeplitz_matrices.solve)
+        low_rank_distance: float, optional
+            if given, the blocks of the influence matrices of the pairs of
+            bodies of a collection further apart than this distance are
+            approximated by low-rank matrices, and the linear system is
+            solved iteratively (see CollectionOfFloatingBodies.build_matrices)
+        low_rank_tol: float
+            relative tolerance of the low-rank approximations
+        linear_solver: string
+            "direct" (default), or "jacobi" or "gauss_seidel" for the block
+            iterative (multiple scattering) solvers of
+            capytaine.iterative_solvers.block_iterative_solve, which are used
+            when the body is a collection of bodies
+        block_solver_tol, block_solver_maxiter:
+            relative tolerance and maximum number of iterations of the block
+            iterative solvers
+        """
+        self.nb_threads = nb_threads
+        self.low_rank_distance = low_rank_distance
+        self.low_rank_tol = low_rank_tol
+
+        if linear_solver not in ("direct", "jacobi", "gauss_seidel"):
+            raise ValueError(f"Unknown linear solver: {linear_solver}")
+        self.linear_solver = linear_solver
+        self.block_solver_tol = block_solver_tol
+        self.block_solver_maxiter = block_solver_maxiter
         _Green.initialize_green_2.initialize_green()
         LOG.info("Initialize Nemoh's Green function.")
 
@@ -33,6 +66,11 @@ class Nemoh:
 
         LOG.info("Solve %s.", problem)
 
+        S, V = self._build_matrices(problem)
+        return self._solve_with_matrices(problem, S, V, keep_details=keep_details)
+
+    def _initialize_green_function(self, problem):
+        """Prepare the Fortran Green function for the depth and frequency of the problem."""
         if problem.depth < np.infty:
             _Green.initialize_green_2.lisc(
                 problem.omega**2*problem.depth/problem.g,
@@ -40,72 +78,206 @@ class Nemoh:
             )
             LOG.debug(f"Initialize Nemoh's finite depth Green function for omega=%.2e and depth=%.2e", problem.omega, problem.depth)
 
-        added_masses, added_dampings = [], []
+    def _build_matrices(self, problem, faces=None):
+        """Assemble the influence matrices S and V of the problem.
+
+        If the indices of some faces are given, only the rows of the matrices
+        corresponding to these collocation points are assembled.
+        """
+        self._initialize_green_function(problem)
+
+        if faces is None:
+            collocation_body = problem.body
+        else:
+            collocation_body = problem.body.as_FloatingBody().extract_faces(faces)
 
-        S, V = problem.body.build_matrices(
+        return collocation_body.build_matrices(
             problem.body,
             free_surface=problem.free_surface,
             sea_bottom=problem.sea_bottom,
-            wavenumber=problem.wavenumber
+            wavenumber=problem.wavenumber,
+            nb_threads=self.nb_threads,
+            low_rank_distance=self.low_rank_distance,
+            low_rank_tol=self.low_rank_tol,
+            return_block_matrix=(self.linear_solver != "direct"),
         )
 
+    def _right_hand_side(self, problem):
+        """The normal velocities on the body, for each dof of a radiation
+        problem (as columns) or for the incoming waves of a diffraction problem."""
+        if isinstance(problem, RadiationProblem):
+            return problem.body.dofs.matrix.T
+        elif isinstance(problem, DiffractionProblem):
+            return -(problem.Airy_wave_velocity(problem.body.faces_centers) *
+                     problem.body.faces_normals
+                     ).sum(axis=1)
+
+    def _solve_with_matrices(self, problem, S, V, keep_details=False):
+        """Solve the BEM problem given its influence matrices S and V."""
+
         if keep_details:
             problem.S = S
             problem.V = V
 
-        if isinstance(S, BlockCirculantMatrix):
-            identity = block_circulant_identity(V.nb_blocks, V.block_size, dtype=np.float32)
-        elif isinstance(S, BlockToeplitzMatrix):
-            identity = block_Toeplitz_identity(V.nb_blocks, V.block_size, dtype=np.float32)
+        # Solve all the radiation problems at once with the dofs as right-hand sides.
+        # The system matrix is V + I/2, whose diagonal is shifted without building an identity matrix.
+        if self.linear_solver != "direct" and isinstance(V, BlockMatrix):
+            residuals = []
+            sources = block_iterative_solve(shift_diagonal(V, 1/2), self._right_hand_side(problem),
+                                            method=self.linear_solver, tol=self.block_solver_tol,
+                                            maxiter=self.block_solver_maxiter, residuals=residuals)
+            if keep_details:
+                problem.residuals = residuals
+        elif isinstance(V, np.ndarray) and not keep_details:
+            # The dense matrix V is assembled for this problem only, so its diagonal can be shifted in place.
+            sources = solve(shift_diagonal(V, 1/2, inplace=True), self._right_hand_side(problem),
+                            nb_threads=self.nb_threads)
         else:
-            identity = np.identity(V.shape[0], dtype=np.float32)
+            # V is kept in the problem, or its blocks may be shared with other matrices.
+            sources = solve(V, self._right_hand_side(problem), diagonal_shift=1/2, nb_threads=self.nb_threads)
+        potential = S @ sources
+
+        return self._post_process(problem, sources, potential, keep_details=keep_details)
+
+    def _post_process(self, problem, sources, potential, keep_details=False):
+        """Compute the forces on the body from the sources and the potential."""
 
         if isinstance(problem, RadiationProblem):
-            for dof_name, radiating_dof in problem.body.dofs.items():
-                sources = solve(V + identity/2, radiating_dof)
-                potential = S @ sources
+            dofs = problem.body.dofs
 
-                if keep_details:
-                    problem.sources[dof_name] = sources
-                    problem.potential[dof_name] = potential
+            if keep_details:
+                for i, dof_name in enumerate(dofs):
+                    problem.sources[dof_name] = sources[:, i]
+                    problem.potential[dof_name] = potential[:, i]
 
-                for _, influenced_dof in problem.body.dofs.items():
-                    complex_coef = - problem.rho * \
-                        potential @ (influenced_dof * problem.body.faces_areas)
+            complex_coefs = - problem.rho * dofs.integrate(potential, problem.body.faces_areas).T
 
-                    added_masses.append(complex_coef.real)
-                    added_dampings.append(problem.omega * complex_coef.imag)
+            added_masses = complex_coefs.real
+            if problem.omega < np.infty:
+                added_dampings = problem.omega * complex_coefs.imag
+            else:
+                added_dampings = np.zeros(complex_coefs.shape)
 
             LOG.info("Problem solved!")
 
-            return np.array(added_masses).reshape((problem.body.nb_dofs, problem.body.nb_dofs)), \
-                   np.array(added_dampings).reshape((problem.body.nb_dofs, problem.body.nb_dofs))
+            return added_masses, added_dampings
 
         elif isinstance(problem, DiffractionProblem):
-            normal_velocities = -(problem.Airy_wave_velocity(problem.body.faces_centers) *
-                                  problem.body.faces_normals
-                                  ).sum(axis=1)
-            sources = solve(V + identity/2, normal_velocities)
-            potential = S @ sources
-
             if keep_details:
                 problem.sources = sources
                 problem.potential = potential
 
-            forces = []
-            for _, influenced_dof in problem.body.dofs.items():
-                force = - problem.rho * \
-                    potential @ (influenced_dof * problem.body.faces_areas)
-                forces.append(force)
+            forces = - problem.rho * problem.body.dofs.integrate(potential, problem.body.faces_areas)
 
             LOG.info("Problem solved!")
 
-            return np.array(forces)
+            return forces
 
     def solve_all(self, problems, processes=1):
+        """Solve several problems in parallel processes.
+
+        If problems is a ProblemSet, the results are returned as arrays shaped
+        like its grid (see ProblemSet.gather_results).
+        """
         from multiprocessing import Pool
         pool = Pool(processes=processes)
-        return pool.map(self.solve, problems)
+        results = pool.map(self.solve, problems)
+        if isinstance(problems, ProblemSet):
+            return problems.gather_results(results)
+        else:
+            return results
+
+    def solve_pipeline(self, problems, keep_details=False, queue_depth=1):
+        """Solve the problems one after the other, while the matrices of the
+        next problems are assembled in a background thread.
+
+        The assembly (Fortran, single-threaded) of a problem can thus overlap
+        with the linear solve (multithreaded BLAS) and post-processing of the
+        previous one.
+
+        Parameters
+        ----------
+        problems: iterable of problems
+        keep_details: bool
+            see Nemoh.solve
+        queue_depth: int
+            maximum number of problems assembled in advance, to limit the
+            memory used by the stored matrices.
+
+        Yields
+        ------
+        the results of Nemoh.solve for each problem, in the same order.
+        """
+        from queue import Queue
+        from threading import Thread, Event
+
+        assembled = Queue(maxsize=queue_depth)
+        stop = Event()
+        end_of_problems = object()
+
+        def assemble():
+            try:
+                for problem in problems:
+                    if stop.is_set():
+                        return
+                    LOG.info("Assemble %s in background.", problem)
+                    assembled.put((problem, *self._build_matrices(problem)))
+            except Exception as error:
+                assembled.put(error)
+            else:
+                assembled.put(end_of_problems)
+
+        assembly_thread = Thread(target=assemble, daemon=True)
+        assembly_thread.start()
+
+        try:
+            while True:
+                item = assembled.get()
+                if item is end_of_problems:
+                    break
+                elif isinstance(item, Exception):
+                    raise item
+                problem, S, V = item
+                LOG.info("Solve %s.", problem)
+                yield self._solve_with_matrices(problem, S, V, keep_details=keep_details)
+        finally:
+            # Unblock the assembly thread if the iteration is interrupted.
+            stop.set()
+            while assembly_thread.is_alive():
+                while not assembled.empty():
+                    assembled.get()
+                assembly_thread.join(timeout=0.1)
+
+    async def solve_pipeline_async(self, problems, keep_details=False, queue_depth=1):
+        """Asynchronous iterator over the results of Nemoh.solve_pipeline.
+
+        The blocking computations are run in the default executor of the
+        event loop, so that other tasks can run in the meantime.
+
+        Usage
+        -----
+        async for result in solver.solve_pipeline_async(problems):
+            ...
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        pipeline = self.solve_pipeline(problems, keep_details=keep_details, queue_depth=queue_depth)
+        end_of_results = object()
+        pending = None
+        try:
+            while True:
+                pending = loop.run_in_executor(None, next, pipeline, end_of_results)
+                # Shielded such that the call to next is not forgotten if the consumer is cancelled.
+                result = await asyncio.shield(pending)
+                if result is end_of_results:
+                    break
+                yield result
+        finally:
+            if pending is not None and not pending.done():
+                # The generator can only be closed once the call to next has returned.
+                await asyncio.wait([pending])
+            pipeline.close()
 
     def get_potential_on_mesh(self, problem, mesh, dof=None):
         LOG.info(f"Compute potential on {mesh.name} for {problem}.")
@@ -118,7 +290,11 @@ class Nemoh:
             else:
                 raise Exception(f"{problem} need to be solved with Nemoh.solve before computing potential anywhere.")
 
-        S, _ = mesh.build_matrices(
+        # If the mesh has the symmetries of the body, the matrix S is block
+        # Toeplitz or block circulant, but the faces of the mesh are reordered.
+        symmetric_mesh, permutation = match_symmetries(mesh, problem.body)
+
+        S, _ = symmetric_mesh.build_matrices(
             problem.body,
             free_surface=problem.free_surface,
             sea_bottom=problem.sea_bottom,
@@ -129,9 +305,12 @@ class Nemoh:
             if dof is None:
                 raise Exception("Please chose a degree of freedom.")
             else:
-                phi = S @ problem.sources[dof]
+                symmetric_phi = S @ problem.sources[dof]
         elif isinstance(problem, DiffractionProblem):
-            phi = S @ problem.sources
+            symmetric_phi = S @ problem.sources
+
+        phi = np.empty(symmetric_phi.shape, dtype=symmetric_phi.dtype)
+        phi[permutation] = symmetric_phi
 
         LOG.info(f"Done computing potential on {mesh.name} for {problem}.")
 
@@ -147,6 +147,9 @@ CONTAINS
     REAL, DIMENSION(nb_faces_1, nb_faces_2), INTENT(OUT) :: S
     REAL, DIMENSION(nb_faces_1, nb_faces_2), INTENT(OUT) :: V
 
+    ! Release Python's GIL during the computation.
+    !f2py threadsafe
+
     ! Local variables
     INTEGER :: I, J
     REAL                  :: SP1
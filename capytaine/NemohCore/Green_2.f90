@@ -311,6 +311,9 @@ CONTAINS
     COMPLEX, DIMENSION(nb_faces_1, nb_faces_2), INTENT(OUT) :: S
     COMPLEX, DIMENSION(nb_faces_1, nb_faces_2), INTENT(OUT) :: V
 
+    ! Release Python's GIL during the computation.
+    !f2py threadsafe
+
     ! Local variables
     INTEGER               :: I, J
     COMPLEX               :: SP2
@@ -2,55 +2,139 @@
 # coding: utf-8
 
 import logging
-from itertools import product
+import os
+from numbers import Number
 
 import numpy as np
 
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    # Optional dependency, used to avoid the oversubscription of the cores by the BLAS in parallel solves.
+    threadpool_limits = None
+
+from capytaine.low_rank_matrices import LowRankMatrix
+from capytaine.iterative_solvers import gmres
+
 LOG = logging.getLogger(__name__)
 
 
 class BlockToeplitzMatrix:
-    """A symmetric block Toeplitz matrix stored as a list of matrices."""
+    """A symmetric block Toeplitz matrix stored as its first row of blocks.
+
+    The blocks may be rectangular, e.g. for the interactions between two
+    different bodies with the same symmetry.
+
+    The unique blocks are stored in a single array of shape (nb_blocks, n, m),
+    so that the arithmetic operations are vectorized over the blocks.
+    The blocks can also be block Toeplitz matrices themselves, for nested
+    symmetries, in which case they are stored in a list.
+
+    The products with arrays are computed with FFTs, by embedding the matrix
+    in a block circulant matrix.
+    """
+
+    # Make numpy call the reflected operators below (e.g. array @ BlockToeplitzMatrix).
+    __array_ufunc__ = None
 
     def __init__(self, blocks, size=None):
         """
         Parameters
         ----------
-        blocks: list of square matrices
+        blocks: list of matrices or array of shape (nb_blocks, n, m)
             the blocks of the first row (or the first column) of the block matrix.
-            they should be square matrices of the same size and the same type.
+            they should be matrices of the same shape and the same type.
+            An array of blocks is stored without copy.
+        size: int, optional
+            number of blocks of the matrix, if only the first blocks of the list are used.
         """
-
         if size is not None:
             blocks = blocks[:size]
+        self._nb_blocks = len(blocks)
+        self._set_unique_blocks(blocks)
+
+    def _set_unique_blocks(self, blocks):
+        """Store the unique blocks, in a single array unless they are structured matrices."""
+        # The blocks can be block Toeplitz matrices themselves, e.g. for a body
+        # with two planes of symmetry, as long as all of them have the same structure.
+        nested = all(isinstance(block, blocks[0].__class__) and block.nb_blocks == blocks[0].nb_blocks
+                     for block in blocks) if isinstance(blocks[0], BlockToeplitzMatrix) else False
+
+        if isinstance(blocks, np.ndarray):
+            assert blocks.ndim == 3
+            self._unique_blocks = blocks
+        elif nested:
+            for block in blocks:
+                assert block.shape == blocks[0].shape
+                assert block.dtype == blocks[0].dtype
+            self._unique_blocks = list(blocks)
+        else:
+            blocks = [block if isinstance(block, np.ndarray) else block.full_matrix() for block in blocks]
+            for block in blocks:
+                assert len(block.shape) == 2
+                assert block.shape == blocks[0].shape
+                assert block.dtype == blocks[0].dtype
+            self._unique_blocks = np.array(blocks)
+
+        # Fourier transform of the blocks of the embedding circulant matrix, computed when needed.
+        self._circulant_fft = None
+
+    def _new(self, unique_blocks):
+        """Matrix with the same structure as self and the given unique blocks."""
+        new = object.__new__(self.__class__)
+        new._nb_blocks = self._nb_blocks
+        new._set_unique_blocks(unique_blocks)
+        return new
+
+    def _map(self, function, *others):
+        """Matrix with the same structure as self whose unique blocks are
+        function(block of self, blocks of others...)."""
+        if self.is_nested:
+            return self._new([function(*blocks) for blocks in zip(self._unique_blocks, *others)])
+        else:
+            return self._new(function(self._unique_blocks, *others))
 
-        self.blocks = []
-        self.dtype = blocks[0].dtype
+    @property
+    def is_nested(self):
+        """Whether the blocks are structured matrices themselves."""
+        return not isinstance(self._unique_blocks, np.ndarray)
 
-        for block in blocks:
-            if isinstance(block, BlockToeplitzMatrix):
-                # Recursive block matrices not implemented yet.
-                self.blocks.append(block.full_matrix())
-            else:
-                self.blocks.append(block)
+    @property
+    def blocks(self):
+        """The blocks of the first row of the matrix."""
+        return self._unique_blocks
+
+    @property
+    def _block_indices(self):
+        """Index in the unique blocks of each block of the first row."""
+        return range(self.nb_blocks)
 
-        for block in self.blocks:
-            assert len(block.shape) == 2
-            assert block.shape[0] == self.block_size
-            assert block.shape[1] == self.block_size
-            assert block.dtype == self.dtype
+    @property
+    def _nb_circulant_blocks(self):
+        """Number of blocks of the symmetric block circulant matrix in which
+        the matrix is embedded. Its unique blocks are the blocks of self."""
+        return 2*self.nb_blocks - 1 if self.nb_blocks > 2 else self.nb_blocks
 
     @property
     def shape(self):
-        return self.nb_blocks*self.block_size, self.nb_blocks*self.block_size
+        return self.nb_blocks*self.block_shape[0], self.nb_blocks*self.block_shape[1]
+
+    @property
+    def dtype(self):
+        return self._unique_blocks[0].dtype
 
     @property
     def nb_blocks(self):
-        return len(self.blocks)
+        return self._nb_blocks
+
+    @property
+    def block_shape(self):
+        return self._unique_blocks[0].shape
 
     @property
     def block_size(self):
-        return self.blocks[0].shape[0]
+        """Size of the blocks, assuming that they are square."""
+        return self._unique_blocks[0].shape[0]
 
     def __eq__(self, other):
         if isinstance(other, BlockToeplitzMatrix):
@@ -62,22 +146,26 @@ class BlockToeplitzMatrix:
         else:
             raise NotImplemented
 
+    def _same_structure(self, other):
+        return (other.__class__ is self.__class__
+                and other.nb_blocks == self.nb_blocks
+                and other.block_shape == self.block_shape
+                and other.is_nested == self.is_nested)
+
     def __add__(self, other):
-        if isinstance(other, int) or isinstance(other, float):
-            new_blocks = []
-            for i in range(self.nb_blocks):
-                new_blocks.append(self.blocks[i] + other)
-            return self.__class__(new_blocks, size=self.nb_blocks)
+        if isinstance(other, Number):
+            return self._map(lambda blocks: blocks + other)
 
-        elif isinstance(other, self.__class__):
+        elif isinstance(other, self.__class__) and self._same_structure(other):
             # Keep the symmetric block Toeplitz structure
             # NB: we use self.__class__ so that the method can be inherited by BlockCirculantMatrix.
+            return self._map(lambda blocks, other_blocks: blocks + other_blocks, other._unique_blocks)
+
+        elif isinstance(other, self.__class__):
+            # Sum of a block Toeplitz matrix and a block circulant matrix.
             assert other.nb_blocks == self.nb_blocks
-            assert other.block_size == self.block_size
-            new_blocks = []
-            for i in range(self.nb_blocks):
-                new_blocks.append(self.blocks[i] + other.blocks[i])
-            return self.__class__(new_blocks, size=self.nb_blocks)
+            other_blocks = other.blocks
+            return BlockToeplitzMatrix([self.blocks[i] + other_blocks[i] for i in range(self.nb_blocks)])
 
         else:
             # Lose the symmetric block Toeplitz structure
@@ -94,17 +182,11 @@ class BlockToeplitzMatrix:
         return (-self).__add__(other)
 
     def __neg__(self):
-        new_blocks = []
-        for i in range(self.nb_blocks):
-            new_blocks.append(- self.blocks[i])
-        return self.__class__(new_blocks, size=self.nb_blocks)
+        return self._map(lambda blocks: -blocks)
 
     def __mul__(self, other):
-        if isinstance(other, int) or isinstance(other, float):
-            new_blocks = []
-            for i in range(self.nb_blocks):
-                new_blocks.append(self.blocks[i] * other)
-            return self.__class__(new_blocks, size=self.nb_blocks)
+        if isinstance(other, Number):
+            return self._map(lambda blocks: blocks * other)
         elif isinstance(other, np.ndarray):
             return self.full_matrix() * other
         else:
@@ -114,49 +196,153 @@ class BlockToeplitzMatrix:
         # Multiplication is commutative
         return self.__mul__(other)
 
-    def __matmul__(self, other):
-        if isinstance(other, np.ndarray):
-            if self.nb_blocks*self.block_size != other.shape[0]:
-                raise Exception("Size of the matrices does not match!")
-            result = np.zeros(other.shape, dtype=self.dtype)
-            for i, j in product(range(self.nb_blocks), repeat=2):
-                result[i*self.block_size:(i+1)*self.block_size] += \
-                    self.blocks[abs(i-j)] @ other[j*self.block_size:(j+1)*self.block_size]
-            return result
+    def __truediv__(self, other):
+        if isinstance(other, Number):
+            return self._map(lambda blocks: blocks / other)
         else:
             raise NotImplemented
 
-    def __rmatmul__(self, other):
-        if isinstance(other, np.ndarray):
-            return other @ self.full_matrix()
+    def __rtruediv__(self, other):
+        if isinstance(other, Number):
+            return self._map(lambda blocks: other / blocks)
         else:
             raise NotImplemented
 
-    def __truediv__(self, other):
-        if isinstance(other, int) or isinstance(other, float):
-            new_blocks = []
-            for i in range(self.nb_blocks):
-                new_blocks.append(self.blocks[i] / other)
-            return self.__class__(new_blocks, size=self.nb_blocks)
+    def _inplace(self, function, other):
+        """Apply the elementwise ufunc to the array of blocks in place.
+
+        Return NotImplemented (that is, let Python use the usual operator)
+        if the result does not fit in the array of blocks."""
+        if self.is_nested:
+            # The nested blocks might be shared with other matrices.
+            return NotImplemented
+        elif isinstance(other, Number):
+            operand = other
+        elif isinstance(other, BlockToeplitzMatrix) and self._same_structure(other):
+            operand = other._unique_blocks
         else:
-            raise NotImplemented
+            return NotImplemented
 
-    def __rtruediv__(self, other):
-        if isinstance(other, int) or isinstance(other, float):
-            new_blocks = []
-            for i in range(self.nb_blocks):
-                new_blocks.append(other / self.blocks[i])
-            return self.__class__(new_blocks, size=self.nb_blocks)
+        if np.result_type(self._unique_blocks, operand) != self.dtype:
+            return NotImplemented
+
+        function(self._unique_blocks, operand, out=self._unique_blocks)
+        self._circulant_fft = None
+        return self
+
+    def __iadd__(self, other):
+        return self._inplace(np.add, other)
+
+    def __isub__(self, other):
+        return self._inplace(np.subtract, other)
+
+    def __imul__(self, other):
+        if isinstance(other, Number):
+            return self._inplace(np.multiply, other)
         else:
-            raise NotImplemented
+            return NotImplemented
+
+    def __itruediv__(self, other):
+        if isinstance(other, Number):
+            return self._inplace(np.true_divide, other)
+        else:
+            return NotImplemented
+
+    def shift_diagonal(self, alpha):
+        """Add alpha times the identity matrix to self, in place.
+
+        Only the first unique block is modified. Return self, or a new
+        matrix if the result does not fit in the array of blocks."""
+        if self.is_nested:
+            # The list of blocks belongs to self, but not the nested blocks themselves.
+            self._unique_blocks[0] = shift_diagonal(self._unique_blocks[0], alpha)
+        elif np.result_type(self._unique_blocks, alpha) != self.dtype:
+            return shift_diagonal(self, alpha)
+        else:
+            _shift_dense_diagonal(self._unique_blocks[0], alpha)
+        self._circulant_fft = None
+        return self
+
+    def _get_circulant_fft(self):
+        """Fourier transform of the blocks of the embedding block circulant matrix."""
+        if self._circulant_fft is None:
+            # Stored until the matrix is modified in place.
+            self._circulant_fft = _symmetric_circulant_fft(self._unique_blocks, self._nb_circulant_blocks)
+        return self._circulant_fft
+
+    def _fft_matvec(self, other, transpose=False):
+        """Product of self (or its transpose) with the array other of shape
+        (N,) or (N, k), computed by FFT over the blocks of the embedding
+        block circulant matrix.
+
+        For p blocks of shape (n, m), it costs O(p (n m k + (n+m) k log p))
+        operations instead of O(p² n m k).
+        """
+        circulant_fft = self._get_circulant_fft()
+        if transpose:
+            circulant_fft = circulant_fft.transpose(0, 2, 1)
+
+        nb_circulant_blocks, n, m = circulant_fft.shape
+        if other.shape[0] != self.nb_blocks*m:
+            raise Exception("Size of the matrices does not match!")
+
+        other_fft = np.fft.fft(other.reshape(self.nb_blocks, m, -1), n=nb_circulant_blocks, axis=0)
+        result = np.fft.ifft(circulant_fft @ other_fft, axis=0)[:self.nb_blocks]
+        result = result.reshape(self.nb_blocks*n, *other.shape[1:])
+
+        if np.iscomplexobj(self._unique_blocks) or np.iscomplexobj(other):
+            return result.astype(np.result_type(self.dtype, other), copy=False)
+        else:
+            return result.real.astype(np.result_type(self.dtype, other), copy=False)
+
+    def _nested_matvec(self, other):
+        """Product of self with an array, block by block, using the products
+        of the structured blocks."""
+        n, m = self.block_shape
+        if other.shape[0] != self.shape[1]:
+            raise Exception("Size of the matrices does not match!")
+        blocks = self.blocks
+        result = np.zeros((self.shape[0], *other.shape[1:]), dtype=np.result_type(self.dtype, other))
+        for i in range(self.nb_blocks):
+            for j in range(self.nb_blocks):
+                result[i*n:(i+1)*n] += blocks[abs(i-j)] @ other[j*m:(j+1)*m]
+        return result
+
+    def __matmul__(self, other):
+        if isinstance(other, np.ndarray):
+            if self.is_nested:
+                return self._nested_matvec(other)
+            else:
+                return self._fft_matvec(other)
+        else:
+            return NotImplemented
+
+    def __rmatmul__(self, other):
+        if isinstance(other, np.ndarray):
+            if self.is_nested:
+                n, m = self.block_shape
+                if other.shape[-1] != self.shape[0]:
+                    raise Exception("Size of the matrices does not match!")
+                blocks = self.blocks
+                result = np.zeros((*other.shape[:-1], self.shape[1]), dtype=np.result_type(self.dtype, other))
+                for i in range(self.nb_blocks):
+                    for j in range(self.nb_blocks):
+                        result[..., j*m:(j+1)*m] += other[..., i*n:(i+1)*n] @ blocks[abs(i-j)]
+                return result
+            else:
+                # other @ self = (self^T @ other^T)^T
+                return self._fft_matvec(other.T, transpose=True).T
+        else:
+            return NotImplemented
 
     def full_matrix(self):
         """Return the matrix as an usual array not using the symmetry."""
+        n, m = self.block_shape
+        blocks = [block if isinstance(block, np.ndarray) else block.full_matrix() for block in self.blocks]
         full_matrix = np.empty(self.shape, dtype=self.dtype)
         for i in range(self.nb_blocks):
             for j in range(self.nb_blocks):
-                full_matrix[i*self.block_size:(i+1)*self.block_size,
-                            j*self.block_size:(j+1)*self.block_size] = self.blocks[abs(j-i)]
+                full_matrix[i*n:(i+1)*n, j*m:(j+1)*m] = blocks[abs(j-i)]
         return full_matrix
 
 
@@ -170,64 +356,518 @@ def block_Toeplitz_identity(nb_blocks, block_size, **kwargs):
 
 class BlockCirculantMatrix(BlockToeplitzMatrix):
     """A symmetric block circulant matrix stored as a list of matrices.
+
+    Only the unique blocks, that is about half of the first row of blocks, are stored.
     """
 
     def __init__(self, blocks, size=None):
         """
         Parameters
         ----------
-        blocks: list of square matrices
+        blocks: list of square matrices or array of shape (nb_unique_blocks, n, n)
             half of the blocks of the first row (or the first column) of the block matrix.
             they should be square matrices of the same size and the same type.
+        size: int, optional
+            number of blocks of the matrix. By default, it is even: 2*(len(blocks)-1).
         """
         if size is None:
-            BlockToeplitzMatrix.__init__(self, blocks + blocks[-2:0:-1])
-        elif size % 2 == 0:
-            blocks = blocks[:size//2+1]
-            return BlockToeplitzMatrix.__init__(self, blocks + blocks[-2:0:-1])
-        else:
-            blocks = blocks[:size//2+1]
-            return BlockToeplitzMatrix.__init__(self, blocks + blocks[-1:0:-1])
+            size = max(2*(len(blocks) - 1), 1)
+        self._nb_blocks = size
+        self._set_unique_blocks(blocks[:size//2+1])
+
+    @property
+    def blocks(self):
+        """The blocks of the first row of the matrix.
+        They are views of the unique blocks, the same object for symmetric positions."""
+        return [self._unique_blocks[i] for i in self._block_indices]
+
+    @property
+    def _block_indices(self):
+        return [min(k, self.nb_blocks - k) for k in range(self.nb_blocks)]
+
+    @property
+    def _nb_circulant_blocks(self):
+        return self.nb_blocks
 
 
 def block_circulant_identity(nb_blocks, block_size, **kwargs):
     """Return the identity matrix as a block Circulant matrix of specified size."""
-    I = block_Toeplitz_identity(nb_blocks, block_size, **kwargs)
-    I.__class__ = BlockCirculantMatrix
-    return I
+    return BlockCirculantMatrix(
+        [np.identity(block_size, **kwargs)] +
+        [np.zeros((block_size, block_size), **kwargs) for _ in range(nb_blocks//2)],
+        size=nb_blocks
+    )
+
+
+def _circulant_mode_weights(nb_blocks):
+    """Real matrix W such that the k-th block of the discrete Fourier transform
+    of the first column of a symmetric block circulant matrix of nb_blocks
+    blocks is sum_l W[k, l] * unique_blocks[l]."""
+    k = np.arange(nb_blocks)[:, np.newaxis]
+    l = np.arange(nb_blocks//2 + 1)[np.newaxis, :]
+    weights = 2*np.cos(2*np.pi*k*l/nb_blocks)
+    weights[:, 0] = 1.0
+    if nb_blocks % 2 == 0 and nb_blocks > 0:
+        # The middle block appears only once in the first column.
+        weights[:, -1] /= 2
+    return weights
+
+
+def _symmetric_circulant_fft(unique_blocks, nb_blocks):
+    """Discrete Fourier transform over the first axis of the first column
+    of blocks of a symmetric block circulant matrix, computed from its
+    unique blocks without building the full column.
+
+    With F the FFT of the unique blocks padded with zeros, the FFT of the
+    full column is F[k] + F[-k] - (the blocks counted twice)."""
+    unique_blocks = np.asarray(unique_blocks)
+    fft = np.fft.fft(unique_blocks, n=nb_blocks, axis=0)
+    fft += fft[-np.arange(nb_blocks) % nb_blocks]
+    fft -= unique_blocks[0]
+    if nb_blocks % 2 == 0:
+        fft -= (-1)**np.arange(nb_blocks)[:, np.newaxis, np.newaxis] * unique_blocks[nb_blocks//2]
+    if np.iscomplexobj(unique_blocks):
+        return fft
+    else:
+        # The transform of a real symmetric sequence is real.
+        return np.ascontiguousarray(fft.real)
+
+
+class BlockMatrix:
+    """A matrix stored as a 2D grid of blocks, without any assumption on the
+    structure of the grid.
+
+    The blocks can be arrays or other matrices (e.g. LowRankMatrix)
+    supporting the same operations. The same block may appear several times
+    in the grid without being copied.
+    """
+
+    # Make numpy call the reflected operators below (e.g. array + BlockMatrix).
+    __array_ufunc__ = None
+
+    def __init__(self, blocks):
+        """
+        Parameters
+        ----------
+        blocks: list of lists of matrices
+            the rows of blocks of the matrix. The blocks of the same row
+            (resp. column) should have the same number of rows (resp. columns).
+        """
+        self.blocks = [list(row) for row in blocks]
+
+        for row in self.blocks:
+            assert len(row) == self.nb_blocks[1]
+            for block, nb_columns in zip(row, self.blocks_columns):
+                assert len(block.shape) == 2
+                assert block.shape[0] == row[0].shape[0]
+                assert block.shape[1] == nb_columns
+
+    @property
+    def nb_blocks(self):
+        return len(self.blocks), len(self.blocks[0])
+
+    @property
+    def blocks_rows(self):
+        """The number of rows of each row of blocks."""
+        return [row[0].shape[0] for row in self.blocks]
+
+    @property
+    def blocks_columns(self):
+        """The number of columns of each column of blocks."""
+        return [block.shape[1] for block in self.blocks[0]]
+
+    @property
+    def shape(self):
+        return sum(self.blocks_rows), sum(self.blocks_columns)
+
+    @property
+    def dtype(self):
+        return np.result_type(*(block.dtype for row in self.blocks for block in row))
+
+    def _apply(self, function):
+        """New block matrix with function applied to each block, computing
+        only once the blocks appearing several times."""
+        new_blocks = {}
+        for row in self.blocks:
+            for block in row:
+                if id(block) not in new_blocks:
+                    new_blocks[id(block)] = function(block)
+        return BlockMatrix([[new_blocks[id(block)] for block in row] for row in self.blocks])
+
+    def __add__(self, other):
+        if isinstance(other, BlockMatrix):
+            assert other.blocks_rows == self.blocks_rows
+            assert other.blocks_columns == self.blocks_columns
+            sums = {}
+            for row, other_row in zip(self.blocks, other.blocks):
+                for a, b in zip(row, other_row):
+                    if (id(a), id(b)) not in sums:
+                        sums[(id(a), id(b))] = a + b
+            return BlockMatrix([[sums[(id(a), id(b))] for a, b in zip(row, other_row)]
+                                for row, other_row in zip(self.blocks, other.blocks)])
+        else:
+            return self.full_matrix() + other
+
+    def __radd__(self, other):
+        # Addition is commutative
+        return self.__add__(other)
 
+    def __sub__(self, other):
+        return self.__add__(-other)
 
-def solve(A, b):
-    """Solve the linear system Ax = b"""
+    def __rsub__(self, other):
+        return (-self).__add__(other)
+
+    def __neg__(self):
+        return self._apply(lambda block: -block)
+
+    def __mul__(self, other):
+        if isinstance(other, Number):
+            return self._apply(lambda block: block * other)
+        else:
+            return self.full_matrix() * other
+
+    def __rmul__(self, other):
+        # Multiplication is commutative
+        return self.__mul__(other)
+
+    def __truediv__(self, other):
+        if isinstance(other, Number):
+            return self._apply(lambda block: block / other)
+        else:
+            return self.full_matrix() / other
+
+    def __matmul__(self, other):
+        if isinstance(other, np.ndarray):
+            if self.shape[1] != other.shape[0]:
+                raise Exception("Size of the matrices does not match!")
+            columns = np.cumsum([0] + self.blocks_columns)
+            result = []
+            for row in self.blocks:
+                row_result = 0
+                for j, block in enumerate(row):
+                    row_result = row_result + block @ other[columns[j]:columns[j+1]]
+                result.append(row_result)
+            return np.concatenate(result, axis=0)
+        else:
+            return NotImplemented
+
+    def __rmatmul__(self, other):
+        if isinstance(other, np.ndarray):
+            return other @ self.full_matrix()
+        else:
+            return NotImplemented
+
+    def full_matrix(self):
+        """Return the matrix as an usual array."""
+        return np.block([[block if isinstance(block, np.ndarray) else block.full_matrix()
+                          for block in row] for row in self.blocks])
+
+
+def block_identity(blocks_sizes, **kwargs):
+    """Return the identity matrix as a BlockMatrix with the given sizes of
+    diagonal blocks. The off-diagonal blocks are stored as matrices of rank 0.
+    Blocks of the same size are the same object."""
+    identities = {size: np.identity(size, **kwargs) for size in blocks_sizes}
+    zeros = {(size_i, size_j): LowRankMatrix.zeros((size_i, size_j), **kwargs)
+             for size_i in blocks_sizes for size_j in blocks_sizes}
+    return BlockMatrix([[identities[size_i] if i == j else zeros[(size_i, size_j)]
+                         for j, size_j in enumerate(blocks_sizes)]
+                        for i, size_i in enumerate(blocks_sizes)])
+
+
+def block_Levinson_solve(blocks, b, diagonal_shift=0.0):
+    """Solve the linear system Ax = b where A is the symmetric block Toeplitz
+    matrix whose first row of blocks is given, with the block Levinson recursion.
+
+    The solutions of the leading k×k blocks subsystems are updated for
+    increasing k, using the solutions of the forward and backward systems
+    T_k f_k = [I, 0, ..., 0]^T and T_k g_k = [0, ..., 0, I]^T.
+    For p blocks of size n, it costs O(p² n³) operations instead of O(p³ n³)
+    for the dense solver, and only O(p n²) additional memory.
+
+    Parameters
+    ----------
+    blocks: list of p square matrices of size n
+        the blocks of the first row of A (the block (i, j) of A is blocks[|i-j|])
+    b: array of shape (p*n,) or (p*n, m)
+        the right-hand side(s)
+    diagonal_shift: number, optional
+        solve (A + diagonal_shift*I) x = b instead.
+    """
+    nb_blocks, n = len(blocks), blocks[0].shape[0]
+    # Double precision, to limit the accumulation of rounding errors in the recursion.
+    dtype = np.result_type(blocks[0], b, diagonal_shift, np.float64)
+    T = np.asarray(blocks, dtype=dtype)
+    I = np.identity(n)
+
+    # The first row of blocks [T_0, T_1, ..., T_(p-1)] and the same in reversed order,
+    # as (n, p*n) arrays, so that the products with the rows of blocks are matrix products.
+    row = T.transpose(1, 0, 2).reshape(n, nb_blocks*n)
+    reversed_row = T[::-1].transpose(1, 0, 2).reshape(n, nb_blocks*n)
+
+    bb = np.reshape(b, (nb_blocks*n, -1))
+
+    # Forward and backward vectors and solution, as (k*n, n) and (k*n, m) arrays.
+    f = np.empty((nb_blocks*n, n), dtype=dtype)
+    g = np.empty((nb_blocks*n, n), dtype=dtype)
+    new_g = np.empty((nb_blocks*n, n), dtype=dtype)
+    x = np.empty(bb.shape, dtype=dtype)
+
+    # The shift of the diagonal only changes the diagonal block T_0.
+    f[:n] = g[:n] = np.linalg.inv(T[0] + diagonal_shift*I)
+    x[:n] = g[:n] @ bb[:n]
+
+    for k in range(1, nb_blocks):
+        # Residuals of the current vectors padded with zeros, on the new row of blocks.
+        # The new row of blocks of the matrix is [T_k, T_(k-1), ..., T_1] (then T_0 on the diagonal).
+        last_row = reversed_row[:, (nb_blocks-1-k)*n:(nb_blocks-1)*n]
+        epsilon_f = last_row @ f[:k*n]
+        epsilon_g = row[:, n:(k+1)*n] @ g[:k*n]
+        epsilon_x = last_row @ x[:k*n]
+
+        alpha = np.linalg.inv(I - epsilon_g @ epsilon_f)
+        delta = np.linalg.inv(I - epsilon_f @ epsilon_g)
+
+        # f <- [f; 0] α - [0; g] ε_f α  and  g <- [0; g] δ - [f; 0] ε_g δ
+        new_g[:n] = 0.0
+        new_g[n:(k+1)*n] = g[:k*n] @ delta
+        new_g[:k*n] -= f[:k*n] @ (epsilon_g @ delta)
+        f[k*n:(k+1)*n] = 0.0
+        f[:(k+1)*n] = f[:(k+1)*n] @ alpha
+        f[n:(k+1)*n] -= g[:k*n] @ (epsilon_f @ alpha)
+        g, new_g = new_g, g
+
+        x[k*n:(k+1)*n] = 0.0
+        x[:(k+1)*n] += g[:(k+1)*n] @ (bb[k*n:(k+1)*n] - epsilon_x)
+
+    return x.reshape(b.shape)
+
+
+def _zeros_like(A):
+    """Zero matrix with the same structure as A. All the zero blocks are the same object."""
+    if isinstance(A, BlockToeplitzMatrix):
+        zero_block = _zeros_like(A.blocks[0])
+        return A.__class__([zero_block]*A.nb_blocks, size=A.nb_blocks)
+    else:
+        return np.zeros(A.shape, dtype=A.dtype)
+
+
+def identity_like(A, dtype=None):
+    """Identity matrix with the same structure as the square matrix A,
+    including the structure of nested blocks."""
+    if dtype is None:
+        dtype = A.dtype
+    if isinstance(A, BlockToeplitzMatrix):
+        identity_block = identity_like(A.blocks[0], dtype=dtype)
+        zero_block = _zeros_like(identity_block)
+        return A.__class__([identity_block] + [zero_block]*(A.nb_blocks-1), size=A.nb_blocks)
+    elif isinstance(A, BlockMatrix):
+        return block_identity(A.blocks_rows, dtype=dtype)
+    else:
+        return np.identity(A.shape[0], dtype=dtype)
+
+
+def _shift_dense_diagonal(A, alpha):
+    """Add alpha to the diagonal of the square array A (or of each matrix of
+    a stack of square matrices), in place."""
+    i = np.arange(A.shape[-1])
+    A[..., i, i] += alpha
+    return A
+
+
+def shift_diagonal(A, alpha, inplace=False):
+    """Return A + alpha*I, keeping the structure of A, without building an identity matrix.
+
+    Parameters
+    ----------
+    A: square matrix
+        array, block Toeplitz or block circulant matrix (possibly nested), or BlockMatrix
+    alpha: number
+    inplace: boolean
+        if True, modify A when the result fits in it and return it.
+        Otherwise, only the parts of A that are changed are copied: all the
+        blocks of a block Toeplitz matrix, but only the diagonal blocks of a
+        BlockMatrix.
+    """
+    if isinstance(A, BlockToeplitzMatrix):
+        if not inplace:
+            if A.is_nested:
+                A = A._new(list(A._unique_blocks))
+            else:
+                A = A._new(A._unique_blocks.astype(np.result_type(A._unique_blocks, alpha)))
+        return A.shift_diagonal(alpha)
+
+    elif isinstance(A, BlockMatrix):
+        assert A.blocks_rows == A.blocks_columns
+        # Diagonal blocks appearing several times are shifted once, and still shared.
+        shifted = {}
+        for i in range(A.nb_blocks[0]):
+            block = A.blocks[i][i]
+            if id(block) not in shifted:
+                shifted[id(block)] = shift_diagonal(block, alpha, inplace=inplace)
+        if inplace:
+            for i in range(A.nb_blocks[0]):
+                A.blocks[i][i] = shifted[id(A.blocks[i][i])]
+            return A
+        else:
+            return BlockMatrix([[shifted[id(block)] if i == j else block for j, block in enumerate(row)]
+                                for i, row in enumerate(A.blocks)])
+
+    elif isinstance(A, np.ndarray):
+        if not inplace or np.result_type(A, alpha) != A.dtype:
+            A = A.astype(np.result_type(A, alpha))
+        return _shift_dense_diagonal(A, alpha)
+
+    else:
+        return _shift_dense_diagonal(A.full_matrix().astype(np.result_type(A.dtype, alpha)), alpha)
+
+
+def solve(A, b, diagonal_shift=0.0, nb_threads=1):
+    """Solve the linear system (A + diagonal_shift*I) x = b
+
+    The right-hand side b can be a vector or a matrix whose columns are
+    several right-hand sides.
+
+    The shift of the diagonal is applied to the matrices built during the
+    resolution (Fourier modes, blocks sums...), so that neither A nor an
+    identity matrix need to be copied.
+
+    Nested block Toeplitz matrices are solved recursively.
+
+    The independent systems of the structured matrices (Fourier modes of
+    block circulant matrices, halves of 2×2 block Toeplitz matrices) are
+    solved concurrently by nb_threads threads, since LAPACK releases the GIL.
+    If threadpoolctl is installed, the number of threads of the BLAS is
+    reduced meanwhile, so that the cores are not oversubscribed."""
+    if nb_threads > 1 and threadpool_limits is not None:
+        with threadpool_limits(limits=max(1, (os.cpu_count() or 1)//nb_threads), user_api="blas"):
+            return _solve(A, b, diagonal_shift, nb_threads)
+    else:
+        return _solve(A, b, diagonal_shift, nb_threads)
+
+
+def _parallel_map(function, arguments, nb_threads):
+    """Same as list(map(function, arguments)), using up to nb_threads threads."""
+    arguments = list(arguments)
+    if nb_threads > 1 and len(arguments) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=min(nb_threads, len(arguments))) as executor:
+            return list(executor.map(function, arguments))
+    else:
+        return [function(argument) for argument in arguments]
+
+
+def _solve(A, b, diagonal_shift, nb_threads):
     if isinstance(A, BlockCirculantMatrix):
         LOG.debug("\tSolve linear system %i×%i BlockCirculantMatrix (block size: %i×%i)",
                   A.nb_blocks, A.nb_blocks, A.block_size, A.block_size)
-        AA = np.stack(A.blocks)
-        AAt = np.fft.fft(AA, axis=0)
-        b = np.reshape(b, (A.nb_blocks, A.block_size))
-        bt = np.fft.fft(b, axis=0)
-        xt = solve(AAt, bt)
+        # Stack of the right-hand sides for each block, always as a matrix.
+        bb = np.reshape(b, (A.nb_blocks, A.block_size, -1))
+        bt = np.fft.fft(bb, axis=0)
+        nb_rhs = bt.shape[2]
+
+        # The Fourier modes k and -k have the same matrix, so they are solved together.
+        # The modes whose right-hand sides are negligible (e.g. all but the mode 0
+        # for the heave of an axisymmetric body) are not solved.
+        modes = np.arange(A.nb_blocks//2 + 1)
+        paired_bt = np.concatenate([bt[modes], bt[-modes % A.nb_blocks]], axis=2)
+        needed = modes[_non_negligible(paired_bt, b)]
+        LOG.debug(f"\t\tSolve {len(needed)} of the {len(modes)} distinct Fourier modes.")
+
+        paired_xt = np.zeros(paired_bt.shape, dtype=np.complex128)
+        if A.is_nested:
+            # The blocks of the FFT are real linear combinations of the structured unique blocks.
+            weights = _circulant_mode_weights(A.nb_blocks)
+            inner_nb_threads = max(1, nb_threads//len(needed)) if len(needed) > 0 else 1
+
+            def solve_mode(k):
+                mode_block = A._unique_blocks[0]*float(weights[k, 0])
+                for block, weight in zip(A._unique_blocks[1:], weights[k, 1:]):
+                    mode_block = mode_block + block*float(weight)
+                return _solve_temporary(mode_block, paired_bt[k], diagonal_shift, inner_nb_threads)
+
+            for k, paired_xt_k in zip(needed, _parallel_map(solve_mode, needed, nb_threads)):
+                paired_xt[k] = paired_xt_k
+        else:
+            if diagonal_shift != 0.0:
+                # The shift of the first block is a shift of all the Fourier modes.
+                AAt = shift_diagonal(_symmetric_circulant_fft(A._unique_blocks, A.nb_blocks)[needed],
+                                     diagonal_shift, inplace=True)
+            else:
+                AAt = A._get_circulant_fft()[needed]
+            # Stacks of modes solved by batched LAPACK calls, one stack per thread.
+            bounds = np.linspace(0, len(needed), min(nb_threads, len(needed)) + 1).astype(int)
+            chunks = [slice(start, end) for start, end in zip(bounds[:-1], bounds[1:])]
+            results = _parallel_map(lambda chunk: np.linalg.solve(AAt[chunk], paired_bt[needed[chunk]]),
+                                    chunks, nb_threads)
+            for chunk, result in zip(chunks, results):
+                paired_xt[needed[chunk]] = result
+
+        xt = np.empty(bt.shape, dtype=np.complex128)
+        xt[-modes % A.nb_blocks] = paired_xt[:, :, nb_rhs:]
+        xt[modes] = paired_xt[:, :, :nb_rhs]
         x = np.fft.ifft(xt, axis=0)
-        return x.reshape(A.nb_blocks*A.block_size)
+        return x.reshape(b.shape)
 
     elif isinstance(A, BlockToeplitzMatrix):
         if A.nb_blocks == 2:
             LOG.debug("\tSolve system of 2×2 BlockToeplitzMatrix (block size: %i×%i)", A.block_size, A.block_size)
             A1, A2 = A.blocks
             b1, b2 = b[:len(b)//2], b[len(b)//2:]
-            x_plus = solve(A1 + A2, b1 + b2)
-            x_minus = solve(A1 - A2, b1 - b2)
+            b_plus, b_minus = b1 + b2, b1 - b2
+            # For a symmetric (resp. antisymmetric) right-hand side, x_minus (resp. x_plus) is zero.
+            needed = _non_negligible(np.stack([b_plus, b_minus]), b)
+            inner_nb_threads = max(1, nb_threads//np.count_nonzero(needed)) if np.any(needed) else 1
+
+            def solve_half(sign):
+                if sign > 0:
+                    return _solve_temporary(A1 + A2, b_plus, diagonal_shift, inner_nb_threads)
+                else:
+                    return _solve_temporary(A1 - A2, b_minus, diagonal_shift, inner_nb_threads)
+
+            signs = [sign for sign, is_needed in zip((+1, -1), needed) if is_needed]
+            x_halves = dict(zip(signs, _parallel_map(solve_half, signs, nb_threads)))
+            zero = np.zeros(b_plus.shape, dtype=np.result_type(A.dtype, b, diagonal_shift))
+            x_plus, x_minus = x_halves.get(+1, zero), x_halves.get(-1, zero)
             return np.concatenate([x_plus + x_minus, x_plus - x_minus])/2
 
+        elif A.is_nested:
+            LOG.debug("\tSolve linear system %ix%i nested BlockToeplitzMatrix (block size: %i×%i) with GMRES",
+                      A.nb_blocks, A.nb_blocks, A.block_size, A.block_size)
+            return gmres(lambda x: A @ x + diagonal_shift*x, b)
+
         else:
-            LOG.debug("\tSolve linear system %ix%i BlockToeplitzMatrix (block size: %i×%i)",
+            LOG.debug("\tSolve linear system %ix%i BlockToeplitzMatrix (block size: %i×%i) with block Levinson recursion",
                       A.nb_blocks, A.nb_blocks, A.block_size, A.block_size)
-            # Not implemented yet
-            return solve(A.full_matrix(), b)
+            return block_Levinson_solve(A.blocks, b, diagonal_shift)
+
+    elif isinstance(A, BlockMatrix):
+        LOG.debug(f"\tSolve linear system (size: {A.shape}, {A.nb_blocks[0]}×{A.nb_blocks[1]} blocks) with GMRES.")
+        return gmres(lambda x: A @ x + diagonal_shift*x, b)
 
     elif isinstance(A, np.ndarray):
         LOG.debug(f"\tSolve linear system (size: {A.shape}) with numpy.")
+        if diagonal_shift != 0.0:
+            A = shift_diagonal(A, diagonal_shift)
         return np.linalg.solve(A, b)
 
     else:
         raise ValueError(f"Unrecognized type of {A} in solve")
+
+
+def _non_negligible(stacked_b, b):
+    """Mask of the right-hand sides of the stack (along the first axis) that
+    are not negligible compared to the largest one, at the precision of b."""
+    norms = np.linalg.norm(np.reshape(stacked_b, (len(stacked_b), -1)), axis=1)
+    eps = np.finfo(np.result_type(b, np.float32)).eps
+    return norms > 10*len(stacked_b)*eps*np.max(norms)
+
+
+def _solve_temporary(A, b, diagonal_shift, nb_threads=1):
+    """Same as solve, for a matrix A built during the resolution, that can
+    be modified in place."""
+    if isinstance(A, np.ndarray) and diagonal_shift != 0.0:
+        A = shift_diagonal(A, diagonal_shift, inplace=True)
+        diagonal_shift = 0.0
+    return _solve(A, b, diagonal_shift, nb_threads)
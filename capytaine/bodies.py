@@ -21,13 +21,285 @@ from capytaine.tools import MaxLengthDict
 LOG = logging.getLogger(__name__)
 
 
+class DofsArray:
+    """Degrees of freedom of a body, stored as a single (nb_dofs, nb_faces) array.
+
+    It behaves like a dict associating a name to a 1 dimensional array of
+    length nb_faces, but all the dofs are stored contiguously in the rows of
+    a matrix, so that they can be used at once in matrix products.
+    """
+
+    def __init__(self, nb_faces, names=(), matrix=None):
+        """
+        Parameters
+        ----------
+        nb_faces: int
+            the number of faces of the body
+        names: list of strings
+            the names of the dofs
+        matrix: array of shape (len(names), nb_faces)
+            the values of the dofs
+        """
+        self.nb_faces = nb_faces
+        self.names = list(names)
+        self._index = {name: i for i, name in enumerate(self.names)}
+        assert len(self._index) == len(self.names), "Dofs should have unique names."
+
+        if matrix is None:
+            self._data = np.zeros((len(self.names), nb_faces))
+        else:
+            self._data = np.array(matrix)
+            assert self._data.shape == (len(self.names), nb_faces)
+
+    @property
+    def matrix(self):
+        """The (nb_dofs, nb_faces) array of the dofs."""
+        return self._data[:len(self.names)]
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(list(self.names))
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __getitem__(self, name):
+        return self._data[self._index[name]]
+
+    def __setitem__(self, name, dof):
+        dof = np.asarray(dof)
+        assert dof.shape == (self.nb_faces,), \
+            f"The dof {name} should be an array of length {self.nb_faces}."
+
+        if np.result_type(self._data, dof) != self._data.dtype:
+            self._data = self._data.astype(np.result_type(self._data, dof))
+
+        if name not in self._index:
+            if len(self.names) == self._data.shape[0]:
+                # Double the capacity of the storage to amortize the cost of the insertions.
+                new_data = np.zeros((max(1, 2*len(self.names)), self.nb_faces), dtype=self._data.dtype)
+                new_data[:len(self.names)] = self.matrix
+                self._data = new_data
+            self._index[name] = len(self.names)
+            self.names.append(name)
+
+        self._data[self._index[name]] = dof
+
+    def __delitem__(self, name):
+        i = self._index[name]
+        self._data = np.delete(self.matrix, i, axis=0)
+        del self.names[i]
+        self._index = {name: i for i, name in enumerate(self.names)}
+
+    def __repr__(self):
+        return f"DofsArray(nb_faces={self.nb_faces}, names={self.names})"
+
+    def keys(self):
+        return list(self.names)
+
+    def values(self):
+        return [self[name] for name in self.names]
+
+    def items(self):
+        return [(name, self[name]) for name in self.names]
+
+    def copy(self):
+        return DofsArray(self.nb_faces, self.names, self.matrix)
+
+    def with_prefix(self, prefix):
+        """Return a copy in which the names of the dofs start with prefix."""
+        return DofsArray(self.nb_faces, [prefix + name for name in self.names], self.matrix)
+
+    def extract_faces(self, id_faces_to_extract):
+        """Return a new DofsArray restricted to some of the faces."""
+        matrix = self.matrix[:, id_faces_to_extract]
+        return DofsArray(matrix.shape[1], self.names, matrix)
+
+    def integrate(self, field, weights):
+        """Integrate a field over the faces for each dof.
+
+        Parameters
+        ----------
+        field: array of shape (nb_faces, ...)
+            the values of the field on the faces (e.g. the potential)
+        weights: array of shape (nb_faces,)
+            the weights of the faces (e.g. the faces areas)
+
+        Returns
+        -------
+        array of shape (nb_dofs, ...)
+        """
+        return (self.matrix * weights) @ field
+
+
+class BlockDofsArray:
+    """Degrees of freedom of a body stored by blocks.
+
+    Each block is a DofsArray defined only on a contiguous range of faces
+    starting at a given offset, the dofs being zero on the other faces. It
+    is used for collections of bodies, where the dofs of each subbody are
+    only non-zero on the faces of this subbody. Memory and post-processing
+    thus scale with the number of faces of each subbody instead of the total
+    number of faces.
+
+    It can be used as a dict in the same way as DofsArray.
+    """
+
+    def __init__(self, nb_faces, blocks=()):
+        """
+        Parameters
+        ----------
+        nb_faces: int
+            the total number of faces of the body
+        blocks: list of (int, DofsArray)
+            the offsets of the blocks and the corresponding local dofs
+        """
+        self.nb_faces = nb_faces
+        self.blocks = []
+        for offset, local_dofs in blocks:
+            self._append_block(offset, local_dofs)
+
+    def _append_block(self, offset, local_dofs):
+        assert 0 <= offset and offset + local_dofs.nb_faces <= self.nb_faces
+        if isinstance(local_dofs, BlockDofsArray):
+            # Flatten nested blocks.
+            for sub_offset, sub_local_dofs in local_dofs.blocks:
+                self._append_block(offset + sub_offset, sub_local_dofs)
+        else:
+            self.blocks.append((offset, local_dofs))
+        assert len(set(self.names)) == len(self.names), "Dofs should have unique names."
+
+    @property
+    def names(self):
+        return [name for _, local_dofs in self.blocks for name in local_dofs]
+
+    def _find(self, name):
+        for offset, local_dofs in self.blocks:
+            if name in local_dofs:
+                return offset, local_dofs
+        raise KeyError(name)
+
+    @property
+    def matrix(self):
+        """The dense (nb_dofs, nb_faces) array of the dofs.
+        Costly for large collections: prefer the methods working by blocks."""
+        matrix = np.zeros((len(self), self.nb_faces), dtype=np.result_type(*(d.matrix for _, d in self.blocks), np.float64))
+        i = 0
+        for offset, local_dofs in self.blocks:
+            matrix[i:i+len(local_dofs), offset:offset+local_dofs.nb_faces] = local_dofs.matrix
+            i += len(local_dofs)
+        return matrix
+
+    def __len__(self):
+        return sum(len(local_dofs) for _, local_dofs in self.blocks)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __contains__(self, name):
+        return any(name in local_dofs for _, local_dofs in self.blocks)
+
+    def __getitem__(self, name):
+        """Return the dof on all the faces.
+
+        As for DofsArray, the returned array is a view of the storage if
+        the block of the dof covers all the faces. Otherwise, it is a
+        read-only copy, since modifying it would not modify the dof."""
+        offset, local_dofs = self._find(name)
+        if local_dofs.nb_faces == self.nb_faces:
+            return local_dofs[name]
+        dof = np.zeros(self.nb_faces, dtype=local_dofs.matrix.dtype)
+        dof[offset:offset+local_dofs.nb_faces] = local_dofs[name]
+        dof.flags.writeable = False
+        return dof
+
+    def __setitem__(self, name, dof):
+        dof = np.asarray(dof)
+        assert dof.shape == (self.nb_faces,), \
+            f"The dof {name} should be an array of length {self.nb_faces}."
+
+        if name in self:
+            i_block, (offset, local_dofs) = next((i, block) for i, block in enumerate(self.blocks) if name in block[1])
+            if np.all(dof[:offset] == 0) and np.all(dof[offset+local_dofs.nb_faces:] == 0):
+                local_dofs[name] = dof[offset:offset+local_dofs.nb_faces]
+            else:
+                # The dof does not fit in its block anymore: the block is split
+                # around it, such that the order of the dofs is kept.
+                i = local_dofs.names.index(name)
+                before = DofsArray(local_dofs.nb_faces, local_dofs.names[:i], local_dofs.matrix[:i])
+                after = DofsArray(local_dofs.nb_faces, local_dofs.names[i+1:], local_dofs.matrix[i+1:])
+                new_blocks = [(offset, before), (0, DofsArray(self.nb_faces, [name], dof[np.newaxis, :])), (offset, after)]
+                self.blocks[i_block:i_block+1] = [(o, d) for o, d in new_blocks if len(d) > 0]
+            return
+
+        # New dofs defined on all the faces are stored in a last block covering all the faces.
+        if len(self.blocks) == 0 or self.blocks[-1][1].nb_faces != self.nb_faces:
+            self.blocks.append((0, DofsArray(self.nb_faces)))
+        self.blocks[-1][1][name] = dof
+
+    def __delitem__(self, name):
+        _, local_dofs = self._find(name)
+        del local_dofs[name]
+        self.blocks = [(offset, local_dofs) for offset, local_dofs in self.blocks if len(local_dofs) > 0]
+
+    def __repr__(self):
+        return f"BlockDofsArray(nb_faces={self.nb_faces}, names={self.names})"
+
+    def keys(self):
+        return self.names
+
+    def values(self):
+        return [self[name] for name in self.names]
+
+    def items(self):
+        return [(name, self[name]) for name in self.names]
+
+    def copy(self):
+        return BlockDofsArray(self.nb_faces, [(offset, local_dofs.copy()) for offset, local_dofs in self.blocks])
+
+    def with_prefix(self, prefix):
+        """Return a copy in which the names of the dofs start with prefix."""
+        return BlockDofsArray(self.nb_faces, [(offset, local_dofs.with_prefix(prefix))
+                                              for offset, local_dofs in self.blocks])
+
+    def extract_faces(self, id_faces_to_extract):
+        """Return a new (dense) DofsArray restricted to some of the faces."""
+        matrix = self.matrix[:, id_faces_to_extract]
+        return DofsArray(matrix.shape[1], self.names, matrix)
+
+    def integrate(self, field, weights):
+        """Integrate a field over the faces for each dof, using only the
+        faces on which each block of dofs is defined.
+
+        Parameters
+        ----------
+        field: array of shape (nb_faces, ...)
+            the values of the field on the faces (e.g. the potential)
+        weights: array of shape (nb_faces,)
+            the weights of the faces (e.g. the faces areas)
+
+        Returns
+        -------
+        array of shape (nb_dofs, ...)
+        """
+        return np.concatenate(
+            [local_dofs.integrate(field[offset:offset+local_dofs.nb_faces],
+                                  weights[offset:offset+local_dofs.nb_faces])
+             for offset, local_dofs in self.blocks]
+            + [np.zeros((0,) + field.shape[1:], dtype=field.dtype)]
+        )
+
+
 class FloatingBody(Mesh):
     """A floating body described as a mesh and some degrees of freedom.
 
     The mesh structure is inherited from meshmagick Mesh class (see
     documentation of this class for more details). The degrees of freedom
-    (dofs) are stored as a dict associating a name to a 1 dimensional array of
-    length equal to the number of faces in the mesh.
+    (dofs) are stored in a DofsArray, that can be used as a dict associating a
+    name to a 1 dimensional array of length equal to the number of faces in
+    the mesh.
     """
 
     #######################################
@@ -38,15 +310,23 @@ class FloatingBody(Mesh):
         Mesh.__init__(self, *args, **kwargs)
         self._compute_radiuses()
         self.nb_matrices_to_keep = 1
-        self.dofs = {}
+        self.dofs = DofsArray(self.nb_faces)
         LOG.info(f"New floating body: {self.name}.")
 
     @staticmethod
-    def from_file(filename, file_format):
-        """Create a FloatingBody from a mesh file using meshmagick."""
+    def from_file(filename, file_format, use_symmetries=False):
+        """Create a FloatingBody from a mesh file using meshmagick.
+
+        If use_symmetries is True, the symmetries of the mesh are detected and
+        a symmetric body is returned (see capytaine.symmetries.detect_symmetries).
+        """
         from meshmagick.mmio import load_mesh
         vertices, faces = load_mesh(filename, file_format)
-        return FloatingBody(vertices, faces, name=filename)
+        body = FloatingBody(vertices, faces, name=filename)
+        if use_symmetries:
+            from capytaine.symmetries import detect_symmetries
+            body = detect_symmetries(body)
+        return body
 
     def __add__(self, body_to_add):
         """Create a new CollectionOfFloatingBody from the combination of two of them."""
@@ -79,9 +359,7 @@ class FloatingBody(Mesh):
         new_body.nb_matrices_to_keep = self.nb_matrices_to_keep
         LOG.info(f"Extract floating body from {self.name}.")
 
-        new_body.dofs = {}
-        for name, dof in self.dofs.items():
-            new_body.dofs[name] = dof[id_faces_to_extract]
+        new_body.dofs = self.dofs.extract_faces(id_faces_to_extract)
 
         if return_index:
             return new_body, id_v
@@ -104,6 +382,61 @@ class FloatingBody(Mesh):
         LOG.info(f"Clip floating body {self.name}.")
         return FloatingBody(clipped_mesh.vertices, clipped_mesh.faces)
 
+    # Incremented at each modification of the mesh, such that the bodies
+    # containing this one know when their stored data is outdated.
+    _geometry_version = 0
+
+    def _geometry_changed(self):
+        """Clear the cached geometric data and influence matrices after a modification of the mesh."""
+        for key in ('bounding_box', 'Green0', 'Green1', 'Green2', 'matched_symmetries'):
+            self.__internals__.pop(key, None)
+        self._geometry_version += 1
+
+    def mirror(self, plane):
+        result = Mesh.mirror(self, plane)
+        self._geometry_changed()
+        return result
+
+    def translate_x(self, value):
+        result = Mesh.translate_x(self, value)
+        self._geometry_changed()
+        return result
+
+    def translate_y(self, value):
+        result = Mesh.translate_y(self, value)
+        self._geometry_changed()
+        return result
+
+    def translate_z(self, value):
+        result = Mesh.translate_z(self, value)
+        self._geometry_changed()
+        return result
+
+    def translate(self, vector):
+        result = Mesh.translate(self, vector)
+        self._geometry_changed()
+        return result
+
+    def rotate_x(self, value):
+        result = Mesh.rotate_x(self, value)
+        self._geometry_changed()
+        return result
+
+    def rotate_y(self, value):
+        result = Mesh.rotate_y(self, value)
+        self._geometry_changed()
+        return result
+
+    def rotate_z(self, value):
+        result = Mesh.rotate_z(self, value)
+        self._geometry_changed()
+        return result
+
+    def rotate(self, vector):
+        result = Mesh.rotate(self, vector)
+        self._geometry_changed()
+        return result
+
     def add_translation_dof(self, direction=(1.0, 0.0, 0.0), name=None):
         if name is None:
             name = f"Translation_dof_{self.nb_dofs}"
@@ -128,6 +461,19 @@ class FloatingBody(Mesh):
         """Number of degrees of freedom."""
         return len(self.dofs)
 
+    @property
+    def nb_matrices_to_keep(self):
+        """Number of influence matrices (for different bodies, depths or
+        wavenumbers) stored for each part of the Green function."""
+        return self._nb_matrices_to_keep
+
+    @nb_matrices_to_keep.setter
+    def nb_matrices_to_keep(self, value):
+        self._nb_matrices_to_keep = value
+        for key in ('Green0', 'Green1', 'Green2'):
+            if key in self.__internals__:
+                self.__internals__[key].max_length = value
+
     @property
     def faces_radiuses(self):
         """Get the array of faces radiuses of the mesh."""
@@ -135,6 +481,19 @@ class FloatingBody(Mesh):
             self._compute_radiuses()
         return self.__internals__['faces_radiuses']
 
+    @property
+    def bounding_box(self):
+        """Axis-aligned bounding box of the mesh, as an array
+        [[x_min, y_min, z_min], [x_max, y_max, z_max]].
+        It is stored until the next transformation of the body."""
+        if 'bounding_box' not in self.__internals__:
+            if self.nb_vertices == 0:
+                self.__internals__['bounding_box'] = np.array([[np.infty]*3, [-np.infty]*3])
+            else:
+                self.__internals__['bounding_box'] = np.array([np.min(self.vertices, axis=0),
+                                                               np.max(self.vertices, axis=0)])
+        return self.__internals__['bounding_box']
+
     def _compute_radiuses(self):
         """Compute the radiuses of the faces of the mesh.
 
@@ -166,19 +525,14 @@ class FloatingBody(Mesh):
             self.__internals__['Green0'] = MaxLengthDict({}, max_length=self.nb_matrices_to_keep)
             LOG.debug(f"\t\tCreate Green0 dict (max_length={self.nb_matrices_to_keep}) in {self.name}")
 
-        if body not in self.__internals__['Green0']:
+        key = (body, body._geometry_version)
+        if key not in self.__internals__['Green0']:
             LOG.debug(f"\t\tComputing matrix 0 of {self.name} on {body.name}")
-            S0, V0 = _Green.green_1.build_matrix_0(
-                self.faces_centers, self.faces_normals,
-                body.vertices,      body.faces + 1,
-                body.faces_centers, body.faces_normals,
-                body.faces_areas,   body.faces_radiuses,
-                )
-
-            self.__internals__['Green0'][body] = (S0, V0)
+            S0, V0 = _compute_matrices_0(self.faces_centers, self.faces_normals, _source_panels(body))
+            self.__internals__['Green0'][key] = (S0, V0)
         else:
             LOG.debug(f"\t\tRetrieving stored matrix 0 of {self.name} on {body.name}")
-            S0, V0 = self.__internals__['Green0'][body]
+            S0, V0 = self.__internals__['Green0'][key]
 
         return S0, V0
 
@@ -189,42 +543,17 @@ class FloatingBody(Mesh):
             LOG.debug(f"\t\tCreate Green1 dict (max_length={self.nb_matrices_to_keep}) in {self.name}")
 
         depth = free_surface - sea_bottom
-        if (body, depth) not in self.__internals__['Green1']:
+        key = (body, body._geometry_version, depth)
+        if key not in self.__internals__['Green1']:
             LOG.debug(f"\t\tComputing matrix 1 of {self.name} on {body.name} for depth={depth:.2e}")
-            def reflect_vector(x):
-                y = x.copy()
-                y[:, 2] = -x[:, 2]
-                return y
-
-            if depth == np.infty:
-                def reflect_point(x):
-                    y = x.copy()
-                    y[:, 2] = 2*free_surface - x[:, 2]
-                    return y
-            else:
-                def reflect_point(x):
-                    y = x.copy()
-                    y[:, 2] = 2*sea_bottom - x[:, 2]
-                    return y
-
-            S1, V1 = _Green.green_1.build_matrix_0(
-                reflect_point(self.faces_centers), reflect_vector(self.faces_normals),
-                body.vertices,      body.faces + 1,
-                body.faces_centers, body.faces_normals,
-                body.faces_areas,   body.faces_radiuses,
-                )
-
-            if depth == np.infty:
-                self.__internals__['Green1'][(body, np.infty)] = (-S1, -V1)
-                return -S1, -V1
-            else:
-                self.__internals__['Green1'][(body, depth)] = (S1, V1)
-                return S1, V1
+            S1, V1 = _compute_matrices_1(self.faces_centers, self.faces_normals, _source_panels(body),
+                                         free_surface, sea_bottom)
+            self.__internals__['Green1'][key] = (S1, V1)
         else:
-            S1, V1 = self.__internals__['Green1'][(body, depth)]
+            S1, V1 = self.__internals__['Green1'][key]
             LOG.debug(f"\t\tRetrieving stored matrix 1 of {self.name} on {body.name} for depth={depth:.2e}")
-            return S1, V1
 
+        return S1, V1
 
     def _build_matrices_2(self, body, free_surface, sea_bottom, wavenumber):
         """Compute the third part of the influence matrices of self on body."""
@@ -233,26 +562,14 @@ class FloatingBody(Mesh):
             LOG.debug(f"\t\tCreate Green2 dict (max_length={self.nb_matrices_to_keep}) in {self.name}")
 
         depth = free_surface - sea_bottom
-        if (body, depth, wavenumber) not in self.__internals__['Green2']:
+        key = (body, body._geometry_version, depth, wavenumber)
+        if key not in self.__internals__['Green2']:
             LOG.debug(f"\t\tComputing matrix 2 of {self.name} on {body.name} for depth={depth:.2e} and k={wavenumber:.2e}")
-            if depth == np.infty:
-                S2, V2 = _Green.green_2.build_matrix_2(
-                    self.faces_centers, self.faces_normals,
-                    body.faces_centers, body.faces_areas,
-                    wavenumber,         0.0,
-                    self is body
-                    )
-            else:
-                S2, V2 = _Green.green_2.build_matrix_2(
-                    self.faces_centers, self.faces_normals,
-                    body.faces_centers, body.faces_areas,
-                    wavenumber,         depth,
-                    self is body
-                    )
-
-            self.__internals__['Green2'][(body, depth, wavenumber)] = (S2, V2)
+            S2, V2 = _compute_matrices_2(self.faces_centers, self.faces_normals, _source_panels(body),
+                                         free_surface, sea_bottom, wavenumber, same_body=(self is body))
+            self.__internals__['Green2'][key] = (S2, V2)
         else:
-            S2, V2 = self.__internals__['Green2'][(body, depth, wavenumber)]
+            S2, V2 = self.__internals__['Green2'][key]
             LOG.debug(f"\t\tRetrieving stored matrix 2 of {self.name} on {body.name} for depth={depth:.2e} and k={wavenumber:.2e}")
 
         return S2, V2
@@ -275,8 +592,117 @@ class FloatingBody(Mesh):
             S += S1
             V += V1
 
-            S2, V2 = self._build_matrices_2(body, free_surface, sea_bottom, wavenumber)
+            if wavenumber < np.infty:
+                S2, V2 = self._build_matrices_2(body, free_surface, sea_bottom, wavenumber)
+                S += S2
+                V += V2
+            elif sea_bottom > -np.infty:
+                raise NotImplementedError("Infinite frequency is only implemented in infinite depth.")
+            # else: in infinite depth, the Green function at infinite frequency
+            # is the sum of the first two parts only.
+
+        return S, V
+
+
+#######################################################
+#  Evaluation of the influence matrices without cache  #
+#######################################################
+# The following functions evaluate the influence of some faces of a body on
+# arbitrary collocation points. They are used above to build the full
+# matrices of a body, and to evaluate single rows or columns of the matrices,
+# e.g. for low-rank approximations of the matrices.
+
+def _source_panels(body, faces=None):
+    """The arrays describing the faces of body (or a subset of them) as
+    sources, in the format of the Fortran routines."""
+    if faces is None:
+        faces = slice(None)
+    return (body.vertices,             body.faces[faces] + 1,
+            body.faces_centers[faces], body.faces_normals[faces],
+            body.faces_areas[faces],   body.faces_radiuses[faces])
+
+
+def _compute_matrices_0(centers, normals, panels):
+    """First part (Rankine source) of the influence of the panels on the collocation points."""
+    return _Green.green_1.build_matrix_0(centers, normals, *panels)
+
+
+def _compute_matrices_1(centers, normals, panels, free_surface, sea_bottom):
+    """Second part (reflected Rankine source) of the influence of the panels on the collocation points."""
+    depth = free_surface - sea_bottom
+
+    reflected_centers = centers.copy()
+    if depth == np.infty:
+        reflected_centers[:, 2] = 2*free_surface - centers[:, 2]
+    else:
+        reflected_centers[:, 2] = 2*sea_bottom - centers[:, 2]
+    reflected_normals = normals.copy()
+    reflected_normals[:, 2] = -normals[:, 2]
+
+    S1, V1 = _Green.green_1.build_matrix_0(reflected_centers, reflected_normals, *panels)
+
+    if depth == np.infty:
+        return -S1, -V1
+    else:
+        return S1, V1
+
+
+def _compute_matrices_2(centers, normals, panels, free_surface, sea_bottom, wavenumber, same_body=False):
+    """Third part (wave term) of the influence of the panels on the collocation points."""
+    depth = free_surface - sea_bottom
+    _, _, panels_centers, _, panels_areas, _ = panels
+    return _Green.green_2.build_matrix_2(
+        centers,        normals,
+        panels_centers, panels_areas,
+        wavenumber,     0.0 if depth == np.infty else depth,
+        same_body
+    )
+
+
+def influence_matrices(centers, normals, body, faces=None,
+                       free_surface=0.0, sea_bottom=-np.infty, wavenumber=1.0, **kwargs):
+    """Return the influence matrices of (a subset of) the faces of body on
+    arbitrary collocation points.
+
+    Contrary to FloatingBody.build_matrices, nothing is stored: this function
+    is meant to evaluate a few rows or columns of the matrices.
+
+    Parameters
+    ----------
+    centers: array of shape (nb_points, 3)
+        the collocation points
+    normals: array of shape (nb_points, 3)
+        the normal vectors at the collocation points
+    body: FloatingBody
+        the body whose faces are the sources
+    faces: list of int, optional
+        the indices of the faces of body to be used as sources (default: all)
+
+    Returns
+    -------
+    arrays S and V of shape (nb_points, nb_sources)
+    """
+    panels = _source_panels(body, faces)
+    nb_sources = panels[1].shape[0]
+
+    S = np.zeros((len(centers), nb_sources), dtype=np.complex64)
+    V = np.zeros((len(centers), nb_sources), dtype=np.complex64)
+
+    S0, V0 = _compute_matrices_0(centers, normals, panels)
+    S += S0
+    V += V0
+
+    if free_surface < np.infty:
+
+        S1, V1 = _compute_matrices_1(centers, normals, panels, free_surface, sea_bottom)
+        S += S1
+        V += V1
+
+        if wavenumber < np.infty:
+            S2, V2 = _compute_matrices_2(centers, normals, panels, free_surface, sea_bottom, wavenumber)
             S += S2
             V += V2
+        elif sea_bottom > -np.infty:
+            raise NotImplementedError("Infinite frequency is only implemented in infinite depth.")
 
-        return S, V
+    return S, V
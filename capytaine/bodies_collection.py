@@ -8,7 +8,9 @@ import numpy as np
 
 from meshmagick.mesh import Mesh
 
-from capytaine.bodies import FloatingBody
+from capytaine.bodies import FloatingBody, DofsArray, BlockDofsArray, influence_matrices
+from capytaine.low_rank_matrices import adaptive_cross_approximation
+from capytaine.Toeplitz_matrices import BlockMatrix
 
 
 LOG = logging.getLogger(__name__)
@@ -30,6 +32,7 @@ class CollectionOfFloatingBodies(FloatingBody):
             assert isinstance(body, FloatingBody)
 
         self.subbodies = bodies
+        self._geometry_cache = {}
 
         names_of_subbodies = ', '.join(body.name for body in self.subbodies)
         if len(names_of_subbodies) > NAME_MAX_LENGTH:
@@ -39,16 +42,12 @@ class CollectionOfFloatingBodies(FloatingBody):
         LOG.debug(f"New collection of bodies: {self.name}.")
 
         # Combine the degrees of freedom of the subbodies.
-        self.dofs = {}
+        # Each of them is only stored on the faces of its subbody.
         cum_nb_faces = accumulate(chain([0], (body.nb_faces for body in self.subbodies)))
-        total_nb_faces = sum(body.nb_faces for body in self.subbodies)
-        for body, nbf in zip(bodies, cum_nb_faces):
-            for name, dof in body.dofs.items():
-                self.dofs['_'.join([body.name, name])] = np.r_[
-                        np.zeros(nbf),
-                        dof,
-                        np.zeros(total_nb_faces - len(dof) - nbf),
-                        ]
+        self.dofs = BlockDofsArray(self.nb_faces, [
+            (nbf, body.dofs.with_prefix(f"{body.name}_"))
+            for body, nbf in zip(self.subbodies, cum_nb_faces) if body.nb_dofs > 0
+        ])
 
     def as_FloatingBody(self, name=None):
         """Merge the mesh of the bodies of the collection into one mesh."""
@@ -66,7 +65,7 @@ class CollectionOfFloatingBodies(FloatingBody):
         new_body.merge_duplicates()
         new_body.heal_triangles()
         new_body.__class__ = FloatingBody
-        new_body.dofs = self.dofs
+        new_body.dofs = DofsArray(self.nb_faces, self.dofs.names, self.dofs.matrix)
         new_body.nb_matrices_to_keep = 1
         LOG.info(f"Merged collection of bodies {self.name} into floating body {new_body.name}.")
         return new_body
@@ -109,9 +108,37 @@ class CollectionOfFloatingBodies(FloatingBody):
     def volume(self):
         return sum(body.volume for body in self.subbodies)
 
+    @property
+    def _geometry_version(self):
+        """Identify the current state of the meshes of all the subbodies."""
+        return tuple((id(body), body._geometry_version) for body in self.subbodies)
+
+    def _cached_geometry(self, name, compute):
+        """Return the stored value of some geometric data of the collection,
+        or compute it if one of the subbodies has been modified since."""
+        version = self._geometry_version
+        if name not in self._geometry_cache or self._geometry_cache[name][0] != version:
+            LOG.debug(f"Compute {name} of {self.name}.")
+            self._geometry_cache[name] = (version, compute())
+        return self._geometry_cache[name][1]
+
+    def _concatenated(self, name):
+        return self._cached_geometry(
+            name, lambda: np.concatenate([getattr(body, name) for body in self.subbodies])
+        )
+
     @property
     def vertices(self):
-        return np.concatenate([body.vertices for body in self.subbodies])
+        return self._concatenated('vertices')
+
+    @property
+    def bounding_box(self):
+        """Bounding box of the collection, computed from the ones of the subbodies."""
+        def compute_bounding_box():
+            boxes = [body.bounding_box for body in self.subbodies]
+            return np.array([np.min([box[0] for box in boxes], axis=0),
+                             np.max([box[1] for box in boxes], axis=0)])
+        return self._cached_geometry('bounding_box', compute_bounding_box)
 
     @property
     def faces(self):
@@ -119,24 +146,26 @@ class CollectionOfFloatingBodies(FloatingBody):
         later subbodies, the indices of the vertices has to be shifted to
         correspond to their index in the concatenated array self.vertices.
         """
-        nb_vertices = accumulate(chain([0], (body.nb_vertices for body in self.subbodies[:-1])))
-        return np.concatenate([body.faces + nbv for body, nbv in zip(self.subbodies, nb_vertices)])
+        def compute_faces():
+            nb_vertices = accumulate(chain([0], (body.nb_vertices for body in self.subbodies[:-1])))
+            return np.concatenate([body.faces + nbv for body, nbv in zip(self.subbodies, nb_vertices)])
+        return self._cached_geometry('faces', compute_faces)
 
     @property
     def faces_normals(self):
-        return np.concatenate([body.faces_normals for body in self.subbodies])
+        return self._concatenated('faces_normals')
 
     @property
     def faces_areas(self):
-        return np.concatenate([body.faces_areas for body in self.subbodies])
+        return self._concatenated('faces_areas')
 
     @property
     def faces_centers(self):
-        return np.concatenate([body.faces_centers for body in self.subbodies])
+        return self._concatenated('faces_centers')
 
     @property
     def faces_radiuses(self):
-        return np.concatenate([body.faces_radiuses for body in self.subbodies])
+        return self._concatenated('faces_radiuses')
 
     def mirror(self, plane):
         for body in self.subbodies:
@@ -191,17 +220,209 @@ class CollectionOfFloatingBodies(FloatingBody):
     #  Computation of influence matrices  #
     #######################################
 
-    def build_matrices(self, other_body, **kwargs):
-        """Return the influence matrices of self on other body."""
+    @property
+    def _translation_classes(self):
+        """Congruence classes of the subbodies under horizontal translations, see _translation_classes."""
+        return self._cached_geometry('translation_classes', lambda: _translation_classes(self.subbodies))
+
+    def build_matrices(self, other_body, nb_threads=1, low_rank_distance=None, low_rank_tol=1e-4,
+                       return_block_matrix=False, **kwargs):
+        """Return the influence matrices of self on other body.
+
+        If other_body is also a collection, the matrices are assembled by
+        blocks for each pair of subbodies, such that the stored matrices of a
+        pair of subbodies can be reused in other collections, and only the
+        blocks of a moved subbody are computed again.
+
+        The Green function is invariant by horizontal translation. Thus, if
+        some subbodies are horizontally translated copies of each other, the
+        blocks of pairs of subbodies with the same relative position are only
+        computed once.
+
+        The blocks of rows of the subbodies of self can be computed in
+        parallel by nb_threads threads (the Fortran routines release the GIL).
+
+        If low_rank_distance is given, the matrices are returned as
+        BlockMatrix. The blocks of the pairs of subbodies whose bounding boxes
+        are further apart than low_rank_distance are built by adaptive cross
+        approximation with relative tolerance low_rank_tol, evaluating only
+        a few rows and columns of the block. They are stored as LowRankMatrix
+        (or as arrays if they turn out not to be of low rank). The blocks
+        shared by translated subbodies are then the same object.
+        The matrices can also be returned as BlockMatrix of arrays without
+        low-rank approximation by setting return_block_matrix.
+        """
         LOG.debug(f"Evaluating matrix of {self.name} on {other_body.name}.")
 
-        S = np.empty((self.nb_faces, other_body.nb_faces), dtype=np.complex64)
-        V = np.empty((self.nb_faces, other_body.nb_faces), dtype=np.complex64)
+        if isinstance(other_body, CollectionOfFloatingBodies):
+            columns_bodies = other_body.subbodies
+            # Keep the matrices of each subbody of self with each subbody of other_body.
+            for body in self.subbodies:
+                if body.nb_matrices_to_keep < len(columns_bodies):
+                    body.nb_matrices_to_keep = len(columns_bodies)
+        else:
+            columns_bodies = [other_body]
 
-        nb_faces = list(accumulate(chain([0], (body.nb_faces for body in self.subbodies))))
-        for (i, j), body in zip(zip(nb_faces, nb_faces[1:]), self.subbodies):
-            matrix_slice = (slice(i, j), slice(None, None))
-            S[matrix_slice], V[matrix_slice] = body.build_matrices(other_body, **kwargs)
+        dense = (low_rank_distance is None and not return_block_matrix)
 
-        return S, V
+        if dense:
+            S = np.empty((self.nb_faces, other_body.nb_faces), dtype=np.complex64)
+            V = np.empty((self.nb_faces, other_body.nb_faces), dtype=np.complex64)
+        else:
+            S_blocks = [[None for _ in columns_bodies] for _ in self.subbodies]
+            V_blocks = [[None for _ in columns_bodies] for _ in self.subbodies]
 
+        if other_body is self:
+            rows_classes = columns_classes = self._translation_classes
+        else:
+            classes = _translation_classes(self.subbodies + columns_bodies)
+            rows_classes, columns_classes = classes[:self.nb_subbodies], classes[self.nb_subbodies:]
+
+        rows = list(accumulate(chain([0], (body.nb_faces for body in self.subbodies))))
+        columns = list(accumulate(chain([0], (body.nb_faces for body in columns_bodies))))
+
+        def block_slice(i, j):
+            return slice(rows[i], rows[i+1]), slice(columns[j], columns[j+1])
+
+        # Find the pairs of subbodies with the same relative position.
+        # Each block is either computed or copied from a representative block.
+        representatives = {}
+        to_compute = [[] for _ in self.subbodies]
+        to_copy = []
+        for i, (class_i, position_i) in enumerate(rows_classes):
+            for j, (class_j, position_j) in enumerate(columns_classes):
+                key = (class_i, class_j, tuple(np.round(position_j - position_i, decimals=6)))
+                if key in representatives:
+                    to_copy.append(((i, j), representatives[key]))
+                else:
+                    representatives[key] = (i, j)
+                    to_compute[i].append(j)
+
+        def build_block(i, j):
+            S_low_rank, V_low_rank = None, None
+            if low_rank_distance is not None:
+                distance = _bounding_boxes_distance(self.subbodies[i].bounding_box, columns_bodies[j].bounding_box)
+                if distance > low_rank_distance:
+                    S_low_rank, V_low_rank = _low_rank_matrices(self.subbodies[i], columns_bodies[j],
+                                                                tol=low_rank_tol, **kwargs)
+                    if S_low_rank is not None and V_low_rank is not None:
+                        return S_low_rank, V_low_rank
+
+            S_block, V_block = self.subbodies[i].build_matrices(columns_bodies[j], **kwargs)
+            if not isinstance(S_block, np.ndarray):
+                # Block matrix from a symmetric body.
+                S_block, V_block = S_block.full_matrix(), V_block.full_matrix()
+
+            # Keep the low-rank approximation of one of the matrices if the other one is not of low rank.
+            return (S_block if S_low_rank is None else S_low_rank,
+                    V_block if V_low_rank is None else V_low_rank)
+
+        def build_row(i):
+            for j in to_compute[i]:
+                if dense:
+                    S[block_slice(i, j)], V[block_slice(i, j)] = build_block(i, j)
+                else:
+                    S_blocks[i][j], V_blocks[i][j] = build_block(i, j)
+
+        if nb_threads > 1 and self.nb_subbodies > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=nb_threads) as executor:
+                list(executor.map(build_row, range(self.nb_subbodies)))
+        else:
+            for i in range(self.nb_subbodies):
+                build_row(i)
+
+        if len(to_copy) > 0:
+            LOG.debug(f"Reuse {len(to_copy)} blocks of translated subbodies of {self.name}.")
+
+        if dense:
+            for block, representative in to_copy:
+                S[block_slice(*block)] = S[block_slice(*representative)]
+                V[block_slice(*block)] = V[block_slice(*representative)]
+            return S, V
+
+        else:
+            for (i, j), (k, l) in to_copy:
+                S_blocks[i][j], V_blocks[i][j] = S_blocks[k][l], V_blocks[k][l]
+            return BlockMatrix(S_blocks), BlockMatrix(V_blocks)
+
+
+def _bounding_boxes_distance(box, other_box):
+    """Distance between two bounding boxes given as [[mins], [maxs]] (zero if they intersect)."""
+    gaps = np.maximum(0.0, np.maximum(other_box[0] - box[1], box[0] - other_box[1]))
+    return np.linalg.norm(gaps)
+
+
+def _low_rank_matrices(body, other_body, tol=1e-4, max_rank=None, **kwargs):
+    """Approximate the influence matrices of body on other_body by adaptive
+    cross approximation, evaluating only some of their rows and columns.
+
+    Returns
+    -------
+    LowRankMatrix S and V, or None if the corresponding matrix is not of low rank.
+    """
+    centers, normals = body.faces_centers, body.faces_normals
+
+    # The rows and columns of S and V are evaluated together.
+    evaluated_rows = {}
+    evaluated_columns = {}
+
+    def get_rows(i):
+        if i not in evaluated_rows:
+            evaluated_rows[i] = influence_matrices(centers[i:i+1], normals[i:i+1], other_body, **kwargs)
+        return evaluated_rows[i]
+
+    def get_columns(j):
+        if j not in evaluated_columns:
+            evaluated_columns[j] = influence_matrices(centers, normals, other_body, faces=[j], **kwargs)
+        return evaluated_columns[j]
+
+    shape = (body.nb_faces, other_body.nb_faces)
+    S = adaptive_cross_approximation(lambda i: get_rows(i)[0][0, :], lambda j: get_columns(j)[0][:, 0],
+                                     shape, tol=tol, max_rank=max_rank)
+    V = adaptive_cross_approximation(lambda i: get_rows(i)[1][0, :], lambda j: get_columns(j)[1][:, 0],
+                                     shape, tol=tol, max_rank=max_rank)
+    LOG.debug(f"\tLow-rank matrices of {body.name} on {other_body.name}: "
+              f"ranks {S.rank if S is not None else None} and {V.rank if V is not None else None}.")
+    return S, V
+
+
+def _horizontal_translation(body, reference):
+    """Return the horizontal position of body with respect to reference if
+    the mesh of body is the mesh of reference translated horizontally, or
+    None otherwise."""
+    if body.nb_vertices != reference.nb_vertices or body.nb_faces != reference.nb_faces:
+        return None
+    if not np.array_equal(body.faces, reference.faces):
+        return None
+
+    translation = body.vertices[0] - reference.vertices[0]
+    size = np.max(reference.bounding_box[1] - reference.bounding_box[0])
+    tolerance = 1e-5*max(size, 1.0)
+    if abs(translation[2]) > tolerance:
+        return None
+    if not np.allclose(body.vertices - translation, reference.vertices, rtol=0.0, atol=tolerance):
+        return None
+    return translation[:2]
+
+
+def _translation_classes(bodies):
+    """Group the bodies whose meshes are identical up to a horizontal translation.
+
+    Returns
+    -------
+    list of (class index, horizontal position) for each body, where the
+    position is relative to the first body of the class.
+    """
+    references = []
+    classes = []
+    for body in bodies:
+        for class_index, reference in enumerate(references):
+            position = _horizontal_translation(body, reference)
+            if position is not None:
+                classes.append((class_index, position))
+                break
+        else:
+            classes.append((len(references), np.zeros(2)))
+            references.append(body)
+    return classes
@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Distribution of many independent problems on several machines.
+
+The coordinator and the workers communicate through a broker holding a queue
+of tasks, a queue of results and a shared storage of the bodies. The broker
+can be served over the network by a multiprocessing manager
+(serve_broker/connect_broker) or, for testing, live in the current process
+(LocalBroker).
+
+Example
+-------
+On the coordinating machine:
+    broker = serve_broker(("", 50000), authkey=b"secret")
+    results = Coordinator(broker).solve_all(problems)
+
+On each worker machine:
+    Worker(connect_broker(("coordinator.address", 50000), authkey=b"secret")).run()
+"""
+
+import copy
+import logging
+import queue
+import time
+from itertools import count
+from multiprocessing.managers import BaseManager
+
+
+LOG = logging.getLogger(__name__)
+
+STOP = "STOP"
+
+
+class LocalBroker:
+    """In-process broker, for testing or for workers running as threads."""
+
+    def __init__(self):
+        self.tasks = queue.Queue()
+        self.results = queue.Queue()
+        self.bodies = {}
+
+    def get_tasks(self):
+        return self.tasks
+
+    def get_results(self):
+        return self.results
+
+    def get_bodies(self):
+        return self.bodies
+
+
+class _BrokerServer(BaseManager):
+    pass
+
+
+class _BrokerClient(BaseManager):
+    pass
+
+
+_served_broker = None
+
+
+def _get_served_broker():
+    global _served_broker
+    if _served_broker is None:
+        _served_broker = LocalBroker()
+    return _served_broker
+
+
+def _get_tasks():
+    return _get_served_broker().get_tasks()
+
+
+def _get_results():
+    return _get_served_broker().get_results()
+
+
+def _get_bodies():
+    return _get_served_broker().get_bodies()
+
+
+_BrokerServer.register("get_tasks", callable=_get_tasks)
+_BrokerServer.register("get_results", callable=_get_results)
+_BrokerServer.register("get_bodies", callable=_get_bodies)
+
+_BrokerClient.register("get_tasks")
+_BrokerClient.register("get_results")
+_BrokerClient.register("get_bodies")
+
+
+def serve_broker(address=("", 50000), authkey=b"capytaine"):
+    """Start a broker in a server process listening on the given address.
+
+    Returns an object with the same interface as LocalBroker, to be used by
+    the coordinator. The server process is stopped when this object is
+    garbage collected or when its shutdown method is called."""
+    manager = _BrokerServer(address=address, authkey=authkey)
+    manager.start()
+    LOG.info(f"Broker serving on {manager.address}.")
+    return manager
+
+
+def connect_broker(address, authkey=b"capytaine"):
+    """Connect to a broker started with serve_broker on another process or machine."""
+    manager = _BrokerClient(address=address, authkey=authkey)
+    manager.connect()
+    LOG.info(f"Connected to broker on {address}.")
+    return manager
+
+
+class Coordinator:
+    """Send problems to the workers through a broker and gather the results."""
+
+    def __init__(self, broker, timeout=600.0, max_retries=3):
+        """
+        Parameters
+        ----------
+        broker: LocalBroker or manager
+            the broker shared with the workers
+        timeout: float
+            delay (in seconds) after the start of a task by a worker after
+            which the task is considered lost and sent again. The tasks that
+            have not been started are also sent again when no worker has
+            reported any activity during this delay.
+        max_retries: int
+            maximum number of times a task is sent again before giving up
+        """
+        self.tasks = broker.get_tasks()
+        self.results = broker.get_results()
+        self.bodies = broker.get_bodies()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._batch_ids = count()
+
+    def _store_body(self, body, batch_keys):
+        """Put the body in the shared storage and return its key.
+
+        The key depends on the geometry of the body, such that a body
+        modified between two batches is sent again to the workers."""
+        key = f"{body.name}_{id(body)}_{hash(getattr(body, '_geometry_version', 0))}"
+        if key not in batch_keys:
+            self.bodies.update({key: body})
+            batch_keys.add(key)
+        return key
+
+    def _make_task(self, batch_id, index, problem, batch_keys):
+        """The problems are sent without their body, which is replaced by a
+        key in the shared storage, so that each worker only receives each
+        mesh once."""
+        light_problem = copy.copy(problem)
+        light_problem.body = self._store_body(problem.body, batch_keys)
+        return (batch_id, index, light_problem)
+
+    def solve_all(self, problems, keep_details=False):
+        """Solve the problems on the workers.
+
+        Returns the list of results in the same order as the problems, like
+        Nemoh.solve_all."""
+        problems = list(problems)
+        batch_id = next(self._batch_ids)
+        batch_keys = set()  # Keys of the bodies stored for this batch.
+        try:
+            return self._solve_batch(batch_id, problems, keep_details, batch_keys)
+        finally:
+            # The bodies are removed from the storage once the batch is done.
+            for key in batch_keys:
+                self.bodies.pop(key, None)
+
+    def _solve_batch(self, batch_id, problems, keep_details, batch_keys):
+        LOG.info(f"Send {len(problems)} problems to the workers.")
+        for index, problem in enumerate(problems):
+            self.tasks.put(self._make_task(batch_id, index, problem, batch_keys) + (keep_details,))
+        started = {}  # index -> time at which a worker started the task
+        nb_retries = {index: 0 for index in range(len(problems))}
+        last_activity = time.monotonic()  # Last message of a worker about this batch.
+
+        def send_again(index):
+            if nb_retries[index] >= self.max_retries:
+                raise Exception(f"No result for {problems[index]} after {nb_retries[index]} retries.")
+            LOG.warning(f"Send again lost task {problems[index]}.")
+            self.tasks.put(self._make_task(batch_id, index, problems[index], batch_keys) + (keep_details,))
+            started.pop(index, None)
+            nb_retries[index] += 1
+
+        results = {}
+        while len(results) < len(problems):
+            try:
+                result_batch_id, index, status, result = self.results.get(timeout=min(self.timeout, 1.0))
+            except queue.Empty:
+                pass
+            else:
+                if result_batch_id != batch_id or index in results:
+                    # Message about a previous batch or about a task that has been sent again.
+                    pass
+                elif status == "started":
+                    started[index] = last_activity = time.monotonic()
+                elif status == "error":
+                    raise Exception(f"Worker failed to solve {problems[index]}:\n{result}")
+                else:
+                    results[index] = result
+                    started.pop(index, None)
+                    last_activity = time.monotonic()
+
+            # Send again the tasks that seem to be lost.
+            now = time.monotonic()
+            for index, starting_time in list(started.items()):
+                if now - starting_time > self.timeout:
+                    send_again(index)
+
+            # Without any news from the workers for a while, the tasks that have not been
+            # started are sent again, in case they have been taken by a worker that stopped
+            # before starting them, until the retries are exhausted (e.g. if there is no worker).
+            if now - last_activity > self.timeout:
+                for index in range(len(problems)):
+                    if index not in results and index not in started:
+                        send_again(index)
+                last_activity = now
+
+        LOG.info(f"Received the results of the {len(problems)} problems.")
+        return [results[index] for index in range(len(problems))]
+
+    def stop_workers(self, nb_workers):
+        """Ask the workers to terminate."""
+        for _ in range(nb_workers):
+            self.tasks.put(STOP)
+
+
+class Worker:
+    """Solve the problems received from a broker."""
+
+    def __init__(self, broker, solver=None, max_cached_bodies=10):
+        """
+        Parameters
+        ----------
+        broker: LocalBroker or manager
+            the broker shared with the coordinator
+        solver: object with a solve method, optional
+            the solver used for the problems (default: a new Nemoh instance,
+            whose Green function tables are initialized once for all tasks)
+        max_cached_bodies: int
+            number of bodies kept in the cache of the worker, with their
+            stored influence matrices
+        """
+        from capytaine.tools import MaxLengthDict
+
+        self.tasks = broker.get_tasks()
+        self.results = broker.get_results()
+        self.bodies = broker.get_bodies()
+
+        if solver is None:
+            from capytaine.Nemoh import Nemoh
+            solver = Nemoh()
+        self.solver = solver
+
+        self._bodies_cache = MaxLengthDict(max_length=max_cached_bodies)
+
+    def _get_body(self, key):
+        if key not in self._bodies_cache:
+            LOG.debug(f"Fetch body {key} from the broker.")
+            body = self.bodies.get(key)
+            if body is None:
+                # Removed from the storage: the task belongs to a batch that is already done.
+                raise KeyError(f"Body {key} is not in the storage of the broker anymore.")
+            self._bodies_cache[key] = body
+        return self._bodies_cache[key]
+
+    def run(self, max_tasks=None, timeout=None):
+        """Solve tasks until receiving the stop signal, or until max_tasks
+        have been solved, or until no task has been received for timeout seconds."""
+        nb_solved = 0
+        while max_tasks is None or nb_solved < max_tasks:
+            try:
+                task = self.tasks.get(timeout=timeout)
+            except queue.Empty:
+                LOG.info("No more tasks for the worker.")
+                return
+
+            if task == STOP:
+                LOG.info("Worker stopped.")
+                return
+
+            batch_id, index, problem, keep_details = task
+            self.results.put((batch_id, index, "started", None))
+            try:
+                problem.body = self._get_body(problem.body)
+                result = self.solver.solve(problem, keep_details=keep_details)
+            except Exception as error:
+                LOG.exception(f"Failed to solve {problem}.")
+                self.results.put((batch_id, index, "error", repr(error)))
+            else:
+                self.results.put((batch_id, index, "ok", result))
+            nb_solved += 1
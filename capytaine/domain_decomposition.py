@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Solution of a single large problem on several processes.
+
+The rows of the influence matrices (that is the collocation points, or the
+faces of the mesh) are distributed between the processes. Each process only
+assembles and stores its own block of rows, so that the full matrices never
+exist in memory at once. The linear system is then solved with GMRES, using a
+distributed matrix-vector product.
+"""
+
+import logging
+from multiprocessing import Process, Pipe
+
+import numpy as np
+
+from capytaine.iterative_solvers import gmres
+
+
+LOG = logging.getLogger(__name__)
+
+
+def _rows_worker(connection):
+    """Main loop of a process owning a block of rows of the matrices."""
+    from capytaine.Nemoh import Nemoh
+    solver = Nemoh()
+    matrices = {}
+
+    while True:
+        command, *args = connection.recv()
+        try:
+            if command == "assemble":
+                problem, faces = args
+                matrices["S"], matrices["V"] = solver._build_matrices(problem, faces=faces)
+                connection.send(("ok", None))
+            elif command == "matvec":
+                name, x = args
+                connection.send(("ok", matrices[name] @ x))
+            elif command == "stop":
+                connection.close()
+                return
+            else:
+                connection.send(("error", f"Unknown command: {command}"))
+        except Exception as error:
+            connection.send(("error", repr(error)))
+
+
+class DomainDecompositionSolver:
+    """Solver for a single problem whose influence matrices are distributed
+    by blocks of rows on several processes.
+
+    The processes are kept alive between the problems and should be stopped
+    with the close method (or by using the solver as a context manager).
+    """
+
+    def __init__(self, nb_processes=2, tol=1e-5, restart=50, maxiter=20):
+        """
+        Parameters
+        ----------
+        nb_processes: int
+            number of processes sharing the matrices
+        tol, restart, maxiter:
+            parameters of the GMRES solver, see capytaine.iterative_solvers.gmres
+        """
+        from capytaine.Nemoh import Nemoh
+        self._nemoh = Nemoh()
+
+        self.tol = tol
+        self.restart = restart
+        self.maxiter = maxiter
+
+        self._connections = []
+        self._processes = []
+        for _ in range(nb_processes):
+            parent_connection, child_connection = Pipe()
+            process = Process(target=_rows_worker, args=(child_connection,), daemon=True)
+            process.start()
+            self._connections.append(parent_connection)
+            self._processes.append(process)
+        LOG.info(f"Start {nb_processes} processes for the domain decomposition.")
+
+        self._assembled = None
+        self._assembled_body = None
+
+    @property
+    def nb_processes(self):
+        return len(self._processes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Stop the processes."""
+        for connection in self._connections:
+            connection.send(("stop",))
+        for process in self._processes:
+            process.join()
+        self._connections = []
+        self._processes = []
+        LOG.info("Stop the processes of the domain decomposition.")
+
+    def _gather(self):
+        # All the replies are received before raising an error, so that they
+        # are not mistaken for the replies of the next command.
+        replies = [connection.recv() for connection in self._connections]
+        for status, result in replies:
+            if status == "error":
+                raise Exception(f"Error in the domain decomposition: {result}")
+        return [result for _, result in replies]
+
+    def _assemble(self, problem):
+        """Assemble the blocks of rows of the matrices on the processes,
+        unless they are already assembled for this body (in its current
+        geometry) and wavenumber."""
+        key = (id(problem.body), problem.body._geometry_version,
+               problem.free_surface, problem.sea_bottom, problem.wavenumber)
+        if self._assembled == key and self._assembled_body is problem.body:
+            return
+
+        LOG.info(f"Assemble the matrices of {problem} on {self.nb_processes} processes.")
+        rows = np.array_split(np.arange(problem.body.nb_faces), self.nb_processes)
+        for connection, faces in zip(self._connections, rows):
+            connection.send(("assemble", problem, faces))
+        self._gather()
+        self._assembled = key
+        # Keep a reference to the body, such that its id is not reused by another one.
+        self._assembled_body = problem.body
+
+    def _matvec(self, name, x):
+        """Product of the distributed matrix S or V with x."""
+        for connection in self._connections:
+            connection.send(("matvec", name, x))
+        return np.concatenate(self._gather(), axis=0)
+
+    def solve(self, problem, keep_details=False):
+        """Solve the BEM problem. Same interface and results as Nemoh.solve."""
+        LOG.info("Solve %s with domain decomposition.", problem)
+
+        self._assemble(problem)
+
+        sources = gmres(lambda x: self._matvec("V", x) + x/2,
+                        self._nemoh._right_hand_side(problem),
+                        tol=self.tol, restart=self.restart, maxiter=self.maxiter)
+        potential = self._matvec("S", sources)
+
+        return self._nemoh._post_process(problem, sources, potential, keep_details=keep_details)
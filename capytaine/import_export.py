@@ -10,12 +10,24 @@ import numpy as np
 
 from meshmagick.mmio import write_MAR
 from capytaine.bodies import FloatingBody
-from capytaine.problems import DiffractionProblem, RadiationProblem
+from capytaine.problems import ProblemSet
+from capytaine.IRF import compute_radiation_IRF_from_results
 from capytaine.bodies_collection import CollectionOfFloatingBodies
 
-def import_cal_file(filepath):
+def import_cal_file(filepath, return_post_processing=False, return_problem_set=False):
     """
     Read a Nemoh.cal file and return a list of problems.
+
+    If return_problem_set is True, return instead a ProblemSet, whose problems
+    are only created when needed and whose results can be gathered as arrays.
+
+    If return_post_processing is True, also return a dict with the
+    post-processing options of the file:
+    - "IRF_time_range": array of the time steps at which the impulse response
+      function should be computed (empty if no computation is required), see
+      compute_cal_file_IRF,
+    - "Kochin_directions": array of the directions (in radians) in which the
+      Kochin function should be computed (empty if no computation is required).
     """
 
     with open(filepath, 'r') as cal_file:
@@ -79,25 +91,54 @@ def import_cal_file(filepath):
         direction_data = cal_file.readline().split()
         direction_range = np.linspace(float(direction_data[1]), float(direction_data[2]), int(direction_data[0]))
 
-        # The options below are not implemented yet.
+        # Post-processing options (pressure and free surface elevation are not implemented yet).
 
         cal_file.readline() # Unused line.
-        irf_data = cal_file.readline()
+        irf_data = cal_file.readline().split()
+        if int(irf_data[0]) == 1:
+            time_step, duration = float(irf_data[1]), float(irf_data[2])
+            irf_range = np.arange(0.0, duration + time_step/2, time_step)
+        else:
+            irf_range = np.array([])
         show_pressure = cal_file.readline().split()[0] == "1"
         kochin_data = cal_file.readline().split()
-        kochin_range = np.linspace(float(kochin_data[1]), float(kochin_data[2]), int(kochin_data[0]))
+        kochin_range = np.radians(np.linspace(float(kochin_data[1]), float(kochin_data[2]), int(kochin_data[0])))
         free_surface_data = cal_file.readline().split()
 
     # Generate Capytaine's problem objects
-    env_args = dict(body=bodies, rho=rho, sea_bottom=sea_bottom, g=g)
-    problems = []
-    for omega in omega_range:
-        for direction in direction_range:
-            problems.append(DiffractionProblem(angle=direction, omega=omega, **env_args))
-        if bodies.nb_dofs > 0:
-            problems.append(RadiationProblem(omega=omega, **env_args))
-
-    return problems
+    problems = ProblemSet(bodies, omega_range, angle_range=direction_range,
+                          sea_bottom_range=[sea_bottom], rho=rho, g=g)
+    if not return_problem_set:
+        problems = list(problems)
+
+    if return_post_processing:
+        post_processing = {"IRF_time_range": irf_range, "Kochin_directions": kochin_range}
+        return problems, post_processing
+    else:
+        return problems
+
+
+def compute_cal_file_IRF(problems, results, post_processing):
+    """Compute the radiation impulse response function required by a Nemoh.cal file.
+
+    Parameters
+    ----------
+    problems: list of problems
+        the problems returned by import_cal_file
+    results: list
+        the corresponding results of Nemoh.solve_all
+    post_processing: dict
+        the post-processing options returned by import_cal_file
+
+    Returns
+    -------
+    array of shape (nb_times, nb_dofs, nb_dofs), or None if the file does not
+    require the computation of the impulse response function.
+    """
+    time_range = post_processing["IRF_time_range"]
+    if len(time_range) == 0:
+        return None
+    return compute_radiation_IRF_from_results(problems, results, time_range)
 
 
 def export_as_Nemoh_directory(problem, directory_name, omega_range=None):
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Solver for sequences of problems on a collection of bodies growing one body
+at a time, such as the layout studies of farms of wave energy converters.
+"""
+
+import logging
+
+import numpy as np
+
+from capytaine.bodies_collection import CollectionOfFloatingBodies
+from capytaine.Toeplitz_matrices import shift_diagonal
+
+
+LOG = logging.getLogger(__name__)
+
+
+def _subbodies(body):
+    if isinstance(body, CollectionOfFloatingBodies):
+        return body.subbodies
+    else:
+        return [body]
+
+
+def _dense(matrix):
+    """Convert the block matrices of symmetric bodies to usual arrays."""
+    if isinstance(matrix, np.ndarray):
+        return matrix
+    else:
+        return matrix.full_matrix()
+
+
+class IncrementalSolver:
+    """Solver keeping the inverse of the matrix V + I/2 of the last solved
+    collection of bodies.
+
+    When the body of the next problem is the same body or collection with
+    some more bodies appended at the end (e.g. `farm = farm + new_device`), only the
+    coupling blocks with the new bodies are assembled, and the inverse is
+    updated with the Schur complement of the new block. For n new faces and
+    N existing ones, the cost is O(n N²) instead of O(N³).
+    """
+
+    def __init__(self, nb_threads=1):
+        from capytaine.Nemoh import Nemoh
+        self._nemoh = Nemoh(nb_threads=nb_threads)
+
+        self._environment = None
+        self._subbodies = []  # List of (body, geometry version)
+        self._S = None
+        self._inverse = None
+
+    def _build_args(self, problem):
+        return dict(free_surface=problem.free_surface,
+                    sea_bottom=problem.sea_bottom,
+                    wavenumber=problem.wavenumber,
+                    nb_threads=self._nemoh.nb_threads)
+
+    def _nb_known_subbodies(self, problem):
+        """Number of subbodies at the beginning of the body of the problem
+        whose matrices are already stored."""
+        environment = (problem.free_surface, problem.sea_bottom, problem.wavenumber)
+        if environment != self._environment:
+            return 0
+
+        subbodies = _subbodies(problem.body)
+        if len(subbodies) < len(self._subbodies):
+            return 0
+        for body, (known_body, version) in zip(subbodies, self._subbodies):
+            if body is not known_body or body._geometry_version != version:
+                return 0
+        return len(self._subbodies)
+
+    def _factorize(self, problem):
+        """Assemble the matrices of the whole body and invert V + I/2."""
+        LOG.info(f"Assemble and invert the matrices of {problem.body.name}.")
+        S, V = self._nemoh._build_matrices(problem)
+        S, V = _dense(S), _dense(V)
+        self._S = S
+        # The inverse is computed and updated in double precision.
+        self._inverse = np.linalg.inv(shift_diagonal(V.astype(np.complex128), 1/2))
+
+    def _append_bodies(self, problem, nb_known):
+        """Assemble the coupling blocks with the new subbodies and update the
+        inverse with the Schur complement of the new block."""
+        old_bodies = _subbodies(problem.body)[:nb_known]
+        new_bodies = _subbodies(problem.body)[nb_known:]
+        old = CollectionOfFloatingBodies(old_bodies) if len(old_bodies) > 1 else old_bodies[0]
+        new = CollectionOfFloatingBodies(new_bodies) if len(new_bodies) > 1 else new_bodies[0]
+        LOG.info(f"Append {new.name} to the {nb_known} stored bodies.")
+
+        self._nemoh._initialize_green_function(problem)
+        build_args = self._build_args(problem)
+        S12, V12 = map(_dense, old.build_matrices(new, **build_args))
+        S21, V21 = map(_dense, new.build_matrices(old, **build_args))
+        S22, V22 = map(_dense, new.build_matrices(new, **build_args))
+
+        # Blocks of the inverse of [[A11, A12], [A21, A22]] with A = V + I/2.
+        A11_inv = self._inverse
+        A22 = shift_diagonal(V22.astype(np.complex128), 1/2)
+        X = A11_inv @ V12                             # A11⁻¹ A12
+        Y = V21 @ A11_inv                             # A21 A11⁻¹
+        C_inv = np.linalg.inv(A22 - V21 @ X)          # Inverse of the Schur complement
+        X_C_inv = X @ C_inv
+
+        self._inverse = np.block([[A11_inv + X_C_inv @ Y, -X_C_inv],
+                                  [-C_inv @ Y,           C_inv]])
+        self._S = np.block([[self._S, S12], [S21, S22]])
+
+    def solve(self, problem, keep_details=False):
+        """Solve the BEM problem. Same interface and results as Nemoh.solve."""
+        LOG.info("Solve %s incrementally.", problem)
+
+        nb_known = self._nb_known_subbodies(problem)
+        if nb_known == 0:
+            self._factorize(problem)
+        elif nb_known < len(_subbodies(problem.body)):
+            self._append_bodies(problem, nb_known)
+
+        self._environment = (problem.free_surface, problem.sea_bottom, problem.wavenumber)
+        self._subbodies = [(body, body._geometry_version) for body in _subbodies(problem.body)]
+
+        if keep_details:
+            problem.S = self._S
+
+        sources = self._inverse @ self._nemoh._right_hand_side(problem)
+        potential = self._S @ sources
+
+        return self._nemoh._post_process(problem, sources, potential, keep_details=keep_details)
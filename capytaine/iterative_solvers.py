@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Iterative solvers for linear systems whose matrix is only known through
+its product with vectors.
+"""
+
+import logging
+
+import numpy as np
+
+
+LOG = logging.getLogger(__name__)
+
+
+def _givens_rotation(a, b):
+    """Complex Givens rotation (c, s) such that
+    [c, s; -conj(s), c] @ [a, b] = [r, 0].
+    Vectorized over arrays of a and b."""
+    abs_a = np.abs(a)
+    norm = np.sqrt(abs_a**2 + np.abs(b)**2)
+    safe_norm = np.where(norm > 0, norm, 1.0)
+    phase = np.where(abs_a > 0, a/np.where(abs_a > 0, abs_a, 1.0), 1.0)
+    c = abs_a/safe_norm
+    s = np.where(norm > 0, phase*np.conj(b)/safe_norm, 0.0)
+    return c, s
+
+
+def gmres(matvec, b, tol=1e-6, restart=50, maxiter=100):
+    """Solve the linear system A x = b with the restarted GMRES method.
+
+    Several right-hand sides can be given as the columns of b. They are solved
+    simultaneously as independent systems, such that each call to matvec
+    performs the product of A with a block of vectors.
+
+    Parameters
+    ----------
+    matvec: function
+        the product of the matrix A with an array of shape (n,) or (n, m)
+    b: array of shape (n,) or (n, m)
+        the right-hand side(s)
+    tol: float
+        relative tolerance on the norm of the residual
+    restart: int
+        number of iterations between two restarts
+    maxiter: int
+        maximum number of restarts
+
+    Returns
+    -------
+    array of the same shape as b
+    """
+    b = np.asarray(b)
+    one_dimensional = (b.ndim == 1)
+    if one_dimensional:
+        b = b.reshape((-1, 1))
+    n, m = b.shape
+
+    dtype = np.result_type(b, matvec(b[:, :1]))
+    x = np.zeros((n, m), dtype=dtype)
+
+    b_norm = np.linalg.norm(b, axis=0)
+    b_norm = np.where(b_norm > 0, b_norm, 1.0)
+
+    for nb_restarts in range(maxiter):
+        r = b - matvec(x)
+        beta = np.linalg.norm(r, axis=0)
+        if np.all(beta <= tol*b_norm):
+            LOG.debug(f"GMRES converged after {nb_restarts} restarts.")
+            break
+
+        Q = np.zeros((restart+1, n, m), dtype=dtype)
+        H = np.zeros((restart+1, restart, m), dtype=dtype)
+        cs = np.zeros((restart, m), dtype=dtype)
+        sn = np.zeros((restart, m), dtype=dtype)
+        g = np.zeros((restart+1, m), dtype=dtype)
+
+        Q[0] = r/np.where(beta > 0, beta, 1.0)
+        g[0] = beta
+
+        for j in range(restart):
+            # Arnoldi iteration with modified Gram-Schmidt orthogonalization.
+            w = matvec(Q[j])
+            for i in range(j+1):
+                H[i, j] = np.sum(np.conj(Q[i])*w, axis=0)
+                w = w - H[i, j]*Q[i]
+            H[j+1, j] = np.linalg.norm(w, axis=0)
+            Q[j+1] = w/np.where(np.abs(H[j+1, j]) > 0, H[j+1, j], 1.0)
+
+            # Triangularization of the Hessenberg matrix.
+            for i in range(j):
+                temp = cs[i]*H[i, j] + sn[i]*H[i+1, j]
+                H[i+1, j] = -np.conj(sn[i])*H[i, j] + cs[i]*H[i+1, j]
+                H[i, j] = temp
+            cs[j], sn[j] = _givens_rotation(H[j, j], H[j+1, j])
+            H[j, j] = cs[j]*H[j, j] + sn[j]*H[j+1, j]
+            H[j+1, j] = 0.0
+            g[j+1] = -np.conj(sn[j])*g[j]
+            g[j] = cs[j]*g[j]
+
+            if np.all(np.abs(g[j+1]) <= tol*b_norm):
+                break
+
+        k = j+1
+        R = np.moveaxis(H[:k, :k], -1, 0)  # shape (m, k, k)
+        diagonal = np.arange(k)
+        # Avoid a singular matrix for the systems that had already converged.
+        R[:, diagonal, diagonal] = np.where(R[:, diagonal, diagonal] == 0, 1.0, R[:, diagonal, diagonal])
+        y = np.linalg.solve(R, g[:k].T[:, :, np.newaxis])[:, :, 0]  # shape (m, k)
+        x += np.einsum('ijk,ki->jk', Q[:k], y)
+
+    else:
+        residual = np.linalg.norm(b - matvec(x), axis=0)/b_norm
+        if np.any(residual > tol):
+            LOG.warning(f"GMRES did not converge after {maxiter} restarts (relative residual: {np.max(residual):.2e}).")
+
+    if one_dimensional:
+        return x[:, 0]
+    else:
+        return x
+
+
+def block_iterative_solve(A, b, method="gauss_seidel", tol=1e-6, maxiter=100, residuals=None):
+    """Solve the linear system A x = b by block Jacobi or block Gauss-Seidel
+    iterations, where A is a square BlockMatrix.
+
+    For a collection of bodies, each iteration solves the problem of each body
+    with the waves scattered by the others at the previous iteration (multiple
+    scattering). The diagonal blocks are inverted once (only once for the
+    diagonal blocks that are the same object), then each iteration costs one
+    product with the coupling blocks. It converges when the coupling blocks
+    are small compared to the diagonal blocks, e.g. for distant bodies.
+
+    Parameters
+    ----------
+    A: BlockMatrix
+        the matrix, with square diagonal blocks
+    b: array of shape (n,) or (n, m)
+        the right-hand side(s)
+    method: string
+        "jacobi" or "gauss_seidel"
+    tol: float
+        relative tolerance on the norm of the residual
+    maxiter: int
+        maximum number of iterations
+    residuals: list, optional
+        if given, the relative residual of each iteration is appended to it
+
+    Returns
+    -------
+    array of the same shape as b
+    """
+    if method not in ("jacobi", "gauss_seidel"):
+        raise ValueError(f"Unknown block iterative method: {method}")
+    assert A.nb_blocks[0] == A.nb_blocks[1]
+    assert A.blocks_rows == A.blocks_columns
+
+    b = np.asarray(b)
+    nb_blocks = A.nb_blocks[0]
+    slices = [slice(start, start + size) for start, size in
+              zip(np.cumsum([0] + A.blocks_rows[:-1]), A.blocks_rows)]
+
+    inverses = {}
+    for i in range(nb_blocks):
+        block = A.blocks[i][i]
+        if id(block) not in inverses:
+            inverses[id(block)] = np.linalg.inv(block if isinstance(block, np.ndarray) else block.full_matrix())
+    LOG.debug(f"Inverted {len(inverses)} distinct diagonal blocks out of {nb_blocks}.")
+
+    x = np.zeros(b.shape, dtype=np.result_type(b, A.dtype))
+    b_norm = np.linalg.norm(b)
+    if b_norm == 0:
+        return x
+
+    for nb_iterations in range(1, maxiter+1):
+        previous_x = x.copy() if method == "jacobi" else x
+        squared_residual = 0.0
+        for i in range(nb_blocks):
+            # Right-hand side of body i, including the waves scattered by the other bodies.
+            c = b[slices[i]].astype(x.dtype)
+            for j in range(nb_blocks):
+                if j != i:
+                    c -= A.blocks[i][j] @ previous_x[slices[j]]
+            squared_residual += np.linalg.norm(c - A.blocks[i][i] @ x[slices[i]])**2
+            x[slices[i]] = inverses[id(A.blocks[i][i])] @ c
+
+        residual = np.sqrt(squared_residual)/b_norm
+        if residuals is not None:
+            residuals.append(residual)
+        LOG.debug(f"Block {method} iteration {nb_iterations}: relative residual {residual:.2e}.")
+        if residual <= tol:
+            LOG.info(f"Block {method} iterations converged after {nb_iterations} iterations "
+                     f"(relative residual: {residual:.2e}).")
+            break
+    else:
+        LOG.warning(f"Block {method} iterations did not converge after {maxiter} iterations "
+                    f"(relative residual: {residual:.2e}).")
+
+    return x
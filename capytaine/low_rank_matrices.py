@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Low-rank matrices and their construction by adaptive cross approximation.
+
+The interaction between two distant groups of faces is a smooth function of
+the positions of the faces, so that the corresponding block of the influence
+matrices can be approximated by a matrix of low rank.
+"""
+
+import logging
+from numbers import Number
+
+import numpy as np
+
+LOG = logging.getLogger(__name__)
+
+
+class LowRankMatrix:
+    """A matrix stored as the product of two matrices: left @ right,
+    with left of shape (m, r) and right of shape (r, n), where r is the rank."""
+
+    # Make numpy call the reflected operators below (e.g. array + LowRankMatrix).
+    __array_ufunc__ = None
+
+    def __init__(self, left, right):
+        assert left.ndim == 2 and right.ndim == 2
+        assert left.shape[1] == right.shape[0]
+        self.left = left
+        self.right = right
+
+    @staticmethod
+    def zeros(shape, dtype=np.float64):
+        """Return a zero matrix of the given shape as a matrix of rank 0."""
+        return LowRankMatrix(np.zeros((shape[0], 0), dtype=dtype), np.zeros((0, shape[1]), dtype=dtype))
+
+    @property
+    def shape(self):
+        return self.left.shape[0], self.right.shape[1]
+
+    @property
+    def rank(self):
+        return self.left.shape[1]
+
+    @property
+    def dtype(self):
+        return np.result_type(self.left, self.right)
+
+    def __add__(self, other):
+        if isinstance(other, LowRankMatrix):
+            # The ranks add up.
+            assert other.shape == self.shape
+            return LowRankMatrix(np.concatenate([self.left, other.left], axis=1),
+                                 np.concatenate([self.right, other.right], axis=0))
+        else:
+            return self.full_matrix() + other
+
+    def __radd__(self, other):
+        # Addition is commutative
+        return self.__add__(other)
+
+    def __sub__(self, other):
+        return self.__add__(-other)
+
+    def __rsub__(self, other):
+        return (-self).__add__(other)
+
+    def __neg__(self):
+        return LowRankMatrix(-self.left, self.right)
+
+    def __mul__(self, other):
+        if isinstance(other, Number):
+            return LowRankMatrix(self.left * other, self.right)
+        else:
+            return self.full_matrix() * other
+
+    def __rmul__(self, other):
+        # Multiplication is commutative
+        return self.__mul__(other)
+
+    def __truediv__(self, other):
+        if isinstance(other, Number):
+            return LowRankMatrix(self.left / other, self.right)
+        else:
+            return self.full_matrix() / other
+
+    def __matmul__(self, other):
+        if isinstance(other, np.ndarray):
+            if self.shape[1] != other.shape[0]:
+                raise Exception("Size of the matrices does not match!")
+            return self.left @ (self.right @ other)
+        else:
+            return NotImplemented
+
+    def __rmatmul__(self, other):
+        if isinstance(other, np.ndarray):
+            return (other @ self.left) @ self.right
+        else:
+            return NotImplemented
+
+    def full_matrix(self):
+        """Return the matrix as an usual array."""
+        return self.left @ self.right
+
+
+def adaptive_cross_approximation(get_row, get_column, shape, tol=1e-4, max_rank=None, dtype=np.complex64):
+    """Build a low-rank approximation of a matrix from some of its rows and columns.
+
+    Adaptive cross approximation with partial pivoting: at each step, a row
+    of the residual is evaluated, its largest entry gives the column to be
+    evaluated, whose largest entry gives the next row. Only O(r(m+n)) entries
+    of the matrix are evaluated to get an approximation of rank r.
+
+    Parameters
+    ----------
+    get_row: function
+        get_row(i) returns the i-th row of the matrix as an array of length n
+    get_column: function
+        get_column(j) returns the j-th column of the matrix as an array of length m
+    shape: couple of int
+        the shape (m, n) of the matrix
+    tol: float
+        relative tolerance: the construction stops when the norm of the last
+        added rank-one matrix is below tol times the norm of the approximation
+    max_rank: int, optional
+        maximum rank of the approximation. By default, the rank at which the
+        low-rank matrix would use as much memory as the full matrix.
+
+    Returns
+    -------
+    LowRankMatrix, or None if the approximation did not converge before max_rank.
+    """
+    m, n = shape
+    if max_rank is None:
+        max_rank = (m*n)//(m+n)
+    max_rank = min(max_rank, m, n)
+
+    left = np.zeros((m, max_rank), dtype=dtype)
+    right = np.zeros((max_rank, n), dtype=dtype)
+    available_rows = np.ones(m, dtype=bool)
+    squared_norm = 0.0  # Squared Frobenius norm of the approximation.
+
+    rank = 0
+    i = 0
+    while rank < max_rank:
+        available_rows[i] = False
+        row = get_row(i) - left[i, :rank] @ right[:rank]
+        j = np.argmax(np.abs(row))
+
+        if row[j] == 0:
+            # This row is already exactly approximated. Try another one.
+            if not np.any(available_rows):
+                return LowRankMatrix(left[:, :rank], right[:rank])
+            i = np.argmax(available_rows)
+            continue
+
+        right[rank] = row/row[j]
+        left[:, rank] = get_column(j) - left[:, :rank] @ right[:rank, j]
+
+        # Update the norm of the approximation with the new rank-one matrix.
+        u, v = left[:, rank], right[rank]
+        squared_norm_u_v = np.real(np.vdot(u, u) * np.vdot(v, v))
+        squared_norm += squared_norm_u_v + 2*np.real(
+            np.sum((left[:, :rank].conj().T @ u) * (right[:rank].conj() @ v))
+        )
+        rank += 1
+
+        if squared_norm_u_v <= tol**2 * squared_norm:
+            LOG.debug(f"\t\tAdaptive cross approximation of rank {rank} for a {m}×{n} matrix.")
+            return LowRankMatrix(left[:, :rank], right[:rank])
+
+        if not np.any(available_rows):
+            # All the rows have been used: the approximation is exact.
+            return LowRankMatrix(left[:, :rank], right[:rank])
+        i = np.argmax(np.where(available_rows, np.abs(u), -1.0))
+
+    LOG.debug(f"\t\tAdaptive cross approximation did not converge for a {m}×{n} matrix before rank {max_rank}.")
+    return None
@@ -8,29 +8,40 @@ from warnings import warn
 
 import numpy as np
 
-from capytaine._Wavenumber import invert_xtanhx
+from capytaine.wavenumber import compute_wavenumber, solve_dispersion_relation
+
+
+def _check_domain(body, free_surface, sea_bottom):
+    """Check the consistency of the domain and the position of the body in it."""
+    if free_surface < sea_bottom:
+        raise Exception("Sea bottom is above the free surface.")
+
+    (_, _, z_min), (_, _, z_max) = body.bounding_box
+    if z_max > free_surface + 1e-3 or z_min < sea_bottom - 1e-3:
+        warn(f"""The mesh of the body {body.name} is not inside the domain.\nUse body.get_immersed_part() to clip the mesh.""")
 
 
 class PotentialFlowProblem:
 
-    def __init__(self, body, free_surface=0.0, sea_bottom=-np.infty, omega=1.0, rho=1000.0, g=9.81):
+    def __init__(self, body, free_surface=0.0, sea_bottom=-np.infty, omega=1.0, rho=1000.0, g=9.81,
+                 _wavenumber=None):
+        """The private argument _wavenumber is used by ProblemSet, which has
+        already checked the domain and computed the wavenumbers of the whole grid."""
         self.rho = rho
         self.g = g
         self.omega = omega
 
-        if free_surface < sea_bottom:
-            raise Exception("Sea bottom is above the free surface.")
+        if _wavenumber is None:
+            _check_domain(body, free_surface, sea_bottom)
 
         self.free_surface = free_surface
         self.sea_bottom = sea_bottom
 
-        if self.depth == np.infty or omega**2*self.depth/g > 20:
-            self.wavenumber = omega**2/g
+        if _wavenumber is None:
+            self.wavenumber = compute_wavenumber(omega, self.depth, g)
         else:
-            self.wavenumber = invert_xtanhx(omega**2*self.depth/g)/self.depth
+            self.wavenumber = _wavenumber
 
-        if any(body.vertices[:, 2] > free_surface + 1e-3) or any(body.vertices[:, 2] < sea_bottom - 1e-3):
-            warn(f"""The mesh of the body {body.name} is not inside the domain.\nUse body.get_immersed_part() to clip the mesh.""")
         self.body = body
 
     @property
@@ -136,3 +147,115 @@ class RadiationProblem(PotentialFlowProblem):
     def dofs(self):
         return self.body.dofs
 
+
+
+class ProblemSet:
+    """Grid of problems: bodies × water depths × frequencies, with a
+    diffraction problem for each wave direction and a radiation problem for
+    each point of the grid.
+
+    The domain is checked and the wavenumbers are computed once for the whole
+    grid at the creation of the set. The problems themselves are only created
+    when iterating over the set, for instance by the solver.
+    """
+
+    def __init__(self, bodies, omega_range, angle_range=(0.0,), sea_bottom_range=(-np.infty,),
+                 free_surface=0.0, rho=1000.0, g=9.81, radiation=True):
+        """
+        Parameters
+        ----------
+        bodies: FloatingBody or list of FloatingBody
+        omega_range: array
+            angular frequencies
+        angle_range: array
+            directions of the incoming waves of the diffraction problems
+            (empty for no diffraction problem)
+        sea_bottom_range: array
+            vertical positions of the sea bottom
+        free_surface, rho, g: float
+            see PotentialFlowProblem
+        radiation: bool
+            whether to include the radiation problems (for the bodies with dofs)
+        """
+        if not isinstance(bodies, (list, tuple)):
+            bodies = [bodies]
+        self.bodies = list(bodies)
+        self.omega_range = np.atleast_1d(np.asarray(omega_range, dtype=np.float64))
+        self.angle_range = np.atleast_1d(np.asarray(angle_range, dtype=np.float64))
+        self.sea_bottom_range = np.atleast_1d(np.asarray(sea_bottom_range, dtype=np.float64))
+        self.free_surface = free_surface
+        self.rho = rho
+        self.g = g
+        self.radiation = radiation
+
+        for body in self.bodies:
+            for sea_bottom in self.sea_bottom_range:
+                _check_domain(body, free_surface, sea_bottom)
+
+        self.wavenumbers = solve_dispersion_relation(
+            self.omega_range[np.newaxis, :], self.depth_range[:, np.newaxis], g
+        )
+
+    @property
+    def depth_range(self):
+        return self.free_surface - self.sea_bottom_range
+
+    @property
+    def shape(self):
+        """Shape of the grid: (nb_bodies, nb_depths, nb_omegas)."""
+        return len(self.bodies), len(self.sea_bottom_range), len(self.omega_range)
+
+    def _has_radiation(self, body):
+        return self.radiation and body.nb_dofs > 0
+
+    def __len__(self):
+        nb_radiation = sum(1 for body in self.bodies if self._has_radiation(body))
+        return (len(self.bodies)*len(self.angle_range) + nb_radiation) * len(self.sea_bottom_range) * len(self.omega_range)
+
+    def _indices(self):
+        """Position in the grid of each problem, in the order of the iteration."""
+        for i_body, body in enumerate(self.bodies):
+            for i_depth in range(len(self.sea_bottom_range)):
+                for i_omega in range(len(self.omega_range)):
+                    for i_angle in range(len(self.angle_range)):
+                        yield (i_body, i_depth, i_omega), i_angle
+                    if self._has_radiation(body):
+                        yield (i_body, i_depth, i_omega), None
+
+    def __iter__(self):
+        for (i_body, i_depth, i_omega), i_angle in self._indices():
+            env_args = dict(body=self.bodies[i_body], free_surface=self.free_surface,
+                            sea_bottom=self.sea_bottom_range[i_depth], omega=self.omega_range[i_omega],
+                            rho=self.rho, g=self.g, _wavenumber=self.wavenumbers[i_depth, i_omega])
+            if i_angle is None:
+                yield RadiationProblem(**env_args)
+            else:
+                yield DiffractionProblem(angle=self.angle_range[i_angle], **env_args)
+
+    def gather_results(self, results):
+        """Arrange the results of the solver for the problems of the set
+        (in the order of the iteration) into arrays shaped like the grid.
+
+        Returns
+        -------
+        dict of arrays with keys
+            "added_masses" and "added_dampings", of shape (nb_bodies, nb_depths, nb_omegas, nb_dofs, nb_dofs)
+            "diffraction_forces", of shape (nb_bodies, nb_depths, nb_omegas, nb_angles, nb_dofs)
+        where nb_dofs is the largest number of dofs of the bodies
+        (the missing values of the bodies with less dofs are set to nan).
+        """
+        nb_dofs = max(body.nb_dofs for body in self.bodies)
+        added_masses = np.full(self.shape + (nb_dofs, nb_dofs), np.nan)
+        added_dampings = np.full(self.shape + (nb_dofs, nb_dofs), np.nan)
+        diffraction_forces = np.full(self.shape + (len(self.angle_range), nb_dofs), np.nan, dtype=np.complex128)
+
+        for (index, i_angle), result in zip(self._indices(), results):
+            n = self.bodies[index[0]].nb_dofs
+            if i_angle is None:
+                added_masses[index][:n, :n], added_dampings[index][:n, :n] = result
+            else:
+                diffraction_forces[index][i_angle, :n] = result
+
+        return {"added_masses": added_masses,
+                "added_dampings": added_dampings,
+                "diffraction_forces": diffraction_forces}
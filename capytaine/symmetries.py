@@ -8,9 +8,10 @@ import numpy as np
 
 from meshmagick.geometry import Plane
 
-from capytaine.bodies import FloatingBody
-from capytaine.Toeplitz_matrices import BlockToeplitzMatrix, BlockCirculantMatrix
+from capytaine.bodies import FloatingBody, DofsArray
+from capytaine.Toeplitz_matrices import BlockToeplitzMatrix, BlockCirculantMatrix, BlockMatrix
 from capytaine.bodies_collection import CollectionOfFloatingBodies
+from capytaine.tools import MaxLengthDict
 
 
 LOG = logging.getLogger(__name__)
@@ -59,9 +60,11 @@ class ReflectionSymmetry(_SymmetricBody):
             self.name = name
         LOG.info(f"New mirror symmetric body: {self.name}.")
 
-        self.dofs = {}
-        for name, dof in half.dofs.items():
-            self.dofs['mirrored_' + name] = np.concatenate([dof, dof])
+        self.dofs = DofsArray(
+            self.nb_faces,
+            ['mirrored_' + name for name in half.dofs],
+            np.tile(half.dofs.matrix, (1, self.nb_subbodies))
+        )
 
     def build_matrices(self, other_body, force_full_computation=False, **kwargs):
         """Return the influence matrices of self on other_body."""
@@ -121,9 +124,11 @@ class TranslationalSymmetry(_SymmetricBody):
             self.name = name
         LOG.info(f"New translation symmetric body: {self.name}.")
 
-        self.dofs = {}
-        for name, dof in body_slice.dofs.items():
-            self.dofs["translated_" + name] = np.concatenate([dof]*nb_repetitions)
+        self.dofs = DofsArray(
+            self.nb_faces,
+            ["translated_" + name for name in body_slice.dofs],
+            np.tile(body_slice.dofs.matrix, (1, self.nb_subbodies))
+        )
 
     def build_matrices(self, other_body, force_full_computation=False, **kwargs):
         """Compute the influence matrix of `self` on `other_body`.
@@ -157,6 +162,32 @@ class TranslationalSymmetry(_SymmetricBody):
             return CollectionOfFloatingBodies.build_matrices(self, other_body, **kwargs)
 
 
+def _rotation_of_slices(slices, atol=1e-5):
+    """Return the horizontal position of the axis and the direction of the
+    rotation around a vertical axis mapping slices[0] on slices[i] for
+    all i, or None if there is no such rotation."""
+    nb_slices = len(slices)
+    centers = [body.faces_centers for body in slices]
+    if any(c.shape != centers[0].shape for c in centers):
+        return None
+    # The mean of all the faces centers of the whole body is on the axis.
+    axis = np.mean(np.concatenate(centers)[:, :2], axis=0)
+    scale = max(1.0, np.max(np.abs(centers[0][:, :2] - axis)))
+
+    for direction in (+1, -1):
+        for i, slice_centers in enumerate(centers):
+            angle = direction*2*np.pi*i/nb_slices
+            rotation = np.array([[np.cos(angle), -np.sin(angle)],
+                                 [np.sin(angle),  np.cos(angle)]])
+            expected = (centers[0][:, :2] - axis) @ rotation.T + axis
+            if not (np.allclose(slice_centers[:, :2], expected, atol=atol*scale)
+                    and np.allclose(slice_centers[:, 2], centers[0][:, 2], atol=atol*scale)):
+                break
+        else:
+            return axis, direction
+    return None
+
+
 class AxialSymmetry(_SymmetricBody):
     """A body composed of a pattern rotated around a vertical axis."""
 
@@ -179,6 +210,8 @@ class AxialSymmetry(_SymmetricBody):
         point_on_rotation_axis = np.asarray(point_on_rotation_axis)
         assert point_on_rotation_axis.shape == (3,)
 
+        self.point_on_rotation_axis = point_on_rotation_axis
+
         body_slice.nb_matrices_to_keep *= nb_repetitions+1
         slices = [body_slice]
         for i in range(1, nb_repetitions+1):
@@ -197,9 +230,28 @@ class AxialSymmetry(_SymmetricBody):
             self.name = name
         LOG.info(f"New rotation symmetric body: {self.name}.")
 
-        self.dofs = {}
-        for name, dof in body_slice.dofs.items():
-            self.dofs["rotated_" + name] = np.concatenate([dof]*nb_repetitions)
+        self.dofs = DofsArray(
+            self.nb_faces,
+            ["rotated_" + name for name in body_slice.dofs],
+            np.tile(body_slice.dofs.matrix, (1, self.nb_subbodies))
+        )
+
+    @property
+    def _rotation(self):
+        """Horizontal position of the vertical rotation axis and direction of
+        the rotation (+1 or -1) from each slice to the next one, computed from
+        the current geometry of the slices, since the body might have been
+        moved after its creation. None if the slices are not the rotations
+        of the first one around a vertical axis anymore."""
+        return self._cached_geometry('rotation', lambda: _rotation_of_slices(self.subbodies))
+
+    def _same_rotation_as(self, other_body):
+        """Whether the slices of self and other_body are obtained by the same
+        rotations around the same vertical axis."""
+        rotation, other_rotation = self._rotation, other_body._rotation
+        return (rotation is not None and other_rotation is not None
+                and rotation[1] == other_rotation[1]
+                and np.allclose(rotation[0], other_rotation[0], atol=1e-5))
 
     def build_matrices(self, other_body, force_full_computation=False, **kwargs):
         """Compute the influence matrix of `self` on `other_body`.
@@ -227,5 +279,336 @@ class AxialSymmetry(_SymmetricBody):
             else:
                 return BlockCirculantMatrix(S_list, size=self.nb_subbodies), BlockCirculantMatrix(V_list, size=self.nb_subbodies)
 
+        elif (isinstance(other_body, AxialSymmetry)
+              and other_body.nb_subbodies == self.nb_subbodies
+              and self._same_rotation_as(other_body)
+              and not force_full_computation):
+            # The block of the i-th slice of self and the j-th slice of
+            # other_body only depends on (j-i) modulo the number of slices.
+            # Only the first row of blocks is computed, the other ones share its blocks.
+            LOG.debug(f"Evaluating matrix of {self.name} on {other_body.name} using rotation symmetry.")
+
+            S_list, V_list = [], []
+            for body in other_body.subbodies:
+                S, V = self.subbodies[0].build_matrices(body, **kwargs)
+                if not isinstance(S, np.ndarray):
+                    S, V = S.full_matrix(), V.full_matrix()
+                S_list.append(S)
+                V_list.append(V)
+
+            n = self.nb_subbodies
+            return (BlockMatrix([[S_list[(j-i) % n] for j in range(n)] for i in range(n)]),
+                    BlockMatrix([[V_list[(j-i) % n] for j in range(n)] for i in range(n)]))
+
         else:
             return CollectionOfFloatingBodies.build_matrices(self, other_body, **kwargs)
+
+
+#############################
+#  Detection of symmetries  #
+#############################
+
+def _match_faces(centers, normals, body, atol):
+    """Indices of the faces of body with the given centers and normals,
+    or None if some of them are not found."""
+    grid = np.round(body.faces_centers/atol).astype(np.int64)
+    index = {tuple(key): i for i, key in enumerate(grid)}
+
+    matches = np.empty(len(centers), dtype=np.int64)
+    for k, (key, center) in enumerate(zip(np.round(centers/atol).astype(np.int64), centers)):
+        i = index.get(tuple(key))
+        if i is None:
+            # The rounding may differ for a point close to the boundary of a cell of the grid.
+            i = np.argmin(np.linalg.norm(body.faces_centers - center, axis=1))
+            if np.linalg.norm(body.faces_centers[i] - center) > atol:
+                return None
+        matches[k] = i
+
+    # The normals only guard against faces with the same center but a different orientation.
+    if not np.allclose(body.faces_normals[matches], normals, atol=1e-3):
+        return None
+    return matches
+
+
+def _reflection_across(body, plane, atol):
+    """Indices of the faces of the half of body on the side of the normal of
+    the plane and of the faces matching them in the other half, or None if
+    body is not symmetric with respect to the plane."""
+    distances = plane.get_point_dist_wrt_plane(body.faces_centers)
+    if np.any(np.abs(distances) < atol):
+        # Some faces cross the plane.
+        return None
+
+    half = np.where(distances > 0)[0]
+    if 2*len(half) != body.nb_faces:
+        return None
+
+    normal = np.asarray(plane.normal)
+    mirrored_centers = body.faces_centers[half] - 2*distances[half, np.newaxis]*normal
+    mirrored_normals = body.faces_normals[half] - 2*(body.faces_normals[half] @ normal)[:, np.newaxis]*normal
+    matches = _match_faces(mirrored_centers, mirrored_normals, body, atol)
+    if matches is None:
+        return None
+    return half, matches
+
+
+def _reflection(body, axis, atol):
+    """Look for a symmetry plane normal to the horizontal axis (0 for x, 1
+    for y) through the center of the bounding box.
+
+    Returns
+    -------
+    (number of repetitions, function building the symmetric body from the
+    half, indices of the faces of the half, indices of the faces matching
+    each face of the half in the other half), or None
+    """
+    normal = np.zeros(3)
+    normal[axis] = 1.0
+    plane = Plane(normal=normal, scalar=np.mean(body.bounding_box[:, axis]))
+
+    reflection = _reflection_across(body, plane, atol)
+    if reflection is None:
+        return None
+    half, matches = reflection
+    return 2, lambda pattern, name: ReflectionSymmetry(pattern, plane, name=name), half, [matches]
+
+
+def _translation(body, axis, atol):
+    """Look for the smallest pattern repeated by translation along a horizontal axis.
+    Same returned value as _reflection."""
+    coordinates = body.faces_centers[:, axis]
+    sorted_coordinates = np.sort(coordinates)
+    start = sorted_coordinates[0]
+
+    for step in np.unique(np.round((sorted_coordinates - start)/atol))[1:]*atol:
+        nb_faces_in_pattern = np.searchsorted(sorted_coordinates, start + step - atol/2)
+        if body.nb_faces % nb_faces_in_pattern != 0:
+            continue
+        nb_repetitions = int(body.nb_faces // nb_faces_in_pattern)
+
+        pattern = np.where(coordinates < start + step - atol/2)[0]
+        translation = np.zeros(3)
+        translation[axis] = step
+
+        all_matches = []
+        for i in range(1, nb_repetitions):
+            matches = _match_faces(body.faces_centers[pattern] + i*translation, body.faces_normals[pattern], body, atol)
+            if matches is None:
+                break
+            all_matches.append(matches)
+        else:
+            return (nb_repetitions,
+                    lambda pattern, name: TranslationalSymmetry(pattern, translation, nb_repetitions-1, name=name),
+                    pattern, all_matches)
+    return None
+
+
+def _rotation_around(body, axis_point, nb_repetitions, atol):
+    """Indices of the faces of an angular sector of body and of the faces
+    matching them in the rotated copies of the sector, or None if body is
+    not invariant by the rotation of angle 2π/nb_repetitions around the
+    vertical axis through axis_point."""
+    if body.nb_faces % nb_repetitions != 0:
+        return None
+
+    relative_centers = body.faces_centers - axis_point
+    if np.any(np.linalg.norm(relative_centers[:, :2], axis=1) < atol):
+        # Some faces are on the axis.
+        return None
+
+    angle = 2*np.pi/nb_repetitions
+    R = np.array([[np.cos(angle), -np.sin(angle), 0.0],
+                  [np.sin(angle),  np.cos(angle), 0.0],
+                  [0.0,            0.0,           1.0]])
+    generator = _match_faces(relative_centers @ R.T + axis_point, body.faces_normals @ R.T, body, atol)
+    if generator is None or len(np.unique(generator)) != body.nb_faces:
+        return None
+
+    # The pattern is an angular sector starting just before the first face.
+    angles = np.arctan2(relative_centers[:, 1], relative_centers[:, 0])
+    relative_angles = np.mod(angles - angles[0] + 1e-6, 2*np.pi)
+    pattern = np.where(relative_angles < angle)[0]
+    if len(pattern)*nb_repetitions != body.nb_faces:
+        return None
+
+    all_matches = []
+    matches = pattern
+    for i in range(1, nb_repetitions):
+        matches = generator[matches]
+        all_matches.append(matches)
+    return pattern, all_matches
+
+
+def _rotation(body, atol):
+    """Look for the highest order of rotation symmetry around the vertical
+    axis through the center of the bounding box.
+    Same returned value as _reflection."""
+    axis_point = np.zeros(3)
+    axis_point[:2] = np.mean(body.bounding_box[:, :2], axis=0)
+
+    for nb_repetitions in range(int(body.nb_faces), 2, -1):
+        rotation = _rotation_around(body, axis_point, nb_repetitions, atol)
+        if rotation is not None:
+            pattern, all_matches = rotation
+            return (nb_repetitions,
+                    lambda pattern, name: AxialSymmetry(pattern, axis_point, nb_repetitions-1, name=name),
+                    pattern, all_matches)
+    return None
+
+
+# The symmetries that can still be used inside the pattern of each symmetry,
+# such that the attributes of the inner symmetric bodies (plane, translation)
+# are not invalidated when the pattern is mirrored, translated or rotated.
+_COMPATIBLE_SYMMETRIES = {
+    "rotation": set(),
+    "reflection_x": {"rotation", "reflection_y", "translation_y"},
+    "reflection_y": {"rotation", "reflection_x", "translation_x"},
+    "translation_x": {"rotation", "reflection_y", "translation_y"},
+    "translation_y": {"rotation", "reflection_x", "translation_x"},
+}
+
+
+def _detect_symmetries(body, atol, allowed):
+    """Return the symmetric body and the permutation of the faces of body
+    giving the faces of the symmetric body."""
+    candidates = {}
+    if "rotation" in allowed:
+        candidates["rotation"] = _rotation(body, atol)
+    for axis, name in enumerate("xy"):
+        if f"reflection_{name}" in allowed:
+            candidates[f"reflection_{name}"] = _reflection(body, axis, atol)
+        if f"translation_{name}" in allowed:
+            candidates[f"translation_{name}"] = _translation(body, axis, atol)
+    candidates = {kind: symmetry for kind, symmetry in candidates.items() if symmetry is not None}
+
+    if len(candidates) == 0:
+        return body, np.arange(body.nb_faces)
+
+    # Keep the symmetry with the largest number of repetitions.
+    kind = max(candidates, key=lambda kind: candidates[kind][0])
+    nb_repetitions, build, pattern_faces, all_matches = candidates[kind]
+    LOG.info(f"Found {kind} symmetry of order {nb_repetitions} in {body.name}.")
+
+    pattern = body.extract_faces(pattern_faces)
+    pattern.name = f"pattern_of_{body.name}"
+    pattern, pattern_permutation = _detect_symmetries(pattern, atol, allowed & _COMPATIBLE_SYMMETRIES[kind])
+
+    # The faces of the copies of the pattern are ordered as the faces of the pattern.
+    permutation = np.concatenate([pattern_faces[pattern_permutation]] +
+                                 [matches[pattern_permutation] for matches in all_matches])
+    symmetric_body = build(pattern, body.name)
+    symmetric_body.dofs = DofsArray(body.nb_faces, body.dofs.names, body.dofs.matrix[:, permutation])
+    return symmetric_body, permutation
+
+
+def detect_symmetries(body, tol=1e-5, return_permutation=False):
+    """Look for the symmetries of the mesh of a body and return it as a
+    (possibly nested) symmetric body.
+
+    The detected symmetries are the vertical planes of symmetry xOz and yOz
+    (through the center of the bounding box), the rotations around the
+    vertical axis through the center of the bounding box and the
+    repetitions of a pattern by translation along x or y. At each level, the
+    symmetry with the largest number of repetitions is used, then the
+    symmetries of the pattern are looked for.
+
+    Parameters
+    ----------
+    body: FloatingBody
+        the body to be analyzed
+    tol: float
+        tolerance on the positions of the faces, relative to the size of the body
+    return_permutation: bool
+        if True, also return the permutation of the faces
+
+    Returns
+    -------
+    the symmetric body (or body itself if no symmetry has been found), whose
+    faces are the faces of body in the order given by the permutation, and
+    whose dofs are the dofs of body reordered accordingly.
+    """
+    body = body.as_FloatingBody()
+    size = np.max(body.bounding_box[1] - body.bounding_box[0])
+    atol = tol*max(size, 1.0)
+
+    symmetric_body, permutation = _detect_symmetries(body, atol, set(_COMPATIBLE_SYMMETRIES))
+
+    if symmetric_body is not body and not (
+            np.allclose(symmetric_body.faces_centers, body.faces_centers[permutation], atol=atol) and
+            np.allclose(symmetric_body.faces_areas, body.faces_areas[permutation], rtol=1e-3)):
+        LOG.warning(f"The symmetric body built from {body.name} does not match the original mesh. Symmetries are not used.")
+        symmetric_body, permutation = body, np.arange(body.nb_faces)
+
+    if return_permutation:
+        return symmetric_body, permutation
+    else:
+        return symmetric_body
+
+
+def _match_symmetries(mesh, body, atol):
+    """Recursive part of match_symmetries."""
+    if isinstance(body, ReflectionSymmetry):
+        reflection = _reflection_across(mesh, body.plane, atol)
+        if reflection is not None:
+            half_faces, matches = reflection
+            half = mesh.extract_faces(half_faces)
+            half.name = f"half_of_{mesh.name}"
+            half, half_permutation = _match_symmetries(half, body.subbodies[0], atol)
+            permutation = np.concatenate([half_faces[half_permutation], matches[half_permutation]])
+            return ReflectionSymmetry(half, body.plane, name=mesh.name), permutation
+
+    elif isinstance(body, AxialSymmetry) and body._rotation is not None:
+        # The axis is taken from the current geometry of the body, which might have been moved.
+        axis_point = np.array([*body._rotation[0], 0.0])
+        rotation = _rotation_around(mesh, axis_point, body.nb_subbodies, atol)
+        if rotation is not None:
+            pattern_faces, all_matches = rotation
+            pattern = mesh.extract_faces(pattern_faces)
+            pattern.name = f"slice_of_{mesh.name}"
+            permutation = np.concatenate([pattern_faces] + all_matches)
+            return AxialSymmetry(pattern, axis_point, body.nb_subbodies-1, name=mesh.name), permutation
+
+    return mesh, np.arange(mesh.nb_faces)
+
+
+def match_symmetries(mesh, body, tol=1e-5):
+    """Rebuild a mesh with the same symmetries as a symmetric body, if the
+    mesh has them. The influence matrices of the returned mesh on body are
+    then block Toeplitz or block circulant matrices, of which only one row of
+    blocks is computed.
+
+    The reflection symmetries (possibly nested) and the rotation symmetries
+    are supported. The result is stored in the mesh until the next
+    transformation of the mesh.
+
+    Parameters
+    ----------
+    mesh: FloatingBody
+        e.g. a free surface mesh on which the potential is evaluated
+    body: FloatingBody
+        a (possibly) symmetric body
+    tol: float
+        tolerance on the positions of the faces, relative to the size of the mesh
+
+    Returns
+    -------
+    the symmetric mesh (or mesh itself if the symmetries of body are not
+    found), and the permutation such that the i-th face of the symmetric
+    mesh is the permutation[i]-th face of mesh.
+    """
+    if not isinstance(body, (ReflectionSymmetry, AxialSymmetry)) or isinstance(mesh, CollectionOfFloatingBodies):
+        return mesh, np.arange(mesh.nb_faces)
+
+    if 'matched_symmetries' not in mesh.__internals__:
+        mesh.__internals__['matched_symmetries'] = MaxLengthDict({}, max_length=1)
+
+    key = (body, body._geometry_version)
+    if key not in mesh.__internals__['matched_symmetries']:
+        size = np.max(mesh.bounding_box[1] - mesh.bounding_box[0])
+        atol = tol*max(size, 1.0)
+        symmetric_mesh, permutation = _match_symmetries(mesh, body, atol)
+        if symmetric_mesh is not mesh:
+            LOG.info(f"Use the symmetries of {body.name} in {mesh.name}.")
+        mesh.__internals__['matched_symmetries'][key] = (symmetric_mesh, permutation)
+
+    return mesh.__internals__['matched_symmetries'][key]
@@ -13,6 +13,19 @@ class MaxLengthDict(OrderedDict):
         self.__max_length__ = max_length
         OrderedDict.__init__(self, *args, **kwargs)
 
+    @property
+    def max_length(self):
+        return self.__max_length__
+
+    @max_length.setter
+    def max_length(self, value):
+        """Change the maximum size, dropping the oldest entries if necessary."""
+        assert isinstance(value, int)
+        assert value >= 0
+        self.__max_length__ = value
+        while len(self) > self.__max_length__:
+            self.popitem(last=False)
+
     def __setitem__(self, key, val):
         if key in self:
             del self[key]
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Vectorized resolution of the dispersion relation of water waves
+
+    ω²/g = k tanh(k h)
+
+for arrays of frequencies and depths.
+"""
+
+import logging
+
+import numpy as np
+
+from capytaine.tools import MaxLengthDict
+
+
+LOG = logging.getLogger(__name__)
+
+
+def invert_xtanhx(y, rtol=1e-12, maxiter=50):
+    """Solve x tanh(x) = y for an array of positive y with Newton's method.
+
+    The initial guess x0 = y/sqrt(tanh(y)) is within a few percents of the
+    solution, so that only a few iterations are necessary.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x = np.where(y > 0, y/np.sqrt(np.tanh(y)), 0.0)
+
+    for _ in range(maxiter):
+        tanh_x = np.tanh(x)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            step = (x*tanh_x - y)/(tanh_x + x*(1 - tanh_x**2))
+        step = np.where(y > 0, step, 0.0)
+        x = x - step
+        if np.all(np.abs(step) <= rtol*x):
+            break
+    else:
+        LOG.warning(f"Resolution of x tanh(x) = y did not converge after {maxiter} iterations.")
+
+    return x
+
+
+def invert_xtanx(y, n, rtol=1e-12, maxiter=50):
+    """Solve -x tan(x) = y for an array of positive y, with x in the interval
+    ((n-1/2)π, nπ) for the integer n ≥ 1.
+
+    The solution is x = nπ - u where u in (0, π/2) is the root of the
+    increasing function f(u) = (nπ - u) tan(u) - y. It is computed by Newton's
+    method, safeguarded by bisection.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = np.asarray(n, dtype=np.float64)
+    y, n = np.broadcast_arrays(y, n)
+
+    lower = np.zeros(y.shape)
+    upper = np.full(y.shape, np.pi/2)
+    u = np.minimum(y/(n*np.pi), np.pi/4)  # Solution of the linearized equation
+
+    for _ in range(maxiter):
+        f = (n*np.pi - u)*np.tan(u) - y
+        lower = np.where(f < 0, u, lower)
+        upper = np.where(f > 0, u, upper)
+        df = -np.tan(u) + (n*np.pi - u)/np.cos(u)**2
+        new_u = u - f/df
+        outside = (new_u <= lower) | (new_u >= upper)
+        new_u = np.where(outside, (lower + upper)/2, new_u)
+        converged = np.all(np.abs(new_u - u) <= rtol*n*np.pi)
+        u = new_u
+        if converged:
+            break
+    else:
+        LOG.warning(f"Resolution of -x tan(x) = y did not converge after {maxiter} iterations.")
+
+    return n*np.pi - u
+
+
+def solve_dispersion_relation(omega, depth=np.infty, g=9.81, nb_evanescent_modes=0):
+    """Compute the wavenumbers for arrays of angular frequencies and depths.
+
+    Parameters
+    ----------
+    omega: float or array
+        angular frequencies
+    depth: float or array
+        water depths (broadcasted against omega), possibly np.infty
+    g: float
+        acceleration of gravity
+    nb_evanescent_modes: int
+        number of roots of ω²/g = -k tan(k h) to compute in finite depth
+
+    Returns
+    -------
+    array with the broadcasted shape of omega and depth.
+    If nb_evanescent_modes > 0, an array with an additional last dimension of
+    size 1 + nb_evanescent_modes, containing first the propagating wavenumber
+    then the evanescent ones (which are nan in infinite depth).
+    """
+    omega, depth = np.broadcast_arrays(np.asarray(omega, dtype=np.float64),
+                                       np.asarray(depth, dtype=np.float64))
+
+    infinite_depth_wavenumber = omega**2/g
+    with np.errstate(invalid='ignore'):
+        y = np.where(np.isfinite(depth), omega**2*depth/g, np.infty)
+    deep_water = ~(y <= 20)  # Includes the infinite frequencies or depths.
+
+    finite_depth = np.where(deep_water, 1.0, depth)
+    wavenumber = np.where(deep_water,
+                          infinite_depth_wavenumber,
+                          invert_xtanhx(np.where(deep_water, 0.0, y))/finite_depth)
+
+    _store_in_cache(omega, depth, g, wavenumber)
+
+    if nb_evanescent_modes == 0:
+        return wavenumber
+
+    n = np.arange(1, nb_evanescent_modes+1)
+    finite = np.isfinite(y)[..., np.newaxis]
+    safe_y = np.where(finite, y[..., np.newaxis], 0.0)
+    evanescent = np.where(finite,
+                          invert_xtanx(safe_y, n)/np.where(finite, depth[..., np.newaxis], 1.0),
+                          np.nan)
+    return np.concatenate([wavenumber[..., np.newaxis], evanescent], axis=-1)
+
+
+#################################################
+#  Memoized front end for individual problems  #
+#################################################
+
+_wavenumbers_cache = MaxLengthDict({}, max_length=10000)
+
+
+def _store_in_cache(omega, depth, g, wavenumber):
+    if wavenumber.size > _wavenumbers_cache.__max_length__:
+        return
+    for o, h, k in zip(omega.flat, depth.flat, wavenumber.flat):
+        _wavenumbers_cache[(float(o), float(h), g)] = float(k)
+
+
+def compute_wavenumber(omega, depth=np.infty, g=9.81):
+    """Wavenumber for a single frequency and depth.
+
+    The results are stored, such that the construction of many problems with
+    the same parameters only solves the dispersion relation once. The cache
+    can be filled in advance by calling solve_dispersion_relation on arrays.
+    """
+    key = (float(omega), float(depth), g)
+    if key not in _wavenumbers_cache:
+        solve_dispersion_relation(omega, depth, g)
+    return _wavenumbers_cache[key]
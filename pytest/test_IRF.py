@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Tests for the computation of the impulse response functions.
+"""
+
+import numpy as np
+
+from capytaine.IRF import compute_radiation_IRF, compute_infinite_frequency_added_mass
+from capytaine.problems import RadiationProblem
+from capytaine.import_export import import_cal_file, compute_cal_file_IRF
+
+
+def test_radiation_IRF():
+    omega_range = np.linspace(0.0, 10.0, 1000)
+    time_range = np.linspace(0.0, 5.0, 20)
+
+    # Two dofs with analytical cosine transforms.
+    added_dampings = np.zeros((len(omega_range), 2, 2))
+    added_dampings[:, 0, 0] = np.exp(-omega_range**2)
+    added_dampings[:, 1, 1] = 2*np.exp(-omega_range**2)
+
+    K = compute_radiation_IRF(omega_range, added_dampings, time_range)
+    assert K.shape == (20, 2, 2)
+    assert np.allclose(K[:, 0, 0], np.exp(-time_range**2/4)/np.sqrt(np.pi), atol=1e-4)
+    assert np.allclose(K[:, 1, 1], 2*K[:, 0, 0])
+    assert np.allclose(K[:, 0, 1], 0.0)
+
+
+def test_infinite_frequency_added_mass():
+    # A constant added mass with no damping.
+    omega_range = np.linspace(0.1, 5.0, 50)
+    time_range = np.linspace(0.0, 20.0, 200)
+    added_masses = np.full((50, 1, 1), 3.0)
+    added_dampings = np.zeros((50, 1, 1))
+
+    A_inf = compute_infinite_frequency_added_mass(omega_range, added_masses, added_dampings, time_range)
+    assert np.allclose(A_inf, 3.0)
+
+
+def test_import_IRF_time_range():
+    problems, post_processing = import_cal_file("examples/data/Nemoh.cal", return_post_processing=True)
+    assert np.allclose(post_processing["IRF_time_range"], np.linspace(0.0, 10.0, 101))
+
+
+def test_cal_file_IRF():
+    problems, post_processing = import_cal_file("examples/data/Nemoh.cal", return_post_processing=True)
+    radiation_problems = [problem for problem in problems if isinstance(problem, RadiationProblem)]
+    nb_dofs = len(radiation_problems[0].body.dofs)
+
+    # Dummy results, with a damping depending only on the frequency.
+    results = [(np.zeros((nb_dofs, nb_dofs)), np.full((nb_dofs, nb_dofs), np.exp(-problem.omega**2)))
+               if isinstance(problem, RadiationProblem) else None
+               for problem in problems]
+
+    K = compute_cal_file_IRF(problems, results, post_processing)
+    omega_range = sorted(problem.omega for problem in radiation_problems)
+    time_range = post_processing["IRF_time_range"]
+    assert K.shape == (len(time_range), nb_dofs, nb_dofs)
+    ref = compute_radiation_IRF(omega_range, np.exp(-np.array(omega_range)**2), time_range)
+    assert np.allclose(K[:, 0, 0], ref)
+
+    assert compute_cal_file_IRF(problems, results, {"IRF_time_range": np.array([])}) is None
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Tests for the computation of the Kochin function.
+"""
+
+import numpy as np
+
+from capytaine.reference_bodies import generate_sphere
+from capytaine.problems import RadiationProblem, DiffractionProblem
+from capytaine.import_export import import_cal_file
+from capytaine.Nemoh import Nemoh
+from capytaine.Kochin import compute_Kochin, damping_from_Kochin
+
+
+def test_Kochin_sphere():
+    sphere = generate_sphere(radius=1.0, ntheta=10, nphi=20, clip_free_surface=True)
+    sphere.dofs["Surge"] = sphere.faces_normals @ (1, 0, 0)
+    sphere.dofs["Heave"] = sphere.faces_normals @ (0, 0, 1)
+
+    solver = Nemoh()
+    problem = RadiationProblem(body=sphere, omega=1.0, sea_bottom=-np.infty)
+    mass, damping = solver.solve(problem, keep_details=True)
+
+    theta = np.linspace(0.0, 2*np.pi, 36, endpoint=False)
+    kochin = compute_Kochin(problem, theta)
+    assert kochin.shape == (2, 36)
+    assert np.allclose(compute_Kochin(problem, theta, dof="Heave"), kochin[1, :])
+
+    # The heave Kochin function of an axisymmetric body does not depend on the direction.
+    assert np.allclose(np.abs(kochin[1, :]), np.abs(kochin[1, 0]), rtol=1e-2)
+
+    # Energy conservation
+    assert np.allclose(damping_from_Kochin(problem), damping, rtol=1e-1, atol=1e-2*np.max(damping))
+
+    problem = DiffractionProblem(body=sphere, omega=1.0, sea_bottom=-np.infty)
+    solver.solve(problem, keep_details=True)
+    assert compute_Kochin(problem, theta).shape == (36,)
+
+
+def test_import_Kochin_directions():
+    problems, post_processing = import_cal_file("examples/data/Nemoh.cal", return_post_processing=True)
+    assert len(problems) == 4
+    assert len(post_processing["Kochin_directions"]) == 0
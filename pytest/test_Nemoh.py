@@ -4,6 +4,10 @@
 Compare results of Capytaine with results from Nemoh 2.0.
 """
 
+import asyncio
+import threading
+
+import pytest
 import numpy as np
 
 from capytaine.reference_bodies import *
@@ -47,6 +51,39 @@ def test_floating_sphere_finite_freq():
     assert np.isclose(force, 1834.9 * np.exp(-2.933j) * -1j, rtol=1e-3)
 
 
+def test_floating_sphere_infinite_freq():
+    sphere = generate_sphere(radius=1.0, ntheta=20, nphi=20, clip_free_surface=True)
+    sphere.dofs["Surge"] = sphere.faces_normals @ (1, 0, 0)
+    sphere.dofs["Heave"] = sphere.faces_normals @ (0, 0, 1)
+
+    solver = Nemoh()
+    problem = RadiationProblem(body=sphere, omega=np.infty, sea_bottom=-np.infty)
+    mass, damping = solver.solve(problem)
+    assert np.allclose(damping, 0.0)
+
+    # In heave, the added mass is half of the displaced mass (Hulme, 1982).
+    displaced_mass = problem.rho*2/3*np.pi
+    assert np.isclose(mass[1, 1], 0.5*displaced_mass, rtol=3e-2)
+
+    # High frequency limit of the finite frequency added mass.
+    high_freq_mass, _ = solver.solve(RadiationProblem(body=sphere, omega=20.0, sea_bottom=-np.infty))
+    assert np.allclose(np.diag(mass), np.diag(high_freq_mass), rtol=1e-1)
+
+
+def test_dense_system_shifted_in_place():
+    sphere = generate_sphere(radius=1.0, ntheta=6, nphi=12, clip_free_surface=True)
+    sphere.dofs["Heave"] = sphere.faces_normals @ (0, 0, 1)
+    problem = RadiationProblem(body=sphere, omega=1.0, sea_bottom=-np.infty)
+
+    kept = Nemoh().solve(problem, keep_details=True)
+    # The matrix kept in the problem is not shifted.
+    _, V = sphere.build_matrices(sphere, wavenumber=problem.wavenumber)
+    assert np.allclose(problem.V, V)
+
+    shifted_in_place = Nemoh().solve(problem)
+    assert np.allclose(kept, shifted_in_place)
+
+
 def test_alien_sphere():
     sphere = generate_sphere(radius=1.0, ntheta=6, nphi=12, clip_free_surface=True)
     sphere.dofs["Heave"] = sphere.faces_normals @ (0, 0, 1)
@@ -101,3 +138,144 @@ def test_multibody():
 
     assert np.allclose(mass,    Nemoh_2[:, ::2],  atol=1e-3*both.volume*problem.rho)
     assert np.allclose(damping, Nemoh_2[:, 1::2], atol=1e-3*both.volume*problem.rho)
+
+
+def test_solve_pipeline():
+    sphere = generate_sphere(radius=1.0, ntheta=6, nphi=12, clip_free_surface=True)
+    sphere.dofs["Heave"] = sphere.faces_normals @ (0, 0, 1)
+
+    solver = Nemoh()
+    problems = [RadiationProblem(body=sphere, omega=omega, sea_bottom=-np.infty) for omega in np.linspace(0.5, 2.0, 4)]
+    problems += [DiffractionProblem(body=sphere, omega=1.0, sea_bottom=-10.0)]
+
+    results = [solver.solve(problem) for problem in problems]
+    pipelined_results = list(solver.solve_pipeline(problems, queue_depth=2))
+
+    async def collect():
+        return [result async for result in solver.solve_pipeline_async(problems)]
+
+    async_results = asyncio.run(collect())
+
+    for res, pip_res, async_res in zip(results[:-1], pipelined_results[:-1], async_results[:-1]):
+        assert np.allclose(res, pip_res)
+        assert np.allclose(res, async_res)
+    assert np.allclose(results[-1], pipelined_results[-1])
+    assert np.allclose(results[-1], async_results[-1])
+
+
+def test_solve_pipeline_async_cancellation():
+    sphere = generate_sphere(radius=1.0, ntheta=6, nphi=12, clip_free_surface=True)
+    sphere.dofs["Heave"] = sphere.faces_normals @ (0, 0, 1)
+
+    release = threading.Event()
+
+    def slow_problems():
+        yield RadiationProblem(body=sphere, omega=1.0, sea_bottom=-np.infty)
+        release.wait(timeout=10.0)
+        yield RadiationProblem(body=sphere, omega=2.0, sea_bottom=-np.infty)
+
+    results = []
+
+    async def cancel_while_waiting():
+        first_result = asyncio.Event()
+
+        async def collect():
+            async for result in Nemoh().solve_pipeline_async(slow_problems()):
+                results.append(result)
+                first_result.set()
+
+        task = asyncio.ensure_future(collect())
+        await first_result.wait()
+        # The pipeline is now waiting for the second problem in the executor.
+        task.cancel()
+        asyncio.get_running_loop().call_later(0.1, release.set)
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_while_waiting())
+    assert len(results) == 1
+
+
+def test_incremental_solver(monkeypatch):
+    from capytaine.incremental import IncrementalSolver
+
+    # Count the full factorizations and the Schur complement updates.
+    calls = {"_factorize": 0, "_append_bodies": 0}
+    for name in calls:
+        def spy(self, *args, _name=name, _method=getattr(IncrementalSolver, name)):
+            calls[_name] += 1
+            return _method(self, *args)
+        monkeypatch.setattr(IncrementalSolver, name, spy)
+
+    solver = IncrementalSolver()
+    farm = generate_sphere(radius=1.0, ntheta=6, nphi=12, clip_free_surface=True, name="sphere_0")
+    farm.dofs["Heave"] = farm.faces_normals @ (0, 0, 1)
+
+    for i in range(1, 5):
+        for problem in [RadiationProblem(body=farm, omega=1.0, sea_bottom=-np.infty),
+                        DiffractionProblem(body=farm, omega=1.0, sea_bottom=-np.infty)]:
+            direct = Nemoh().solve(problem)
+            incremental = solver.solve(problem)
+            for a, b in zip(np.atleast_1d(incremental), np.atleast_1d(direct)):
+                assert np.allclose(a, b, rtol=1e-3, atol=1e-3*np.max(np.abs(b)))
+        assert solver._inverse.dtype == np.complex128
+
+        new_sphere = generate_sphere(radius=1.0, ntheta=6, nphi=12, clip_free_surface=True, name=f"sphere_{i}")
+        new_sphere.translate_x(4.0*i)
+        new_sphere.dofs["Heave"] = new_sphere.faces_normals @ (0, 0, 1)
+        farm = farm + new_sphere
+
+    # The matrices have been inverted once, and then only updated for each new sphere.
+    assert calls == {"_factorize": 1, "_append_bodies": 3}
+
+    # The updated inverse is accurate at double precision, with respect to the
+    # coupling blocks of the spheres from which it has been built.
+    spheres = problem.body.subbodies
+    V = np.block([[body.build_matrices(other_body, wavenumber=problem.wavenumber)[1] for other_body in spheres]
+                  for body in spheres])
+    A = V.astype(np.complex128) + np.identity(V.shape[0])/2
+    assert np.allclose(solver._inverse @ A, np.identity(A.shape[0]), atol=1e-10)
+
+
+def test_low_rank_farm():
+    from capytaine.low_rank_matrices import LowRankMatrix
+    from capytaine.bodies_collection import CollectionOfFloatingBodies
+
+    farm = []
+    for i in range(3):
+        sphere = generate_sphere(radius=1.0, ntheta=6, nphi=12, clip_free_surface=True, name=f"sphere_{i}")
+        sphere.translate_x(20.0*i)
+        sphere.dofs[f"Heave_{i}"] = sphere.faces_normals @ (0, 0, 1)
+        farm.append(sphere)
+    farm = CollectionOfFloatingBodies(farm)
+
+    problem = RadiationProblem(body=farm, omega=1.0, sea_bottom=-np.infty)
+    solver = Nemoh(low_rank_distance=10.0, low_rank_tol=1e-5)
+    mass, damping = solver.solve(problem, keep_details=True)
+    assert isinstance(problem.S.blocks[0][1], LowRankMatrix)
+    assert isinstance(problem.S.blocks[0][0], np.ndarray)
+
+    ref_mass, ref_damping = Nemoh().solve(problem)
+    assert np.allclose(mass, ref_mass, rtol=1e-3, atol=1e-3*np.max(np.abs(ref_mass)))
+    assert np.allclose(damping, ref_damping, rtol=1e-3, atol=1e-3*np.max(np.abs(ref_damping)))
+
+
+def test_multiple_scattering_solver():
+    from capytaine.bodies_collection import CollectionOfFloatingBodies
+
+    farm = []
+    for i in range(3):
+        sphere = generate_sphere(radius=1.0, ntheta=6, nphi=12, clip_free_surface=True, name=f"sphere_{i}")
+        sphere.translate_y(6.0*i)
+        sphere.dofs[f"Heave_{i}"] = sphere.faces_normals @ (0, 0, 1)
+        farm.append(sphere)
+    farm = CollectionOfFloatingBodies(farm)
+
+    for problem in [RadiationProblem(body=farm, omega=1.0, sea_bottom=-np.infty),
+                    DiffractionProblem(body=farm, omega=1.0, sea_bottom=-np.infty)]:
+        direct = Nemoh().solve(problem)
+        for method in ["jacobi", "gauss_seidel"]:
+            iterative = Nemoh(linear_solver=method, block_solver_tol=1e-6).solve(problem, keep_details=True)
+            assert problem.residuals[-1] <= 1e-6
+            for a, b in zip(np.atleast_1d(iterative), np.atleast_1d(direct)):
+                assert np.allclose(a, b, rtol=1e-3, atol=1e-3*np.max(np.abs(b)))
@@ -5,7 +5,7 @@ import pytest
 
 import numpy as np
 
-from capytaine.bodies import FloatingBody
+from capytaine.bodies import FloatingBody, DofsArray, BlockDofsArray
 from capytaine.bodies_collection import CollectionOfFloatingBodies
 from capytaine.symmetries import ReflectionSymmetry, xOz_Plane
 from capytaine.reference_bodies import *
@@ -53,6 +53,147 @@ def test_collection():
     assert (generate_sphere() + generate_sphere()).as_FloatingBody().nb_vertices == generate_sphere().nb_vertices
 
 
+def test_dofs_array():
+    dofs = DofsArray(3)
+    dofs['Surge'] = np.array([1.0, 0.0, 0.0])
+    dofs['Heave'] = np.array([0.0, 0.0, 1.0])
+    dofs['Surge'] = np.array([2.0, 0.0, 0.0])
+    assert len(dofs) == 2
+    assert list(dofs) == ['Surge', 'Heave']
+    assert np.all(dofs.matrix == np.array([[2, 0, 0], [0, 0, 1]]))
+    assert np.all(dofs['Heave'] == np.array([0, 0, 1]))
+    assert np.all(dofs.extract_faces([1, 2]).matrix == np.array([[0, 0], [0, 1]]))
+
+    del dofs['Surge']
+    assert list(dofs) == ['Heave']
+    assert dofs.matrix.shape == (1, 3)
+
+    sphere = generate_sphere(name='sphere')
+    sphere.add_translation_dof(direction=(0, 0, 1), name="Heave")
+    half_sphere = sphere.extract_faces(np.where(sphere.faces_centers[:, 1] > 0)[0])
+    half_sphere.name = 'half_sphere'
+    assert half_sphere.dofs.matrix.shape == (1, half_sphere.nb_faces)
+
+    coll = sphere + half_sphere
+    assert isinstance(coll.dofs, BlockDofsArray)
+    assert coll.dofs.matrix.shape == (2, coll.nb_faces)
+    assert [offset for offset, _ in coll.dofs.blocks] == [0, sphere.nb_faces]
+
+    field = np.random.rand(coll.nb_faces, 3)
+    assert np.allclose(coll.dofs.integrate(field, coll.faces_areas),
+                       (coll.dofs.matrix * coll.faces_areas) @ field)
+
+    coll.dofs['Global_heave'] = coll.faces_normals @ (0, 0, 1)
+    assert np.all(coll.dofs['Global_heave'] == coll.faces_normals @ (0, 0, 1))
+    assert coll.dofs.matrix.shape == (3, coll.nb_faces)
+
+    # Modifying a dof outside of its block keeps the order of the dofs.
+    names = coll.dofs.names
+    coll.dofs['sphere_Heave'] = coll.faces_normals @ (0, 0, 1)
+    assert coll.dofs.names == names
+    assert np.all(coll.dofs['sphere_Heave'] == coll.faces_normals @ (0, 0, 1))
+
+    # The dofs of a single block can not be modified through a copy.
+    with pytest.raises(ValueError):
+        coll.dofs['half_sphere_Heave'][:] = 1.0
+    coll.dofs['Global_heave'][:] = 1.0
+    assert np.all(coll.dofs['Global_heave'] == 1.0)
+
+
+def test_nested_collection_dofs():
+    spheres = []
+    for i in range(3):
+        sphere = generate_sphere(name=f'sphere_{i}')
+        sphere.add_translation_dof(direction=(0, 0, 1), name="Heave")
+        spheres.append(sphere)
+    pair = CollectionOfFloatingBodies(spheres[:2])
+    pair.name = "pair"
+    nested = CollectionOfFloatingBodies([pair, spheres[2]])
+
+    assert nested.dofs.names == ['pair_sphere_0_Heave', 'pair_sphere_1_Heave', 'sphere_2_Heave']
+    # The dofs are still stored by blocks of the size of the spheres.
+    assert [(offset, local_dofs.nb_faces) for offset, local_dofs in nested.dofs.blocks] == \
+        [(i*spheres[0].nb_faces, spheres[0].nb_faces) for i in range(3)]
+    assert np.all(nested.dofs.matrix == np.block([[s.dofs.matrix if i == j else np.zeros_like(s.dofs.matrix)
+                                                   for j, s in enumerate(spheres)] for i in range(3)]))
+
+
+def test_bounding_box():
+    sphere = generate_sphere(radius=1.0, z0=-2.0)
+    assert np.allclose(sphere.bounding_box, [np.min(sphere.vertices, axis=0), np.max(sphere.vertices, axis=0)])
+    assert np.allclose(sphere.bounding_box[:, 2], [-3.0, -1.0])
+
+    sphere.translate_z(1.0)
+    assert np.allclose(sphere.bounding_box[:, 2], [-2.0, 0.0])
+
+    other_sphere = sphere.copy()
+    other_sphere.translate_x(5.0)
+    both = sphere + other_sphere
+    assert np.allclose(both.bounding_box, both.as_FloatingBody().bounding_box)
+    assert np.allclose(both.bounding_box[:, 0], sphere.bounding_box[:, 0] + [0.0, 5.0])
+
+    both.translate_z(-1.0)
+    assert np.allclose(both.bounding_box[:, 2], [-3.0, -1.0])
+
+
+def test_collection_geometry_cache():
+    sphere = generate_sphere(z0=-2.0)
+    other_sphere = sphere.copy()
+    other_sphere.translate_x(5.0)
+    both = CollectionOfFloatingBodies([sphere, other_sphere])
+    nested = CollectionOfFloatingBodies([both, generate_sphere(z0=-5.0)])
+
+    assert both.faces_centers is both.faces_centers
+    assert nested.faces_centers is nested.faces_centers
+    assert np.allclose(nested.faces_centers[:both.nb_faces], both.faces_centers)
+
+    other_sphere.translate_z(1.0)
+    assert np.allclose(both.faces_centers[sphere.nb_faces:], other_sphere.faces_centers)
+    assert np.allclose(nested.faces_centers[:both.nb_faces], both.faces_centers)
+    assert np.allclose(nested.vertices[nested.faces[:both.nb_faces]], both.vertices[both.faces])
+
+
+def test_collection_matrices():
+    bodies = [generate_sphere(z0=-2.0, name=f"sphere_{i}") for i in range(3)]
+    for i, body in enumerate(bodies):
+        body.translate_x(3.0*i)
+    coll = CollectionOfFloatingBodies(bodies)
+
+    S, V = coll.build_matrices(coll, free_surface=np.infty, nb_threads=2)
+    S_ref, V_ref = coll.build_matrices(coll.as_FloatingBody(), free_surface=np.infty)
+    assert np.allclose(S, S_ref, atol=1e-6)
+    assert np.allclose(V, V_ref, atol=1e-6)
+
+    # Only the blocks of the moved body are computed again.
+    bodies[2].translate_y(1.0)
+    S_moved, _ = coll.build_matrices(coll, free_surface=np.infty)
+    unchanged, moved = coll.indices_of_body(0), coll.indices_of_body(2)
+    assert np.all(S_moved[unchanged, unchanged] == S[unchanged, unchanged])
+    assert not np.allclose(S_moved[unchanged, moved], S[unchanged, moved])
+    assert not np.allclose(S_moved[moved, unchanged], S[moved, unchanged])
+
+
+def test_translated_bodies_matrices():
+    body = generate_sphere(z0=-2.0)
+    farm = []
+    for i in range(4):
+        device = body.copy(name=f"device_{i}")
+        device.translate_x(3.0*i)
+        farm.append(device)
+    farm[3].translate_y(2.0)
+    farm.append(generate_sphere(radius=0.5, z0=-2.0, name="other"))
+    coll = CollectionOfFloatingBodies(farm)
+
+    classes = coll._translation_classes
+    assert [class_index for class_index, _ in classes] == [0, 0, 0, 0, 1]
+    assert np.allclose(classes[3][1], (9.0, 2.0))
+
+    S, V = coll.build_matrices(coll, free_surface=0.0, wavenumber=np.infty)
+    S_ref, V_ref = coll.build_matrices(coll.as_FloatingBody(), free_surface=0.0, wavenumber=np.infty)
+    assert np.allclose(S, S_ref, atol=1e-6)
+    assert np.allclose(V, V_ref, atol=1e-6)
+
+
 def test_symmetric_bodies():
     half_sphere = generate_half_sphere(ntheta=5)
     half_sphere.name = 'half_sphere'
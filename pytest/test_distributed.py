@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Tests for the distribution of the problems on several workers.
+The workers are threads sharing a local broker and a dummy solver.
+"""
+
+import threading
+from collections import namedtuple
+
+import pytest
+
+from capytaine.distributed import LocalBroker, Coordinator, Worker
+
+
+Body = namedtuple("Body", ["name"])
+
+
+class DummyProblem:
+    def __init__(self, body, omega):
+        self.body = body
+        self.omega = omega
+
+
+class DummySolver:
+    def __init__(self):
+        self.bodies = set()
+
+    def solve(self, problem, keep_details=False):
+        self.bodies.add(id(problem.body))
+        return problem.body.name, 2*problem.omega
+
+
+class ForgetfulSolver(DummySolver):
+    """Never returns the first task, as if the worker had crashed."""
+
+    def __init__(self):
+        super().__init__()
+        self.first = True
+
+    def solve(self, problem, keep_details=False):
+        if self.first:
+            self.first = False
+            raise SystemExit
+        return super().solve(problem, keep_details)
+
+
+def _start_workers(broker, solvers):
+    threads = [threading.Thread(target=Worker(broker, solver=solver).run) for solver in solvers]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def test_distributed_solve_all():
+    broker = LocalBroker()
+    solvers = [DummySolver(), DummySolver()]
+    threads = _start_workers(broker, solvers)
+
+    coordinator = Coordinator(broker)
+    bodies = [Body("a"), Body("b")]
+    problems = [DummyProblem(body, omega) for body in bodies for omega in range(10)]
+    results = coordinator.solve_all(problems)
+    assert results == [(problem.body.name, 2*problem.omega) for problem in problems]
+
+    # Each body has been cached by the workers and removed from the broker after the batch.
+    assert len(broker.bodies) == 0
+    assert all(len(solver.bodies) <= 2 for solver in solvers)
+
+    coordinator.stop_workers(len(threads))
+    for thread in threads:
+        thread.join()
+
+
+class MutableBody:
+    def __init__(self, name):
+        self.name = name
+        self._geometry_version = 0
+
+
+def test_distributed_modified_body():
+    broker = LocalBroker()
+    worker = Worker(broker, solver=DummySolver())
+    coordinator = Coordinator(broker)
+
+    body = MutableBody("a")
+    keys = []
+    for _ in range(2):
+        problems = [DummyProblem(body, omega) for omega in range(3)]
+        thread = threading.Thread(target=worker.run, kwargs={"max_tasks": len(problems)})
+        thread.start()
+        assert coordinator.solve_all(problems) == [("a", 2*omega) for omega in range(3)]
+        thread.join()
+        assert len(broker.bodies) == 0
+        keys.append(list(worker._bodies_cache.keys())[-1])
+        body._geometry_version += 1
+
+    # The modified body has been sent again under a new key.
+    assert len(set(keys)) == 2
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_distributed_lost_task():
+    broker = LocalBroker()
+    forgetful_worker = threading.Thread(target=Worker(broker, solver=ForgetfulSolver()).run)
+    forgetful_worker.start()
+    # The second worker only starts after the first one has taken a task and crashed.
+    worker = threading.Timer(0.1, Worker(broker, solver=DummySolver()).run)
+    worker.start()
+
+    coordinator = Coordinator(broker, timeout=0.2)
+    problems = [DummyProblem(Body("a"), omega) for omega in range(4)]
+    results = coordinator.solve_all(problems)
+    assert results == [("a", 2*omega) for omega in range(4)]
+
+    forgetful_worker.join()
+    coordinator.stop_workers(1)
+    worker.join()
+
+
+def test_distributed_no_worker():
+    broker = LocalBroker()
+    coordinator = Coordinator(broker, timeout=0.1, max_retries=2)
+    problems = [DummyProblem(Body("a"), omega) for omega in range(2)]
+    with pytest.raises(Exception, match="retries"):
+        coordinator.solve_all(problems)
+    assert len(broker.bodies) == 0
+
+
+def test_distributed_task_lost_before_start():
+    broker = LocalBroker()
+    coordinator = Coordinator(broker, timeout=0.2)
+
+    def stop_before_starting():
+        # A worker taking a task and stopping without sending any message.
+        broker.tasks.get()
+        Worker(broker, solver=DummySolver()).run(max_tasks=2)
+
+    worker = threading.Thread(target=stop_before_starting)
+    worker.start()
+    problems = [DummyProblem(Body("a"), omega) for omega in range(2)]
+    results = coordinator.solve_all(problems)
+    assert results == [("a", 2*omega) for omega in range(2)]
+    worker.join()
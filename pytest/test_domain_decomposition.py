@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Compare the solver with distributed matrices to the direct solver.
+"""
+
+import pytest
+
+import numpy as np
+
+from capytaine.reference_bodies import generate_sphere
+from capytaine.problems import RadiationProblem, DiffractionProblem
+from capytaine.Nemoh import Nemoh
+from capytaine.domain_decomposition import DomainDecompositionSolver
+
+
+def test_domain_decomposition():
+    sphere = generate_sphere(radius=1.0, ntheta=10, nphi=20, clip_free_surface=True)
+    sphere.dofs["Surge"] = sphere.faces_normals @ (1, 0, 0)
+    sphere.dofs["Heave"] = sphere.faces_normals @ (0, 0, 1)
+
+    problems = [RadiationProblem(body=sphere, omega=1.0, sea_bottom=-np.infty),
+                RadiationProblem(body=sphere, omega=1.0, sea_bottom=-10.0),
+                DiffractionProblem(body=sphere, omega=1.0, sea_bottom=-np.infty)]
+
+    with DomainDecompositionSolver(nb_processes=2, tol=1e-6) as solver:
+        for problem in problems:
+            direct_result = Nemoh().solve(problem, keep_details=True)
+            direct_sources = problem.sources.copy()
+
+            distributed_result = solver.solve(problem, keep_details=True)
+
+            for distributed, direct in zip(np.atleast_1d(distributed_result), np.atleast_1d(direct_result)):
+                assert np.allclose(distributed, direct, rtol=1e-3, atol=1e-3*np.max(np.abs(direct)))
+            if isinstance(problem, RadiationProblem):
+                for dof in sphere.dofs:
+                    assert np.allclose(problem.sources[dof], direct_sources[dof], rtol=1e-3, atol=1e-5)
+            else:
+                assert np.allclose(problem.sources, direct_sources, rtol=1e-3, atol=1e-5)
+
+
+def test_domain_decomposition_moved_body():
+    sphere = generate_sphere(radius=1.0, ntheta=6, nphi=12, z0=-2.0)
+    sphere.dofs["Heave"] = sphere.faces_normals @ (0, 0, 1)
+
+    with DomainDecompositionSolver(nb_processes=2, tol=1e-6) as solver:
+        for _ in range(2):
+            problem = RadiationProblem(body=sphere, omega=1.0, sea_bottom=-np.infty)
+            distributed_result = solver.solve(problem)
+            direct_result = Nemoh().solve(problem)
+            for distributed, direct in zip(distributed_result, direct_result):
+                assert np.allclose(distributed, direct, rtol=1e-3, atol=1e-3*np.max(np.abs(direct)))
+            # The matrices should be assembled again for the new position.
+            sphere.translate_z(-1.0)
+
+        for connection in solver._connections:
+            connection.send(("unknown_command",))
+        with pytest.raises(Exception, match="Unknown command"):
+            solver._gather()
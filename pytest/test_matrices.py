@@ -131,3 +131,257 @@ def test_solve_block_circulant():
     x_dumb = np.linalg.solve(A.full_matrix(), b)
 
     assert np.allclose(x_toe, x_dumb, rtol=1e-6)
+
+
+def test_solve_several_right_hand_sides():
+    A1 = np.array([[1, 2, 3], [4, 5, 6], [7, 8, 9]])
+    A2 = np.array([[5, 4, 2], [8, 0, 1], [6, 7, 3]])
+    A3 = np.array([[0, 0, 3], [9, 3, 5], [7, 5, 6]])
+
+    for A in [BlockToeplitzMatrix([A1, A2]), BlockCirculantMatrix([A1, A2, A3])]:
+        b = np.random.rand(A.shape[0], 4)
+        x = solve(A, b)
+        assert x.shape == b.shape
+        assert np.allclose(x, np.linalg.solve(A.full_matrix(), b), rtol=1e-6)
+        assert np.allclose(x[:, 1], solve(A, b[:, 1]), rtol=1e-6)
+
+
+def test_gmres():
+    from capytaine.iterative_solvers import gmres
+
+    A = np.identity(50)/2 + (np.random.rand(50, 50) + 1j*np.random.rand(50, 50))/100
+    b = np.random.rand(50, 3)
+    b[:, 2] = 0.0
+
+    x = gmres(lambda v: A @ v, b, tol=1e-10, restart=10)
+    assert x.shape == b.shape
+    assert np.allclose(x, np.linalg.solve(A, b), rtol=1e-8)
+    assert np.allclose(gmres(lambda v: A @ v, b[:, 0], tol=1e-10), x[:, 0], rtol=1e-8)
+
+
+def test_low_rank_matrix():
+    from capytaine.low_rank_matrices import LowRankMatrix, adaptive_cross_approximation
+
+    # Interaction between two distant clusters of points.
+    rng = np.random.RandomState(0)
+    x = rng.rand(40, 3)
+    y = rng.rand(30, 3) + (10.0, 0.0, 0.0)
+    A = 1/np.linalg.norm(x[:, np.newaxis, :] - y[np.newaxis, :, :], axis=-1)
+
+    B = adaptive_cross_approximation(lambda i: A[i, :], lambda j: A[:, j], A.shape, tol=1e-6, dtype=np.float64)
+    assert isinstance(B, LowRankMatrix)
+    assert B.shape == (40, 30)
+    assert B.rank <= 10
+    assert np.allclose(B.full_matrix(), A, rtol=1e-5)
+
+    b = rng.rand(30)
+    assert np.allclose(B @ b, A @ b)
+    assert np.allclose((B + B).full_matrix(), 2*A)
+    assert np.allclose((B + np.ones(A.shape)), A + 1)
+    assert np.allclose((B/2).full_matrix(), A/2)
+
+    # A random matrix is not of low rank.
+    C = rng.rand(20, 20)
+    assert adaptive_cross_approximation(lambda i: C[i, :], lambda j: C[:, j], C.shape, dtype=np.float64) is None
+
+
+def test_block_matrix():
+    from capytaine.low_rank_matrices import LowRankMatrix
+
+    rng = np.random.RandomState(0)
+    A11, A22 = rng.rand(3, 3) + 3*np.identity(3), rng.rand(2, 2) + 3*np.identity(2)
+    A12 = LowRankMatrix(rng.rand(3, 1), rng.rand(1, 2))
+    A = BlockMatrix([[A11, A12], [LowRankMatrix.zeros((2, 3)), A22]])
+    assert A.shape == (5, 5)
+    assert A.nb_blocks == (2, 2)
+
+    full_A = A.full_matrix()
+    assert np.allclose(full_A[:3, 3:], A12.full_matrix())
+    assert np.all(full_A[3:, :3] == 0.0)
+
+    b = rng.rand(5, 2)
+    assert np.allclose(A @ b, full_A @ b)
+
+    I = block_identity([3, 2])
+    assert np.all(I.full_matrix() == np.identity(5))
+    assert np.allclose((A + I/2).full_matrix(), full_A + np.identity(5)/2)
+
+    assert np.allclose(solve(A + I, b), np.linalg.solve(full_A + np.identity(5), b), rtol=1e-5)
+
+    # Numpy scalars keep the structure of the matrices.
+    for scalar in [np.float32(2.0), np.complex64(2.0j)]:
+        assert isinstance(A*scalar, BlockMatrix)
+        assert np.allclose((A*scalar).full_matrix(), full_A*scalar)
+        assert isinstance((A/scalar).blocks[0][1], LowRankMatrix)
+        assert np.allclose((A/scalar).full_matrix(), full_A/scalar)
+
+
+def test_block_iterative_solve():
+    from capytaine.iterative_solvers import block_iterative_solve
+
+    rng = np.random.RandomState(0)
+    diagonal_block = rng.rand(4, 4) + 4*np.identity(4)
+    blocks = [[diagonal_block if i == j else 0.1*rng.rand(4, 4) for j in range(3)] for i in range(3)]
+    A = BlockMatrix(blocks)
+    b = rng.rand(12, 2) + 1j*rng.rand(12, 2)
+    x_ref = np.linalg.solve(A.full_matrix(), b)
+
+    for method in ["jacobi", "gauss_seidel"]:
+        residuals = []
+        x = block_iterative_solve(A, b, method=method, tol=1e-10, residuals=residuals)
+        assert np.allclose(x, x_ref)
+        assert residuals[-1] <= 1e-10
+        assert np.all(np.diff(residuals) < 0)
+
+    with pytest.raises(ValueError):
+        block_iterative_solve(A, b, method="unknown")
+
+
+@pytest.mark.parametrize("nb_blocks", [3, 6])
+def test_solve_block_Toeplitz(nb_blocks):
+    rng = np.random.RandomState(0)
+    A = BlockToeplitzMatrix([4*np.identity(3) + rng.rand(3, 3) + 1j*rng.rand(3, 3)] +
+                            [rng.rand(3, 3) + 0j for _ in range(nb_blocks-1)])
+    for b in [rng.rand(3*nb_blocks), rng.rand(3*nb_blocks, 2)]:
+        x = solve(A, b)
+        assert x.shape == b.shape
+        assert np.allclose(x, np.linalg.solve(A.full_matrix(), b))
+
+
+def test_fft_matvec():
+    rng = np.random.RandomState(0)
+    matrices = [
+        BlockToeplitzMatrix([rng.rand(3, 2) for _ in range(4)]),  # Rectangular blocks
+        BlockToeplitzMatrix([rng.rand(3, 3) + 1j*rng.rand(3, 3) for _ in range(2)]),
+        BlockCirculantMatrix([rng.rand(3, 3) for _ in range(3)], size=5),
+        BlockCirculantMatrix([rng.rand(3, 3) for _ in range(4)], size=6),
+    ]
+    for A in matrices:
+        full_A = A.full_matrix()
+        for x in [rng.rand(A.shape[1]), rng.rand(A.shape[1], 2) + 1j*rng.rand(A.shape[1], 2)]:
+            assert np.allclose(A @ x, full_A @ x)
+        for y in [rng.rand(A.shape[0]), rng.rand(2, A.shape[0])]:
+            assert np.allclose(y @ A, y @ full_A)
+        assert not np.iscomplexobj(A @ rng.rand(A.shape[1])) or np.iscomplexobj(full_A)
+
+
+def test_nested_block_matrices():
+    rng = np.random.RandomState(0)
+    inner = [BlockToeplitzMatrix([4*np.identity(3) + rng.rand(3, 3), rng.rand(3, 3)]),
+             BlockToeplitzMatrix([rng.rand(3, 3), rng.rand(3, 3)])]
+    matrices = [
+        BlockToeplitzMatrix(inner),
+        BlockToeplitzMatrix([BlockToeplitzMatrix([8*np.identity(2) + rng.rand(2, 2), rng.rand(2, 2), rng.rand(2, 2)])] +
+                            [BlockToeplitzMatrix([rng.rand(2, 2) for _ in range(3)]) for _ in range(2)]),
+        BlockCirculantMatrix([BlockToeplitzMatrix([8*np.identity(2) + rng.rand(2, 2), rng.rand(2, 2)])] +
+                             [BlockToeplitzMatrix([rng.rand(2, 2) for _ in range(2)]) for _ in range(2)], size=4),
+    ]
+    for A in matrices:
+        assert A.is_nested
+        full_A = A.full_matrix()
+        for x in [rng.rand(A.shape[1]), rng.rand(A.shape[1], 2)]:
+            assert np.allclose(A @ x, full_A @ x)
+            assert np.allclose(solve(A, x), np.linalg.solve(full_A, x))
+        y = rng.rand(2, A.shape[0])
+        assert np.allclose(y @ A, y @ full_A)
+
+        I = identity_like(A)
+        assert isinstance(I, A.__class__) and I.is_nested
+        assert np.allclose(I.full_matrix(), np.identity(A.shape[0]))
+        assert np.allclose((A + I/2).full_matrix(), full_A + np.identity(A.shape[0])/2)
+
+    # Blocks with different structures are stored as usual arrays.
+    A = BlockToeplitzMatrix([inner[0], inner[0].full_matrix()])
+    assert not A.is_nested
+
+
+def test_unique_blocks_storage():
+    rng = np.random.RandomState(0)
+    A = BlockCirculantMatrix(rng.rand(4, 3, 3), size=7)
+    full_A = A.full_matrix()
+    assert A._unique_blocks.shape == (4, 3, 3)
+    assert np.all(A.blocks[1] == A.blocks[6])
+    assert np.allclose(A._get_circulant_fft(), np.fft.fft(np.array(A.blocks), axis=0))
+
+    x = rng.rand(A.shape[1])
+    B = A
+    B += 1.0
+    B *= 2.0
+    B -= A/2
+    assert B is A and isinstance(B, BlockCirculantMatrix)
+    assert np.allclose(A.full_matrix(), (full_A + 1.0))
+    assert np.allclose(A @ x, (full_A + 1.0) @ x)  # The cached Fourier transform is updated
+
+    # The complex result does not fit in the real array of blocks.
+    C = A
+    C *= 1j
+    assert C is not A and np.iscomplexobj(C._unique_blocks)
+    assert np.allclose(C.full_matrix(), 1j*A.full_matrix())
+
+
+def test_shift_diagonal():
+    rng = np.random.RandomState(0)
+    matrices = [
+        rng.rand(6, 6).astype(np.float32),
+        BlockToeplitzMatrix([rng.rand(2, 2) for _ in range(3)]),
+        BlockToeplitzMatrix([rng.rand(2, 2) + 1j*rng.rand(2, 2) for _ in range(2)]),
+        BlockCirculantMatrix([rng.rand(2, 2) for _ in range(3)], size=5),
+        BlockToeplitzMatrix([BlockToeplitzMatrix([rng.rand(2, 2) for _ in range(2)]) for _ in range(2)]),
+        BlockMatrix([[rng.rand(2, 2), rng.rand(2, 3)], [rng.rand(3, 2), rng.rand(3, 3)]]),
+    ]
+    for A in matrices:
+        full_A = A if isinstance(A, np.ndarray) else A.full_matrix()
+        ref = full_A + 0.5*np.identity(A.shape[0])
+        B = shift_diagonal(A, 0.5)
+        assert type(B) is type(A)
+        assert np.allclose(B if isinstance(B, np.ndarray) else B.full_matrix(), ref)
+        assert np.all((A if isinstance(A, np.ndarray) else A.full_matrix()) == full_A)  # A is not modified
+
+        b = rng.rand(A.shape[0])
+        assert np.allclose(solve(A, b, diagonal_shift=0.5), np.linalg.solve(ref, b), rtol=1e-4)
+
+        C = shift_diagonal(A, 0.5, inplace=True)
+        assert C is A
+        assert np.allclose(C if isinstance(C, np.ndarray) else C.full_matrix(), ref)
+
+    # The result does not fit in the real array of blocks.
+    A = BlockToeplitzMatrix([rng.rand(2, 2) for _ in range(3)])
+    B = shift_diagonal(A, 1j, inplace=True)
+    assert B is not A and np.iscomplexobj(B.full_matrix())
+
+
+def test_solve_only_needed_modes(caplog):
+    import logging
+    rng = np.random.RandomState(0)
+    A = BlockCirculantMatrix([4*np.identity(3) + rng.rand(3, 3)] + [rng.rand(3, 3) for _ in range(3)], size=6)
+    angles = 2*np.pi*np.arange(6)/6
+    pattern = rng.rand(3)
+    heave_like = np.concatenate([pattern for _ in angles])
+    surge_like = np.concatenate([np.cos(angle)*pattern for angle in angles])
+    for b, nb_solved_modes in [(heave_like, 1), (surge_like, 1), (np.stack([heave_like, surge_like], axis=1), 2)]:
+        with caplog.at_level(logging.DEBUG, logger="capytaine.Toeplitz_matrices"):
+            caplog.clear()
+            x = solve(A, b)
+        assert f"Solve {nb_solved_modes} of the 4 distinct Fourier modes" in caplog.text
+        assert np.allclose(x, np.linalg.solve(A.full_matrix(), b))
+
+    A = BlockToeplitzMatrix([4*np.identity(3) + rng.rand(3, 3), rng.rand(3, 3)])
+    for b in [np.concatenate([pattern, pattern]), np.concatenate([pattern, -pattern]), np.zeros(6)]:
+        assert np.allclose(solve(A, b), np.linalg.solve(A.full_matrix(), b))
+
+
+@pytest.mark.parametrize("nb_threads", [1, 4])
+def test_parallel_solve(nb_threads):
+    rng = np.random.RandomState(0)
+    matrices = [
+        BlockCirculantMatrix([4*np.identity(3) + rng.rand(3, 3)] + [rng.rand(3, 3) for _ in range(3)], size=7),
+        BlockToeplitzMatrix([4*np.identity(3) + rng.rand(3, 3) + 1j*rng.rand(3, 3), rng.rand(3, 3) + 0j]),
+        BlockCirculantMatrix([BlockToeplitzMatrix([8*np.identity(2) + rng.rand(2, 2), rng.rand(2, 2)])] +
+                             [BlockToeplitzMatrix([rng.rand(2, 2) for _ in range(2)]) for _ in range(2)], size=4),
+    ]
+    for A in matrices:
+        ref = A.full_matrix() + 0.5*np.identity(A.shape[0])
+        for b in [rng.rand(A.shape[0]), rng.rand(A.shape[0], 3), np.zeros(A.shape[0])]:
+            x = solve(A, b, diagonal_shift=0.5, nb_threads=nb_threads)
+            assert x.shape == b.shape
+            assert np.allclose(x, np.linalg.solve(ref, b))
@@ -90,3 +90,55 @@ def test_Airy():
 
     except ImportError:
         print("Not tested with sympy.")
+
+
+def test_problem_set():
+    body = generate_dummy_floating_body()
+    body.dofs["Heave"] = body.faces_normals @ (0, 0, 1)
+    omega_range = np.linspace(0.5, 2.0, 50)
+    angle_range = np.linspace(0.0, 2*np.pi, 72, endpoint=False)
+
+    problem_set = ProblemSet(body, omega_range, angle_range=angle_range, sea_bottom_range=[-np.infty, -10.0])
+    assert problem_set.shape == (1, 2, 50)
+    assert problem_set.wavenumbers.shape == (2, 50)
+    assert len(problem_set) == 2*50*73
+
+    problems = list(problem_set)
+    assert len(problems) == len(problem_set)
+    assert isinstance(problems[0], DiffractionProblem)
+    assert isinstance(problems[72], RadiationProblem)
+    assert problems[73].omega == omega_range[1]
+    assert problems[-1].depth == 10.0
+    assert np.isclose(problems[-1].wavenumber, problem_set.wavenumbers[1, -1])
+
+    # Fake results of the solver
+    results = [(np.full((1, 1), problem.omega), np.zeros((1, 1))) if isinstance(problem, RadiationProblem)
+               else np.full(1, problem.angle) for problem in problems]
+    arrays = problem_set.gather_results(results)
+    assert arrays["added_masses"].shape == (1, 2, 50, 1, 1)
+    assert np.all(arrays["added_masses"][0, 1, :, 0, 0] == omega_range)
+    assert arrays["diffraction_forces"].shape == (1, 2, 50, 72, 1)
+    assert np.all(arrays["diffraction_forces"][0, 0, 3, :, 0] == angle_range)
+
+
+def test_problem_set_uses_precomputed_wavenumbers(monkeypatch):
+    import capytaine.problems
+    body = generate_dummy_floating_body()
+    body.dofs["Heave"] = body.faces_normals @ (0, 0, 1)
+    problem_set = ProblemSet(body, np.linspace(0.5, 2.0, 5), sea_bottom_range=[-np.infty, -10.0])
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The problems of the set should not be checked or solved again.")
+    monkeypatch.setattr(capytaine.problems, "compute_wavenumber", fail)
+    monkeypatch.setattr(capytaine.problems, "_check_domain", fail)
+
+    for (index, _), problem in zip(problem_set._indices(), problem_set):
+        assert problem.wavenumber == problem_set.wavenumbers[index[1:]]
+
+
+def test_import_cal_file_as_problem_set():
+    problem_set = import_cal_file("examples/data/Nemoh.cal", return_problem_set=True)
+    assert isinstance(problem_set, ProblemSet)
+    assert problem_set.shape == (1, 1, 2)
+    assert [str(problem) for problem in problem_set] == \
+        [str(problem) for problem in import_cal_file("examples/data/Nemoh.cal")]
@@ -59,7 +59,8 @@ def test_floating_sphere(reso, depth):
     four_quarter_sphere = ReflectionSymmetry(ReflectionSymmetry(quarter_sphere, yOz_Plane), xOz_Plane)
     four_quarter_sphere.dofs["Heave"] = four_quarter_sphere.faces_normals @ (0, 0, 1)
     problem = RadiationProblem(body=four_quarter_sphere, omega=1.0, sea_bottom=-depth)
-    mass3, damping3 = Nemoh().solve(problem)
+    mass3, damping3 = Nemoh().solve(problem, keep_details=True)
+    assert isinstance(problem.V.blocks[0], BlockToeplitzMatrix)
 
     clever_sphere = generate_clever_sphere(radius=1.0, ntheta=reso, nphi=4*reso, clip_free_surface=True)
     clever_sphere.dofs['Heave'] = clever_sphere.faces_normals @ (0, 0, 1)
@@ -93,6 +94,28 @@ def test_odd_axial_symmetry():
     assert np.isclose(damping1, damping2, atol=1e-4*buoy.volume*problem.rho)
 
 
+def test_translated_axial_symmetries():
+    """Interactions between two axisymmetric buoys moved after their creation."""
+    Nemoh()  # Initialize the Green function
+    def shape(z):
+            return 0.1*(-(z+1)**2 + 16)
+    buoy = generate_axi_symmetric_body(shape, z_range=np.linspace(-5.0, 0.0, 5), nphi=6)
+    other_buoy = buoy.copy()
+    other_buoy.translate_x(10.0)
+
+    for other_body in [other_buoy, buoy.copy()]:
+        S1, V1 = buoy.build_matrices(other_body, free_surface=0.0, sea_bottom=-np.infty, wavenumber=1.0)
+        S2, V2 = buoy.build_matrices(other_body, free_surface=0.0, sea_bottom=-np.infty, wavenumber=1.0,
+                                     force_full_computation=True)
+        S1, V1 = (M if isinstance(M, np.ndarray) else M.full_matrix() for M in (S1, V1))
+        S2, V2 = (M if isinstance(M, np.ndarray) else M.full_matrix() for M in (S2, V2))
+        assert np.allclose(S1, S2, atol=1e-5)
+        assert np.allclose(V1, V2, atol=1e-5)
+
+    assert not buoy._same_rotation_as(other_buoy)
+    assert buoy._same_rotation_as(buoy.copy())
+
+
 @pytest.mark.parametrize("depth", [10.0, np.infty])
 def test_horizontal_cylinder(depth):
     cylinder = generate_open_horizontal_cylinder(length=10.0, radius=1.0, ntheta=10, nx=10)
@@ -110,3 +133,90 @@ def test_horizontal_cylinder(depth):
     cylinder_volume = 10*1.0*2*np.pi
     assert np.isclose(mass1,    mass2,    atol=1e-4*cylinder_volume*problem.rho)
     assert np.isclose(damping1, damping2, atol=1e-4*cylinder_volume*problem.rho)
+
+
+@pytest.mark.parametrize("depth", [10.0, np.infty])
+def test_detect_symmetries(depth):
+    cylinder = generate_open_horizontal_cylinder(length=10.0, radius=1.0, ntheta=10, nx=10)
+    cylinder.translate_z(-3.0)
+    cylinder.dofs["Heave"] = cylinder.faces_normals @ (0, 0, 1)
+    cylinder.dofs["Surge"] = cylinder.faces_normals @ (1, 0, 0)
+
+    sym_cylinder, permutation = detect_symmetries(cylinder, return_permutation=True)
+    assert isinstance(sym_cylinder, TranslationalSymmetry)
+    assert sym_cylinder.nb_subbodies == 10
+    assert isinstance(sym_cylinder.subbodies[0], ReflectionSymmetry)
+    assert np.allclose(sym_cylinder.faces_centers, cylinder.faces_centers[permutation])
+    assert sym_cylinder.dofs.names == ["Heave", "Surge"]
+    assert np.allclose(sym_cylinder.dofs["Surge"], sym_cylinder.faces_normals @ (1, 0, 0))
+
+    problem = RadiationProblem(body=cylinder, omega=1.0, sea_bottom=-depth)
+    mass1, damping1 = Nemoh().solve(problem)
+    problem = RadiationProblem(body=sym_cylinder, omega=1.0, sea_bottom=-depth)
+    mass2, damping2 = Nemoh().solve(problem)
+
+    cylinder_volume = 10*1.0*2*np.pi
+    assert np.allclose(mass1,    mass2,    atol=1e-4*cylinder_volume*problem.rho)
+    assert np.allclose(damping1, damping2, atol=1e-4*cylinder_volume*problem.rho)
+
+    sphere = generate_sphere(radius=1.0, ntheta=6, nphi=12, clip_free_surface=True)
+    sym_sphere = detect_symmetries(sphere)
+    assert isinstance(sym_sphere, AxialSymmetry)
+    assert sym_sphere.nb_subbodies == 12
+
+    # No symmetry
+    other_sphere = generate_sphere(radius=0.5, z0=-2.0)
+    other_sphere.translate_x(3.0)
+    other_sphere.translate_y(1.0)
+    asymmetric_body = (sphere + other_sphere).as_FloatingBody()
+    assert detect_symmetries(asymmetric_body) is asymmetric_body
+
+
+def test_symmetric_free_surface():
+    half_sphere = generate_half_sphere(radius=1.0, ntheta=3, nphi=12, clip_free_surface=True)
+    mirror_sphere = ReflectionSymmetry(half_sphere, xOz_Plane)
+    clever_sphere = generate_clever_sphere(radius=1.0, ntheta=3, nphi=12, clip_free_surface=True)
+
+    free_surface = generate_free_surface(width=20.0, length=20.0, nw=5, nl=6)
+    annulus_profile = np.stack([np.linspace(2.0, 10.0, 5), np.zeros(5), np.zeros(5)]).T
+    annulus = generate_axi_symmetric_body(annulus_profile, nphi=12).as_FloatingBody()
+
+    for body, mesh, structure in [(mirror_sphere, free_surface, BlockToeplitzMatrix),
+                                  (clever_sphere, annulus, BlockMatrix)]:
+        body.dofs["Heave"] = body.faces_normals @ (0, 0, 1)
+        solver = Nemoh()
+        problem = RadiationProblem(body=body, omega=1.0, sea_bottom=-np.infty)
+        solver.solve(problem, keep_details=True)
+
+        symmetric_mesh, permutation = match_symmetries(mesh, body)
+        assert isinstance(symmetric_mesh, body.__class__)
+        assert np.allclose(symmetric_mesh.faces_centers, mesh.faces_centers[permutation])
+        S, _ = symmetric_mesh.build_matrices(body, wavenumber=problem.wavenumber)
+        assert isinstance(S, structure)
+
+        phi = solver.get_potential_on_mesh(problem, mesh, dof="Heave")
+        S_ref, _ = mesh.build_matrices(body.as_FloatingBody(), wavenumber=problem.wavenumber)
+        assert np.allclose(phi, S_ref @ problem.sources["Heave"], rtol=1e-4, atol=1e-6)
+
+
+def test_symmetric_free_surface_around_moved_body():
+    def shape(z):
+            return 0.1*(-(z+1)**2 + 16)
+    buoy = generate_axi_symmetric_body(shape, z_range=np.linspace(-5.0, 0.0, 5), nphi=6)
+    buoy.translate([5.0, 2.0, 0.0])
+    buoy.dofs["Heave"] = buoy.faces_normals @ (0, 0, 1)
+
+    annulus_profile = np.stack([np.linspace(2.0, 10.0, 5), np.zeros(5), np.zeros(5)]).T
+    annulus = generate_axi_symmetric_body(annulus_profile, nphi=6).as_FloatingBody()
+    annulus.translate([5.0, 2.0, 0.0])
+
+    symmetric_mesh, permutation = match_symmetries(annulus, buoy)
+    assert isinstance(symmetric_mesh, AxialSymmetry)
+    assert np.allclose(symmetric_mesh.faces_centers, annulus.faces_centers[permutation])
+
+    solver = Nemoh()
+    problem = RadiationProblem(body=buoy, omega=1.0, sea_bottom=-np.infty)
+    solver.solve(problem, keep_details=True)
+    phi = solver.get_potential_on_mesh(problem, annulus, dof="Heave")
+    S_ref, _ = annulus.build_matrices(buoy.as_FloatingBody(), wavenumber=problem.wavenumber)
+    assert np.allclose(phi, S_ref @ problem.sources["Heave"], rtol=1e-4, atol=1e-6)
@@ -26,3 +26,12 @@ def test_MaxLengthDict():
     assert dc3 == {}
     dc3['d'] = 8
     assert dc3 == {}
+
+
+def test_MaxLengthDict_resize():
+    dc = MaxLengthDict({'a':1, 'b':5, 'c':3}, max_length=3)
+    dc.max_length = 2 # drop 'a'
+    assert list(dc.keys()) == ['b', 'c']
+    dc.max_length = 3
+    dc['d'] = 8
+    assert list(dc.keys()) == ['b', 'c', 'd']
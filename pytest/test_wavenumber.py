@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Tests for the resolution of the dispersion relation.
+"""
+
+import numpy as np
+
+from capytaine.wavenumber import invert_xtanhx, solve_dispersion_relation, compute_wavenumber
+
+
+def test_invert_xtanhx():
+    y = np.logspace(-6, 2, 100)
+    x = invert_xtanhx(y)
+    assert np.allclose(x*np.tanh(x), y, rtol=1e-10)
+    assert invert_xtanhx(0.0) == 0.0
+
+
+def test_dispersion_relation():
+    g = 9.81
+    omega = np.linspace(0.1, 5.0, 20).reshape((-1, 1))
+    depth = np.array([1.0, 10.0, 100.0, np.infty])
+
+    k = solve_dispersion_relation(omega, depth, g=g, nb_evanescent_modes=3)
+    assert k.shape == (20, 4, 4)
+
+    # Propagating mode
+    assert np.allclose(k[:, :3, 0]*np.tanh(k[:, :3, 0]*depth[:3]), omega**2/g, rtol=1e-6)
+    assert np.allclose(k[:, 3, 0], omega[:, 0]**2/g)
+
+    # Evanescent modes
+    kn, h = k[:, :3, 1:], depth[:3, np.newaxis]
+    assert np.allclose(-kn*np.tan(kn*h), omega[..., np.newaxis]**2/g, rtol=1e-6)
+    assert np.all((np.arange(1, 4) - 0.5)*np.pi < kn*h)
+    assert np.all(kn*h < np.arange(1, 4)*np.pi)
+    assert np.all(np.isnan(k[:, 3, 1:]))
+
+    assert compute_wavenumber(omega[3, 0], 10.0, g) == k[3, 1, 0]
+    assert compute_wavenumber(np.infty, np.infty, g) == np.infty